@@ -0,0 +1,163 @@
+import sys
+import time
+from array import array
+from typing import Hashable, Iterable
+
+import numpy as np
+
+from numeric_utils import round_like_python
+from parallel_workflow import BatsState, workflow
+
+COUNTERS = ("runs", "balls", "fours", "sixes")
+RATES = ("sr", "ballsperrun", "bountrate")
+
+
+# Running per-batter totals for a live ball-by-ball feed.
+# Each counter is one compact array (int64 / float64) indexed by the batter's slot,
+# so a ball event is a handful of O(1) updates instead of a full graph run.
+class BattingStatsEngine:
+    def __init__(self):
+        self._slots: dict[Hashable, int] = {}
+        self.batters: list[Hashable] = []
+        self.runs = array("q")
+        self.balls = array("q")
+        self.fours = array("q")
+        self.sixes = array("q")
+        self.sr = array("d")
+        self.ballsperrun = array("d")
+        self.bountrate = array("d")
+
+    def __len__(self) -> int:
+        return len(self.batters)
+
+    def _slot(self, batter: Hashable) -> int:
+        slot = self._slots.get(batter)
+        if slot is None:
+            slot = self._slots[batter] = len(self.batters)
+            self.batters.append(batter)
+            for name in COUNTERS:
+                getattr(self, name).append(0)
+            for name in RATES:
+                getattr(self, name).append(0.0)
+        return slot
+
+    # One delivery faced: runs off the bat, with 4 and 6 counted as boundaries
+    def record_ball(self, batter: Hashable, runs: int) -> None:
+        slot = self._slot(batter)
+        total_runs = self.runs[slot] = self.runs[slot] + runs
+        balls = self.balls[slot] = self.balls[slot] + 1
+        if runs == 4:
+            self.fours[slot] += 1
+        elif runs == 6:
+            self.sixes[slot] += 1
+
+        # Same formulas as calculate_strike_rate, calculate_balls_per_run and calculate_bountrate
+        self.sr[slot] = round((total_runs / balls) * 100, 2)
+        self.ballsperrun[slot] = round(balls / total_runs, 2) if total_runs > 0 else 0
+        self.bountrate[slot] = round(((self.fours[slot] + self.sixes[slot]) / balls) * 100, 2)
+
+    # Bulk ingestion of a replayed feed: counters are added with bincount, rates recomputed once
+    def record_balls(self, batters: Iterable[Hashable], runs: np.ndarray) -> None:
+        runs = np.asarray(runs, dtype=np.int64)
+        unique, inverse = np.unique(np.asarray(batters), return_inverse=True)
+        # intp so that an empty feed still gives bincount an integer array
+        slots = np.array([self._slot(batter.item() if hasattr(batter, "item") else batter) for batter in unique], dtype=np.intp)[inverse]
+
+        size = len(self)
+        added = {
+            "runs": np.bincount(slots, weights=runs, minlength=size),
+            "balls": np.bincount(slots, minlength=size),
+            "fours": np.bincount(slots, weights=runs == 4, minlength=size),
+            "sixes": np.bincount(slots, weights=runs == 6, minlength=size),
+        }
+        columns = self.compute_all(added)
+        for name in COUNTERS + RATES:
+            setattr(self, name, array(getattr(self, name).typecode, columns[name].tobytes()))
+
+    # Batch API: run the three calculators over every batter as vectorized columns.
+    # `extra` optionally adds per-batter counter deltas before computing.
+    def compute_all(self, extra: dict[str, np.ndarray] | None = None) -> dict[str, np.ndarray]:
+        columns = {name: np.array(getattr(self, name), dtype=np.int64) for name in COUNTERS}
+        for name, delta in (extra or {}).items():
+            columns[name] += delta.astype(np.int64)
+
+        runs, balls = columns["runs"], columns["balls"]
+        has_balls = balls > 0
+        has_runs = runs > 0
+        safe_balls = np.where(has_balls, balls, 1)
+        safe_runs = np.where(has_runs, runs, 1)
+
+        columns["sr"] = np.where(has_balls, round_like_python((runs / safe_balls) * 100, 2), 0.0)
+        columns["ballsperrun"] = np.where(has_runs, round_like_python(balls / safe_runs, 2), 0.0)
+        columns["bountrate"] = np.where(
+            has_balls, round_like_python(((columns["fours"] + columns["sixes"]) / safe_balls) * 100, 2), 0.0
+        )
+        return columns
+
+    def state(self, batter: Hashable) -> BatsState:
+        slot = self._slots[batter]
+        return {name: getattr(self, name)[slot] for name in COUNTERS + RATES}
+
+    def states(self) -> dict[Hashable, BatsState]:
+        return {batter: self.state(batter) for batter in self.batters}
+
+
+# Every batter's stats must equal what the graph computes from that batter's totals
+def check_matches_graph(engine: BattingStatsEngine) -> int:
+    mismatches = 0
+    for batter, state in engine.states().items():
+        expected = workflow.invoke({name: state[name] for name in COUNTERS})
+        mismatches += any(expected[name] != state[name] for name in RATES)
+    return mismatches
+
+
+# Synthetic ball-by-ball feed: (batter id, runs) with a realistic run distribution
+def synthetic_feed(deliveries: int, batters: int = 300, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    batter_ids = rng.integers(0, batters, deliveries)
+    runs = rng.choice([0, 1, 2, 3, 4, 6], size=deliveries, p=[0.40, 0.33, 0.10, 0.02, 0.10, 0.05])
+    return batter_ids, runs
+
+
+def benchmark(deliveries: int = 10_000_000, batters: int = 300, graph_events: int = 2_000):
+    batter_ids, runs = synthetic_feed(deliveries, batters)
+    id_list, run_list = batter_ids.tolist(), runs.tolist()
+
+    # Current approach: keep totals and rerun the graph after every ball
+    totals: dict[int, BatsState] = {}
+    start = time.perf_counter()
+    for batter, r in zip(id_list[:graph_events], run_list[:graph_events]):
+        state = totals.setdefault(batter, {"runs": 0, "balls": 0, "fours": 0, "sixes": 0})
+        state["runs"] += r
+        state["balls"] += 1
+        state["fours"] += r == 4
+        state["sixes"] += r == 6
+        workflow.invoke(state)
+    graph_rate = graph_events / (time.perf_counter() - start)
+
+    live = BattingStatsEngine()
+    start = time.perf_counter()
+    for batter, r in zip(id_list, run_list):
+        live.record_ball(batter, r)
+    live_rate = deliveries / (time.perf_counter() - start)
+
+    bulk = BattingStatsEngine()
+    start = time.perf_counter()
+    bulk.record_balls(batter_ids, runs)
+    bulk_rate = deliveries / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    live.compute_all()
+    compute_all_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Replayed {deliveries:,} deliveries for {batters} batters")
+    print(f"Graph invoke per ball   : {graph_rate:>14,.0f} balls/sec")
+    print(f"Engine record_ball      : {live_rate:>14,.0f} balls/sec  ({live_rate / graph_rate:,.0f}x)")
+    print(f"Engine record_balls     : {bulk_rate:>14,.0f} balls/sec  ({bulk_rate / graph_rate:,.0f}x)")
+    print(f"compute_all for {len(live)} batters: {compute_all_ms:.2f} ms")
+    print(f"Live vs bulk engine identical: {live.states() == bulk.states()}")
+    print(f"Mismatches against the graph: {check_matches_graph(live)}")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
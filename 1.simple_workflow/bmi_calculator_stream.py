@@ -0,0 +1,145 @@
+import os
+import resource
+import sys
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from bmi_calculator_workflow import workflow
+from numeric_utils import round_like_python
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+CATEGORIES = np.array(["Underweight", "Normal weight", "Overweight", "Obesity", ""])
+INVALID = len(CATEGORIES) - 1  # height == 0, where the graph raises ZeroDivisionError
+
+
+# Vectorized version of calculate_bmi: round(weight / height**2, 2) for a whole chunk
+def calculate_bmi_batch(weight: np.ndarray, height: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bmi = weight / (height ** 2)
+    bmi[height == 0] = np.nan
+    return round_like_python(bmi, 2)
+
+
+# Vectorized version of categorize_bmi. Keeps the same if/elif ladder, so the gaps
+# 24.9 <= bmi < 25 and 29.9 <= bmi < 30 still fall through to "Obesity".
+def categorize_bmi_batch(bmi: np.ndarray) -> np.ndarray:
+    codes = np.select(
+        [np.isnan(bmi), bmi < 18.5, (18.5 <= bmi) & (bmi < 24.9), (25 <= bmi) & (bmi < 29.9)],
+        [INVALID, 0, 1, 2],
+        default=3,
+    )
+    return CATEGORIES[codes]
+
+
+# Read (weight, height) chunks from a CSV with a header line, never holding more than one chunk
+def read_csv_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    with open(path) as f:
+        header = [name.strip() for name in f.readline().split(",")]
+        columns = [header.index("weight"), header.index("height")]
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                break
+            data = np.loadtxt(lines, delimiter=",", usecols=columns, ndmin=2, dtype=np.float64)
+            yield data[:, 0], data[:, 1]
+
+
+# Read chunks from a memory-mapped .npy file of shape (rows, 2) with columns weight, height
+def read_npy_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    data = np.load(path, mmap_mode="r")
+    for start in range(0, len(data), chunk_size):
+        chunk = np.array(data[start:start + chunk_size], dtype=np.float64)
+        yield chunk[:, 0], chunk[:, 1]
+
+
+def read_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    if Path(path).suffix == ".npy":
+        return read_npy_chunks(path, chunk_size)
+    return read_csv_chunks(path, chunk_size)
+
+
+# Run both nodes over each chunk as column operations
+def score_chunks(chunks: Iterable[tuple[np.ndarray, np.ndarray]]) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    for weight, height in chunks:
+        bmi = calculate_bmi_batch(weight, height)
+        yield weight, height, bmi, categorize_bmi_batch(bmi)
+
+
+# Write weight,height,bmi,category rows chunk by chunk (bmi is left empty for invalid rows)
+def write_csv(path: str, scored: Iterable[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]) -> int:
+    rows = 0
+    with open(path, "w") as f:
+        f.write("weight,height,bmi,category\n")
+        for weight, height, bmi, category in scored:
+            bmi_text = ["" if value != value else value for value in bmi.tolist()]
+            f.write("".join(map("{},{},{},{}\n".format, weight.tolist(), height.tolist(), bmi_text, category.tolist())))
+            rows += len(weight)
+    return rows
+
+
+def score_file(input_path: str, output_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    return write_csv(output_path, score_chunks(read_chunks(input_path, chunk_size)))
+
+
+def check_matches_graph(weight: np.ndarray, height: np.ndarray) -> int:
+    bmi = calculate_bmi_batch(weight, height)
+    category = categorize_bmi_batch(bmi)
+    mismatches = 0
+    for i, (w, h) in enumerate(zip(weight.tolist(), height.tolist())):
+        state = workflow.invoke({"weight": w, "height": h, "bmi": 0.0})
+        mismatches += state["bmi"] != bmi[i] or state["category"] != category[i]
+    return mismatches
+
+
+# Synthetic source: realistic adult weights/heights, generated one chunk at a time
+def synthetic_chunks(rows: int, chunk_size: int = DEFAULT_CHUNK_SIZE, seed: int = 0) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk_size):
+        size = min(chunk_size, rows - start)
+        yield rng.normal(75, 15, size).round(1).clip(30, 250), rng.normal(1.70, 0.1, size).round(2).clip(1.2, 2.3)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def benchmark(sizes=(1_000_000, 10_000_000, 100_000_000), chunk_size: int = DEFAULT_CHUNK_SIZE):
+    weight, height = next(synthetic_chunks(5_000, seed=1))
+    print(f"Checked 5,000 rows against the graph: {check_matches_graph(weight, height)} mismatches")
+
+    print(f"\nIn-memory stream, chunk size {chunk_size:,}")
+    for rows in sizes:
+        start = time.perf_counter()
+        for _ in score_chunks(synthetic_chunks(rows, chunk_size)):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"{rows:>13,} rows: {rows / elapsed:>12,.0f} rows/sec, peak RSS {peak_rss_mb():,.0f} MB")
+
+    # CSV in, CSV out for the smallest size, to show what file I/O costs on top
+    rows = sizes[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "patients.csv")
+        with open(source, "w") as f:
+            f.write("weight,height\n")
+            for w, h in synthetic_chunks(rows, chunk_size):
+                f.write("".join(map("{},{}\n".format, w.tolist(), h.tolist())))
+        start = time.perf_counter()
+        score_file(source, os.path.join(tmp, "scored.csv"), chunk_size)
+        elapsed = time.perf_counter() - start
+    print(f"\nCSV -> CSV  {rows:>13,} rows: {rows / elapsed:>12,.0f} rows/sec, peak RSS {peak_rss_mb():,.0f} MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        # python bmi_calculator_stream.py patients.csv scored.csv
+        print(f"Scored {score_file(sys.argv[1], sys.argv[2]):,} rows")
+    else:
+        benchmark()
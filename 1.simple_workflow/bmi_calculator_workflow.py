@@ -1,4 +1,4 @@
-from langgraph.graph import StateGraph, START, END
+from functools import cache
 from typing import TypedDict
 
 
@@ -29,38 +29,56 @@ def categorize_bmi(state: BMIState) -> BMIState:
         state["category"] = "Obesity"
     return state
 
-# Define the workflow graph
-graph = StateGraph(BMIState)
+# Build and compile the workflow graph on first use, so importing this module stays cheap.
+# processes=True runs every node in the shared process pool (see process_pool.py).
+@cache
+def get_workflow(processes: bool = False):
+    from langgraph.graph import StateGraph, START, END
 
-# Add nodes to your graph
-graph.add_node("Calculate BMI", calculate_bmi)
-graph.add_node("Categorize BMI", categorize_bmi)
+    if processes:
+        from process_pool import offload as node
+    else:
+        node = lambda function: function
+
+    # Define the workflow graph
+    graph = StateGraph(BMIState)
+
+    # Add nodes to your graph
+    graph.add_node("Calculate BMI", node(calculate_bmi))
+    graph.add_node("Categorize BMI", node(categorize_bmi))
+
+    # add edges to your graph
+    graph.add_edge(START, "Calculate BMI")
+    graph.add_edge("Calculate BMI", "Categorize BMI")
+    graph.add_edge("Categorize BMI", END)
+    # compile the graph
+    return graph.compile()
 
-# add edges to your graph
-graph.add_edge(START, "Calculate BMI")
-graph.add_edge("Calculate BMI", "Categorize BMI")
-graph.add_edge("Categorize BMI", END)   
-# compile the graph
-workflow   = graph.compile()
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# execute the workflow with sample data
-initial_state: BMIState = {
-        "weight": 70.0,  # kg
-        "height": 1.75,  # meters
-        "bmi": 0.0       # placeholder
-    }
-final_state = workflow.invoke(initial_state)
+if __name__ == "__main__":
+    workflow = get_workflow()
 
-print(f"Calculated BMI: {final_state['bmi']}") # Output: Calculated BMI: 22.86
-print(final_state)
+    # execute the workflow with sample data
+    initial_state: BMIState = {
+            "weight": 70.0,  # kg
+            "height": 1.75,  # meters
+            "bmi": 0.0       # placeholder
+        }
+    final_state = workflow.invoke(initial_state)
 
-# Visualize the workflow
-try:
-    from IPython.display import Image, display
-    display(Image(workflow.get_graph().draw_mermaid_png()))
-except Exception:
-    # If not in Jupyter, print ASCII representation
-    print("\nWorkflow Graph:")
-    print(workflow.get_graph().draw_ascii())
-  
+    print(f"Calculated BMI: {final_state['bmi']}") # Output: Calculated BMI: 22.86
+    print(final_state)
 
+    # Visualize the workflow
+    try:
+        from IPython.display import Image, display
+        display(Image(workflow.get_graph().draw_mermaid_png()))
+    except Exception:
+        # If not in Jupyter, print ASCII representation
+        print("\nWorkflow Graph:")
+        print(workflow.get_graph().draw_ascii())
@@ -0,0 +1,483 @@
+import os
+import pickle
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Sequence
+
+from langchain_core.messages import BaseMessage, RemoveMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.channels import DeltaChannel
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.graph.message import add_messages
+
+
+# Checkpointer with a memory budget. Each thread's checkpoints live in their own InMemorySaver
+# while the thread is active; when the total size passes `memory_budget_bytes`, the least
+# recently used threads are written to SQLite and dropped from memory. The next message for an
+# evicted thread_id loads it back. `keep_last` optionally keeps only the newest N checkpoints
+# per thread (a chatbot only ever resumes from the latest one).
+class BoundedCheckpointSaver(BaseCheckpointSaver[str]):
+    def __init__(
+        self,
+        path: str = "chat_threads.sqlite",
+        memory_budget_bytes: int = 64 * 1024 * 1024,
+        keep_last: int | None = None,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.keep_last = keep_last
+        self.counters = {"evictions": 0, "loads": 0}
+        self._hot: OrderedDict[str, InMemorySaver] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS threads (thread_id TEXT PRIMARY KEY, data BLOB)")
+        self._db.commit()
+
+    # -- thread residency --------------------------------------------------------------
+
+    def _saver(self, thread_id: str, create: bool = True) -> InMemorySaver | None:
+        with self._lock:
+            saver = self._hot.get(thread_id)
+            if saver is not None:
+                self._hot.move_to_end(thread_id)
+                return saver
+
+            saver = self._cold_saver(thread_id)
+            if saver is None:
+                if not create:
+                    return None
+                saver = InMemorySaver(serde=self.serde)
+            else:
+                self.counters["loads"] += 1
+            self._hot[thread_id] = saver
+            self._sizes[thread_id] = _size(saver)
+            return saver
+
+    # The thread as last written to SQLite, without making it resident. The row stays until the
+    # thread is deleted; evicting the thread again overwrites it.
+    def _cold_saver(self, thread_id: str) -> InMemorySaver | None:
+        row = self._db.execute("SELECT data FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        if row is None:
+            return None
+        saver = InMemorySaver(serde=self.serde)
+        storage, writes, blobs = pickle.loads(row[0])
+        for namespace, checkpoints in storage.items():
+            saver.storage[thread_id][namespace] = checkpoints
+        saver.writes.update(writes)
+        saver.blobs.update(blobs)
+        return saver
+
+    def _evict(self, thread_id: str) -> None:
+        saver = self._hot.pop(thread_id)
+        self._sizes.pop(thread_id)
+        data = pickle.dumps((dict(saver.storage[thread_id]), dict(saver.writes), dict(saver.blobs)))
+        self._db.execute("INSERT OR REPLACE INTO threads (thread_id, data) VALUES (?, ?)", (thread_id, data))
+        self._db.commit()
+        self.counters["evictions"] += 1
+
+    def _enforce_budget(self, active: str) -> None:
+        total = sum(self._sizes.values())
+        for thread_id in list(self._hot):
+            if total <= self.memory_budget_bytes:
+                break
+            if thread_id != active:
+                total -= self._sizes[thread_id]
+                self._evict(thread_id)
+
+    # Write every in-memory thread to SQLite, e.g. before shutting down
+    def flush(self) -> None:
+        with self._lock:
+            for thread_id in list(self._hot):
+                self._evict(thread_id)
+
+    def memory_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            cold = sum(row[0] not in self._hot for row in self._db.execute("SELECT thread_id FROM threads"))
+        return {**self.counters, "hot_threads": len(self._hot), "cold_threads": cold, "memory_bytes": self.memory_bytes()}
+
+    def _prune(self, saver: InMemorySaver, thread_id: str, namespace: str) -> None:
+        checkpoints = saver.storage[thread_id][namespace]
+        if self.keep_last is None or len(checkpoints) <= self.keep_last:
+            return
+        ordered = sorted(checkpoints)
+        first_kept = min(len(ordered) - self.keep_last, self._replay_start(saver, thread_id, namespace, ordered))
+        for checkpoint_id in ordered[:first_kept]:
+            del checkpoints[checkpoint_id]
+            saver.writes.pop((thread_id, namespace, checkpoint_id), None)
+        checkpoints[min(checkpoints)] = (*checkpoints[min(checkpoints)][:2], None)  # oldest kept is now the root
+
+        # Drop channel values no remaining checkpoint points to
+        referenced = set()
+        for serialized, _, _ in checkpoints.values():
+            versions = self.serde.loads_typed(serialized)["channel_versions"]
+            referenced.update((thread_id, namespace, channel, version) for channel, version in versions.items())
+        for key in [key for key in saver.blobs if key[1] == namespace and key not in referenced]:
+            del saver.blobs[key]
+
+    # Index of the oldest checkpoint needed to load the newest one. With delta channels (see
+    # delta_history) that is the newest checkpoint holding a snapshot of each of them; the
+    # later ones only hold the writes made on top of it.
+    def _replay_start(self, saver: InMemorySaver, thread_id: str, namespace: str, ordered: list[str]) -> int:
+        checkpoints = saver.storage[thread_id][namespace]
+        needed = set(self.serde.loads_typed(checkpoints[ordered[-1]][1]).get("counters_since_delta_snapshot", {}))
+        for index in range(len(ordered) - 1, -1, -1):
+            versions = self.serde.loads_typed(checkpoints[ordered[index]][0])["channel_versions"]
+            needed = {
+                channel for channel in needed
+                if saver.blobs.get((thread_id, namespace, channel, versions.get(channel)), ("empty",))[0] == "empty"
+            }
+            if not needed:
+                return index
+        return 0
+
+    # -- BaseCheckpointSaver API -------------------------------------------------------
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        with self._lock:
+            saver = self._saver(config["configurable"]["thread_id"], create=False)
+            return saver.get_tuple(config) if saver is not None else None
+
+    # Writes and snapshot to rebuild delta channels from, read straight from the thread's saver
+    def get_delta_channel_history(self, *, config: RunnableConfig, channels: Sequence[str]):
+        with self._lock:
+            saver = self._saver(config["configurable"]["thread_id"], create=False)
+            if saver is None:
+                return {channel: {"writes": []} for channel in channels}
+            return saver.get_delta_channel_history(config=config, channels=channels)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        # Listing every thread reads the cold ones from SQLite without making them resident, so
+        # it neither evicts the active threads nor grows past the memory budget
+        with self._lock:
+            if config is not None:
+                thread_ids = [config["configurable"]["thread_id"]]
+            else:
+                cold = [row[0] for row in self._db.execute("SELECT thread_id FROM threads") if row[0] not in self._hot]
+                thread_ids = list(self._hot) + cold
+        for thread_id in thread_ids:
+            with self._lock:
+                if config is not None:
+                    saver = self._saver(thread_id, create=False)
+                else:
+                    saver = self._hot.get(thread_id)
+                    if saver is None:
+                        saver = self._cold_saver(thread_id)
+            if saver is None:
+                continue
+            thread_config = config or {"configurable": {"thread_id": thread_id}}
+            for item in saver.list(thread_config, filter=filter, before=before, limit=limit):
+                yield item
+                if limit is not None:
+                    limit -= 1
+            if limit is not None and limit <= 0:
+                return
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            saver = self._saver(thread_id)
+            next_config = saver.put(config, checkpoint, metadata, new_versions)
+            self._prune(saver, thread_id, config["configurable"]["checkpoint_ns"])
+            self._sizes[thread_id] = _size(saver)
+            self._enforce_budget(active=thread_id)
+            return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            saver = self._saver(thread_id)
+            saver.put_writes(config, writes, task_id, task_path)
+            self._sizes[thread_id] = _size(saver)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._hot.pop(thread_id, None)
+            self._sizes.pop(thread_id, None)
+            self._db.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+            self._db.commit()
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return self.get_tuple(config)
+
+    async def aget_delta_channel_history(self, *, config: RunnableConfig, channels: Sequence[str]):
+        return self.get_delta_channel_history(config=config, channels=channels)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        return InMemorySaver.get_next_version(self, current, channel)
+
+
+# Bytes held by one thread's saver (serialized checkpoints, writes and channel values)
+def _size(saver: InMemorySaver) -> int:
+    total = 0
+    for namespaces in saver.storage.values():
+        for checkpoints in namespaces.values():
+            for checkpoint, metadata, _ in checkpoints.values():
+                total += len(checkpoint[1]) + len(metadata[1])
+    for writes in saver.writes.values():
+        total += sum(len(value[2][1]) for value in writes.values())
+    total += sum(len(blob[1]) for blob in saver.blobs.values())
+    return total
+
+
+# -- history compaction ------------------------------------------------------------------
+# A policy takes the chat history and returns the add_messages updates that compact it
+# (RemoveMessage for dropped messages, plus an optional summary), or [] to leave it alone.
+
+# Keep only the newest `max_messages` messages
+class WindowCompaction:
+    def __init__(self, max_messages: int = 20):
+        self.max_messages = max_messages
+
+    def __call__(self, history: list[BaseMessage]) -> list[BaseMessage]:
+        overflow = len(history) - self.max_messages
+        return [RemoveMessage(id=message.id) for message in history[:max(overflow, 0)]]
+
+
+# Once the history passes `max_messages`, fold everything but the newest `keep_last`
+# messages into one summary message (written by `model`) at the start of the history.
+class SummaryCompaction:
+    def __init__(self, model, max_messages: int = 20, keep_last: int = 6):
+        self.model = model
+        self.max_messages = max_messages
+        self.keep_last = keep_last
+
+    def __call__(self, history: list[BaseMessage]) -> list[BaseMessage]:
+        if len(history) <= self.max_messages:
+            return []
+        old = history[:-self.keep_last]
+        transcript = "\n".join(f"{message.type}: {message.content}" for message in old)
+        prompt = f"Summarize this conversation in a few sentences, keeping any facts the user shared:\n\n{transcript}"
+        summary = self.model.invoke(prompt).content
+        # Reusing the first old message's id puts the summary in its place (add_messages replaces by id)
+        return [SystemMessage(content=f"Summary of the earlier conversation: {summary}", id=old[0].id)] + [
+            RemoveMessage(id=message.id) for message in old[1:]
+        ]
+
+
+# -- delta-encoded history ----------------------------------------------------------------
+# With add_messages, every checkpoint stores the whole chat_history again, so the bytes written
+# per turn (and the time to serialize them) grow with the conversation. A DeltaChannel stores
+# only each step's writes (the messages it added) and, every `snapshot_every` updates, a full
+# snapshot; loading a thread replays at most that many writes on top of the newest snapshot.
+# Use it as Annotated[list[BaseMessage], delta_history()].
+def delta_history(snapshot_every: int = 50) -> DeltaChannel:
+    return DeltaChannel(add_message_batches, snapshot_frequency=snapshot_every)
+
+
+# add_messages over a batch of writes (each a list of messages), as DeltaChannel replays them.
+# Appends are merged in one pass; a batch with removals is applied write by write, so the
+# result is the same however the writes are batched.
+def add_message_batches(history: list[BaseMessage], writes: Sequence) -> list[BaseMessage]:
+    updates = [update if isinstance(update, list) else [update] for update in writes]
+    if any(isinstance(message, RemoveMessage) for update in updates for message in update):
+        for update in updates:
+            history = add_messages(history, update)
+        return history
+    return add_messages(history, [message for update in updates for message in update])
+
+
+# Checkpoint serializer that zlib-compresses (level 1) the msgpack encoding of values of at
+# least `min_size` bytes: snapshots of a long history shrink ~8x for ~2 ms per 1,000 messages,
+# while the small per-step writes are stored as they are. Pass it as serde= to a checkpointer.
+class CompressedSerializer:
+    def __init__(self, serde=None, min_size: int = 1024, level: int = 1):
+        self.serde = serde or JsonPlusSerializer()
+        self.min_size = min_size
+        self.level = level
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        kind, data = self.serde.dumps_typed(obj)
+        if len(data) < self.min_size:
+            return kind, data
+        return f"{kind}+zlib", zlib.compress(data, self.level)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        kind, payload = data
+        if kind.endswith("+zlib"):
+            return self.serde.loads_typed((kind.removesuffix("+zlib"), zlib.decompress(payload)))
+        return self.serde.loads_typed(data)
+
+
+def _current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except OSError:  # not Linux: fall back to the peak
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024**2
+
+
+# Replays `turns` rounds over `threads` conversations (threads visited in random order each
+# round) with a zero-latency fake model, and reports RSS and per-turn latency as it goes.
+def benchmark(mode: str, threads: int, turns: int, budget_mb: float, reports: int = 10):
+    import random
+    import tempfile
+    import time
+
+    from langchain_core.messages import HumanMessage
+
+    import simple_chatbot
+    from fake_models import FakeChatModel
+
+    simple_chatbot.model.override(FakeChatModel())
+    with tempfile.TemporaryDirectory() as tmp:
+        if mode == "bounded":
+            saver = BoundedCheckpointSaver(os.path.join(tmp, "threads.sqlite"), int(budget_mb * 1024**2), keep_last=2)
+            workflow = simple_chatbot.build_workflow(saver, WindowCompaction(max_messages=20))
+        else:
+            saver = InMemorySaver()
+            workflow = simple_chatbot.build_workflow(saver)
+
+        print(f"mode={mode} threads={threads:,} turns={turns}")
+        order = list(range(threads))
+        timings: list[float] = []
+        history = 0
+        for turn in range(1, turns + 1):
+            random.shuffle(order)
+            for thread in order:
+                start = time.perf_counter()
+                state = workflow.invoke(
+                    {"chat_history": [HumanMessage(content=f"message {turn} in thread {thread}")]},
+                    {"configurable": {"thread_id": str(thread)}},
+                )
+                timings.append((time.perf_counter() - start) * 1000)
+                history = len(state["chat_history"])
+            if turn % max(turns // reports, 1) == 0 or turn == turns:
+                timings.sort()
+                print(
+                    f"turn {turn:>4}: RSS {_current_rss_mb():7.1f} MB | per-turn p50 {timings[len(timings) // 2]:6.2f} ms "
+                    f"p99 {timings[int(len(timings) * 0.99)]:6.2f} ms | history {history} messages"
+                )
+                timings = []
+        if mode == "bounded":
+            print(saver.stats())
+
+
+# Full vs delta-encoded checkpoints for one long conversation (InMemorySaver, zero-latency fake
+# model): bytes written per turn, per-turn latency, and the time to load the latest state
+# (workflow.get_state, which rebuilds the history from the snapshot and the writes after it).
+def delta_benchmark(messages: int = 2000, reports: int = 4):
+    import statistics
+    import time
+
+    from langchain_core.messages import HumanMessage
+
+    import simple_chatbot
+    from fake_models import FakeChatModel
+
+    simple_chatbot.model.override(FakeChatModel())
+    turns = messages // 2
+    print(f"{turns} turns ({messages} messages); delta snapshots every 50 updates (25 turns)")
+    print(f"{'format':<10} {'messages':>8} {'bytes/turn':>11} {'stored MB':>9} {'turn ms':>8} {'load ms':>8}")
+    for name, delta, serde in (("full", False, None), ("delta", True, None), ("delta+zlib", True, CompressedSerializer())):
+        saver = InMemorySaver(serde=serde)
+        workflow = simple_chatbot.build_workflow(saver, delta=delta)
+        config = {"configurable": {"thread_id": "long"}}
+        written, timings, size = [], [], 0
+        for turn in range(1, turns + 1):
+            start = time.perf_counter()
+            workflow.invoke({"chat_history": [HumanMessage(content=f"message {turn}: how do I reset my password?")]}, config)
+            timings.append((time.perf_counter() - start) * 1000)
+            written.append(_size(saver) - size)
+            size += written[-1]
+            if turn % max(turns // reports, 1) == 0:
+                loads = []
+                for _ in range(5):
+                    start = time.perf_counter()
+                    history = workflow.get_state(config).values["chat_history"]
+                    loads.append((time.perf_counter() - start) * 1000)
+                print(
+                    f"{name:<10} {len(history):>8} {statistics.mean(written):>11,.0f} {size / 1024**2:>9.1f} "
+                    f"{statistics.mean(timings):>8.2f} {statistics.median(loads):>8.2f}"
+                )
+                written, timings = [], []
+
+
+if __name__ == "__main__":
+    import argparse
+    import subprocess
+    import sys
+
+    parser = argparse.ArgumentParser(description="RSS and latency of MemorySaver vs BoundedCheckpointSaver, or full vs delta checkpoints")
+    parser.add_argument("--mode", choices=["memory", "bounded", "both", "delta"], default="both")
+    parser.add_argument("--threads", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--budget-mb", type=float, default=2)
+    parser.add_argument("--messages", type=int, default=2000, help="conversation length for --mode delta")
+    args = parser.parse_args()
+
+    if args.mode == "delta":
+        delta_benchmark(args.messages)
+    elif args.mode == "both":
+        # Separate processes so one mode's memory doesn't show up in the other's RSS
+        for mode in ("memory", "bounded"):
+            subprocess.run([sys.executable, __file__, "--mode", mode, "--threads", str(args.threads),
+                            "--turns", str(args.turns), "--budget-mb", str(args.budget_mb)], check=True)
+    else:
+        benchmark(args.mode, args.threads, args.turns, args.budget_mb)
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Mapping
+
+import llm_parallel_workflow
+from fake_models import FakeChatModel
+from llm_parallel_workflow import EVALUATION_MODES, FAN_OUT, FeedbackSchema, RubricEvaluation, workflow
+
+RESULT_FIELDS = (
+    "clarity_of_thought_feedback",
+    "deptpth_of_analysis_feedback",
+    "language_feedback",
+    "individual_scores",
+    "avg_score",
+    "final_feedback",
+)
+
+
+# Grade a whole corpus with workflow.ainvoke. At most `max_concurrency` essays are in flight
+# at once, each result is appended to the JSONL sink as soon as it finishes, and an essay
+# that raises is recorded as an error instead of stopping the rest.
+# (The cap is a semaphore rather than config["max_concurrency"], because that config value is
+# inherited by the graph run and would also serialize the three evaluators inside each essay.)
+# `mode` is the workflow's evaluation_mode: three evaluator calls per essay, one, or (incremental)
+# only those a resubmission of the same id needs.
+async def evaluate_corpus(essays: Mapping[str, str], sink_path: str, max_concurrency: int = 16, mode: str = FAN_OUT) -> dict:
+    ids = list(essays)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    summary = {"ok": 0, "failed": 0}
+
+    async def evaluate(index: int):
+        async with semaphore:
+            try:
+                return index, await workflow.ainvoke({"eassy": essays[ids[index]]}, {"configurable": {"evaluation_mode": mode, "essay_id": ids[index]}})
+            except Exception as exc:
+                return index, exc
+
+    start = time.perf_counter()
+    with open(sink_path, "w") as sink:
+        tasks = [asyncio.create_task(evaluate(index)) for index in range(len(ids))]
+        for finished in asyncio.as_completed(tasks):
+            index, result = await finished
+            if isinstance(result, Exception):
+                record = {"id": ids[index], "status": "error", "error": f"{type(result).__name__}: {result}"}
+                summary["failed"] += 1
+            else:
+                record = {"id": ids[index], "status": "ok", **{field: result.get(field) for field in RESULT_FIELDS}}
+                summary["ok"] += 1
+            sink.write(json.dumps(record) + "\n")
+            sink.flush()
+
+    summary["seconds"] = time.perf_counter() - start
+    summary["essays_per_minute"] = len(ids) / summary["seconds"] * 60
+    return summary
+
+
+# Read {"id": ..., "essay": ...} lines
+def load_essays(path: str) -> dict[str, str]:
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return {str(row["id"]): row["essay"] for row in rows}
+
+
+# Swap the workflow's model for an offline fake with injected latency
+def use_fake_model(latency: float = 0.05, jitter: float = 0.02, fail_marker: str | None = "FAIL-ME") -> None:
+    fake = FakeChatModel(
+        latency=lambda: max(0.0, random.gauss(latency, jitter)),
+        fail_when=(lambda prompt: fail_marker in prompt) if fail_marker else None,
+    )
+    llm_parallel_workflow.structure_model = fake.with_structured_output(FeedbackSchema)
+    llm_parallel_workflow.rubric_model = fake.with_structured_output(RubricEvaluation)
+
+
+def synthetic_corpus(count: int) -> dict[str, str]:
+    corpus = {f"essay-{i}": f"Essay {i}: small pieces make big things possible. " * 20 for i in range(count)}
+    # One essay that always fails, to show it does not stop the others
+    corpus["essay-broken"] = "FAIL-ME " + corpus["essay-0"]
+    return corpus
+
+
+def benchmark(essays: int = 200, levels=(1, 8, 32, 128), latency: float = 0.05):
+    use_fake_model(latency)
+    corpus = synthetic_corpus(essays)
+    print(f"{len(corpus)} essays, fake model latency ~{latency * 1000:.0f} ms per call")
+    with tempfile.TemporaryDirectory() as tmp:
+        for level in levels:
+            summary = asyncio.run(evaluate_corpus(corpus, os.path.join(tmp, "results.jsonl"), level))
+            print(
+                f"concurrency {level:>4}: {summary['essays_per_minute']:>10,.0f} essays/min "
+                f"({summary['ok']} ok, {summary['failed']} failed, {summary['seconds']:.1f}s)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grade a corpus of essays concurrently")
+    parser.add_argument("essays", nargs="?", help="JSONL file with id and essay fields")
+    parser.add_argument("results", nargs="?", default="results.jsonl", help="JSONL sink for per-essay results")
+    parser.add_argument("--concurrency", type=int, default=16, help="maximum essays in flight")
+    parser.add_argument("--fake", action="store_true", help="use the offline fake model")
+    parser.add_argument("--mode", choices=EVALUATION_MODES, default=FAN_OUT, help="evaluator calls per essay: three (fan_out), one (single_call), or only where a resubmission changed (incremental)")
+    args = parser.parse_args()
+
+    if args.essays is None:
+        benchmark()
+    else:
+        if args.fake:
+            use_fake_model()
+        print(asyncio.run(evaluate_corpus(load_essays(args.essays), args.results, args.concurrency, args.mode)))
@@ -0,0 +1,245 @@
+import json
+import math
+import os
+import random
+import re
+import time
+from statistics import mean, median, quantiles
+
+from llm_parallel_workflow import (
+    FAN_OUT,
+    INCREMENTAL,
+    RUBRICS,
+    SINGLE_CALL,
+    FeedbackSchema,
+    RubricEvaluation,
+    get_workflow,
+    model,
+    stream_evaluation,
+)
+
+# Offline benchmarks of the essay evaluation workflow (llm_parallel_workflow.py): fan-out vs
+# single-call, incremental regrading on simulated resubmissions, and progressive results.
+# They run on the fake model (see fake_models.py) with simulated_responder as the grader.
+
+
+# Stand-in grader for the offline benchmark: rubric scores from simple text statistics, plus
+# -1/0/+1 of noise that depends on the exact prompt (so the two modes disagree a little, as
+# separate model calls do), and feedback of a realistic length
+def simulated_responder(essays: list[str]):
+    from fake_models import _digest
+
+    def grades(essay: str, prompt: str) -> dict[str, int]:
+        words = re.findall(r"[A-Za-z']+", essay)
+        sentences = [sentence for sentence in re.split(r"[.!?]+", essay) if sentence.strip()]
+        variety = len({word.lower() for word in words}) / len(words)
+        raw = {
+            "clarity_of_thought": 9 - abs(len(words) / len(sentences) - 20) / 3,
+            "depth_of_analysis": len(words) / 11,
+            "language": 14 * variety - 1,
+        }
+        return {rubric: max(0, min(10, round(value) + int(_digest(prompt + rubric), 16) % 3 - 1)) for rubric, value in raw.items()}
+
+    def feedback(label: str, words: int = 50) -> str:
+        return f"{label}: " + " ".join(f"point{index}" for index in range(words))
+
+    def respond(prompt: str, schema) -> str | None:
+        essay = next((essay for essay in essays if essay in prompt), None)
+        if schema is RubricEvaluation and essay is not None:
+            scores = grades(essay, prompt)
+            answer = {rubric: {"feedback": feedback(rubric), "score": score} for rubric, score in scores.items()}
+            return json.dumps({**answer, "final_feedback": feedback("summary", 80)})
+        if schema is FeedbackSchema and prompt.startswith("Based on the following individual feedbacks"):
+            scores = json.loads(re.search(r"Individual Scores: (\[[^\]]*\])", prompt).group(1))
+            return json.dumps({"feedback": feedback("summary", 80), "score": round(mean(scores))})
+        if schema is FeedbackSchema and essay is not None:
+            rubric = next(rubric for phrase, rubric in (("clarity of thought", "clarity_of_thought"), ("depth of analysis", "depth_of_analysis"), ("language used", "language")) if phrase in prompt)
+            return json.dumps({"feedback": feedback(rubric), "score": grades(essay, prompt)[rubric]})
+        return None
+
+    return respond
+
+
+# Fan-out vs single-call on a fixed essay set: model calls, tokens, latency per essay, and how
+# closely the single-call scores agree with the fan-out ones. Offline (the default) it uses a
+# fake model at 300 ms + 10 ms per token with simulated_responder; live=True uses the real model.
+def benchmark(essays: dict[str, str], live: bool = False) -> None:
+    from langchain_core.callbacks import UsageMetadataCallbackHandler
+
+    from fake_models import FakeChatModel
+
+    class Usage(UsageMetadataCallbackHandler):
+        calls = 0
+
+        def on_chat_model_start(self, *args, **kwargs):
+            with self._lock:
+                self.calls += 1
+
+    if not live:
+        model.override(FakeChatModel(model_name="gpt-4o-mini", latency=0.3, token_latency=0.01, responder=simulated_responder(list(essays.values()))))
+    workflow = get_workflow()
+    results = {}
+    print(f"{len(essays)} essays, {'live model' if live else 'fake model (300 ms + 10 ms/token, simulated grader)'}\n")
+    print(f"{'mode':<12} {'calls':>5} {'prompt tok':>10} {'output tok':>10} {'total tok':>9} {'p50 s':>6} {'max s':>6}")
+    for mode in (FAN_OUT, SINGLE_CALL):
+        usage, latencies, results[mode] = Usage(), [], {}
+        for essay_id, essay in essays.items():
+            start = time.perf_counter()
+            results[mode][essay_id] = workflow.invoke({"eassy": essay}, config={"configurable": {"evaluation_mode": mode}, "callbacks": [usage]})
+            latencies.append(time.perf_counter() - start)
+        tokens = {key: sum(counts.get(key, 0) for counts in usage.usage_metadata.values()) for key in ("input_tokens", "output_tokens", "total_tokens")}
+        print(
+            f"{mode:<12} {usage.calls:>5} {tokens['input_tokens']:>10} {tokens['output_tokens']:>10} {tokens['total_tokens']:>9} "
+            f"{median(latencies):>6.2f} {max(latencies):>6.2f}"
+        )
+
+    print(f"\nScore agreement, {SINGLE_CALL} vs {FAN_OUT}:")
+    rubrics = ("clarity of thought", "depth of analysis", "language")
+    for index, rubric in enumerate(rubrics):
+        differences = [abs(results[SINGLE_CALL][essay_id]["individual_scores"][index] - results[FAN_OUT][essay_id]["individual_scores"][index]) for essay_id in essays]
+        print(f"  {rubric:<20} mean |difference| {mean(differences):.2f}, within 1 point {sum(d <= 1 for d in differences) / len(differences):.0%}")
+    differences = [abs(results[SINGLE_CALL][essay_id]["avg_score"] - results[FAN_OUT][essay_id]["avg_score"]) for essay_id in essays]
+    print(f"  {'avg_score':<20} mean |difference| {mean(differences):.2f}, within 1 point {sum(d <= 1 for d in differences) / len(differences):.0%}")
+    # the fan-out average is the model's integer guess, the single-call one the exact mean
+    rounding = [abs(state["avg_score"] - mean(state["individual_scores"])) for state in results[FAN_OUT].values()]
+    print(f"  fan-out avg_score vs mean of its own scores: mean |difference| {mean(rounding):.2f}")
+
+
+# Resubmissions as students make them: each essay (split into paragraphs of 2-3 sentences) goes
+# through `revisions` edits, drawn with these weights: fix a typo, reword a sentence, add a
+# sentence, add a paragraph, cut a sentence, swap two paragraphs, resubmit unchanged
+EDITS = {"typo": 35, "reword": 20, "add_sentence": 12, "add_paragraph": 10, "cut_sentence": 10, "swap_paragraphs": 5, "unchanged": 8}
+
+def edit_trace(essays: dict[str, str], revisions: int = 6, seed: int = 0) -> list[tuple[str, str, str]]:
+    rng = random.Random(seed)
+    trace = []
+    for essay_id, essay in essays.items():
+        sentences = re.split(r"(?<=[.!?])\s+", essay.strip())
+        paragraphs, index = [], 0
+        while index < len(sentences):
+            size = rng.choice((2, 3))
+            paragraphs.append(sentences[index:index + size])
+            index += size
+        trace.append((essay_id, "original", "\n\n".join(" ".join(paragraph) for paragraph in paragraphs)))
+        for revision in range(revisions):
+            edit = rng.choices(list(EDITS), weights=list(EDITS.values()))[0]
+            paragraph = rng.randrange(len(paragraphs))
+            sentence = rng.randrange(len(paragraphs[paragraph]))
+            words = paragraphs[paragraph][sentence].split()
+            if edit == "typo":
+                word = rng.randrange(len(words))
+                words[word] = words[word][:-1] + words[word][-1].upper() if len(words[word]) > 1 else words[word] + "s"
+                paragraphs[paragraph][sentence] = " ".join(words)
+            elif edit == "reword":
+                paragraphs[paragraph][sentence] = " ".join(words[:-1]) + f", which I have thought about more since draft {revision + 1}."
+            elif edit == "add_sentence":
+                paragraphs[paragraph].insert(sentence + 1, f"This point matters because of revision {revision + 1} and what it adds to the argument.")
+            elif edit == "add_paragraph":
+                paragraphs.insert(paragraph + 1, [f"Another example, added in draft {revision + 1}, shows the same idea.", "It makes the argument stronger and more concrete.", "Readers can relate it to their own lives."])
+            elif edit == "cut_sentence" and len(paragraphs[paragraph]) > 1:
+                del paragraphs[paragraph][sentence]
+            elif edit == "swap_paragraphs" and len(paragraphs) > 1:
+                other = (paragraph + 1) % len(paragraphs)
+                paragraphs[paragraph], paragraphs[other] = paragraphs[other], paragraphs[paragraph]
+            trace.append((essay_id, edit, "\n\n".join(" ".join(paragraph) for paragraph in paragraphs)))
+    return trace
+
+
+# Model calls for every submission of an edit trace, regraded from scratch (fan_out) and
+# incrementally, on the fake model with simulated_responder; and how far the incremental
+# scores drift from a full regrade
+def incremental_benchmark(essays: dict[str, str], revisions: int = 6) -> None:
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    from fake_models import FakeChatModel
+
+    class Calls(BaseCallbackHandler):
+        count = 0
+
+        def on_chat_model_start(self, *args, **kwargs):
+            self.count += 1
+
+    trace = edit_trace(essays, revisions)
+    model.override(FakeChatModel(model_name="gpt-4o-mini", responder=simulated_responder([text for _, _, text in trace])))
+    workflow = get_workflow()
+    full, incremental = Calls(), Calls()
+    reruns = {rubric: 0 for rubric in RUBRICS} | {"finalize": 0}
+    drift = []
+    by_edit: dict[str, list[int]] = {}
+    for essay_id, edit, text in trace:
+        regraded = workflow.invoke({"eassy": text}, {"configurable": {"evaluation_mode": FAN_OUT}, "callbacks": [full]})
+        before = incremental.count
+        result = workflow.invoke({"eassy": text}, {"configurable": {"evaluation_mode": INCREMENTAL, "essay_id": essay_id}, "callbacks": [incremental]})
+        by_edit.setdefault(edit, []).append(incremental.count - before)
+        for rubric in result["revision"]["rerun"]:
+            reruns[rubric] += 1
+        reruns["finalize"] += result["revision"]["finalized"]
+        drift.append(abs(mean(result["individual_scores"]) - mean(regraded["individual_scores"])))
+
+    resubmissions = len(trace) - len(essays)
+    print(f"{len(essays)} essays, {revisions} revisions each ({len(trace)} submissions)\n")
+    print(f"{'':<24} {'calls':>6} {'per submission':>14}")
+    print(f"{'full regrade':<24} {full.count:>6} {full.count / len(trace):>14.2f}")
+    print(f"{'incremental':<24} {incremental.count:>6} {incremental.count / len(trace):>14.2f}")
+    print(f"calls saved: {1 - incremental.count / full.count:.0%} overall, {1 - (incremental.count - 4 * len(essays)) / (full.count - 4 * len(essays)):.0%} on the {resubmissions} resubmissions\n")
+    print("calls per resubmission by edit: " + ", ".join(f"{edit} {mean(calls):.1f}" for edit, calls in by_edit.items() if edit != "original"))
+    print("graded again on resubmission: " + ", ".join(f"{name} {count - len(essays)}/{resubmissions}" for name, count in reruns.items()))
+    print(f"mean |score difference| vs full regrade: {mean(drift):.2f}, within 1 point {sum(d <= 1 for d in drift) / len(drift):.0%}")
+
+
+# Time to first rubric result, to the provisional score and to the final summary with
+# stream_evaluation, against the blocking invoke, in fan_out mode. Offline, on the fake model
+# with simulated_responder: each call takes a random 0.2-2 s (log-normal, median 0.6 s) to
+# answer plus 10 ms per output token.
+def progressive_benchmark(essays: dict[str, str], runs: int = 5, seed: int = 0) -> None:
+    from fake_models import FakeChatModel
+
+    rng = random.Random(seed)
+    model.override(FakeChatModel(
+        model_name="gpt-4o-mini", latency=lambda: min(2.0, max(0.2, rng.lognormvariate(math.log(0.6), 0.6))), token_latency=0.01,
+        responder=simulated_responder(list(essays.values())),
+    ))
+    timings: dict[str, list[float]] = {"invoke": [], "first rubric": [], "provisional score": [], "final summary": []}
+    same = True
+    for _ in range(runs):
+        for essay in essays.values():
+            start = time.perf_counter()
+            expected = get_workflow().invoke({"eassy": essay})
+            timings["invoke"].append(time.perf_counter() - start)
+            events = list(stream_evaluation({"eassy": essay}))
+            timings["first rubric"].append(events[0]["elapsed"])
+            timings["provisional score"].append(next(event["elapsed"] for event in events if event["event"] == "provisional"))
+            timings["final summary"].append(events[-1]["elapsed"])
+            same = same and events[-1]["state"] == expected
+
+    print(f"{len(essays)} essays x {runs} runs, fake model 0.2-2 s per call (median 0.6 s) + 10 ms/token\n")
+    print(f"{'':<20} {'p50 s':>6} {'p90 s':>6}  vs invoke p50")
+    baseline = quantiles(timings["invoke"], n=10)[4]
+    for name, seconds in timings.items():
+        deciles = quantiles(seconds, n=10)
+        print(f"{name:<20} {deciles[4]:>6.2f} {deciles[8]:>6.2f}  {deciles[4] / baseline:>12.0%}")
+    print(f"\nfinal state identical to invoke: {same}")
+
+
+# The bundled sample essays, {"id": ..., "essay": ...} per line
+def sample_essays() -> dict[str, str]:
+    from essay_batch_runner import load_essays
+
+    return load_essays(os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_essays.jsonl"))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the essay evaluation modes on sample_essays.jsonl (default: fan_out vs single_call)")
+    parser.add_argument("--live", action="store_true", help="benchmark with the real model instead of a fake one")
+    parser.add_argument("--edit-trace", action="store_true", help="model calls of incremental regrading on simulated resubmissions")
+    parser.add_argument("--progressive-benchmark", action="store_true", help="time to first result and provisional score vs invoke")
+    args = parser.parse_args()
+
+    if args.progressive_benchmark:
+        progressive_benchmark(sample_essays())
+    elif args.edit_trace:
+        incremental_benchmark(sample_essays())
+    else:
+        benchmark(sample_essays(), live=args.live)
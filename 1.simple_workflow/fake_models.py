@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, Literal, get_args, get_origin
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import BaseModel
+
+
+# Deterministic stand-in for ChatOpenAI, so workflows can run offline (tests, benchmarks).
+# The same prompt always gets the same answer; latency is slept for real, in both the
+# sync (time.sleep) and async (asyncio.sleep) paths. `latency` is the time to the first token
+# and `token_latency` the time per further token, for both streamed and whole responses.
+class FakeChatModel(BaseChatModel):
+    model_name: str = "fake-chat"
+    latency: float | Callable[[], float] = 0.0  # seconds, or a function returning seconds
+    token_latency: float = 0.0  # seconds per token after the first
+    fail_when: Callable[[str], bool] | None = None  # raise for prompts matching this predicate
+    responder: Callable[[str, type[BaseModel] | None], str | None] | None = None  # custom answer, None for the default
+    structured_schema: type[BaseModel] | None = None  # set by with_structured_output
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    # Part of the cache key (llm_string), like model name and parameters are for ChatOpenAI
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        schema = self.structured_schema.model_json_schema() if self.structured_schema else None
+        return {"model_name": self.model_name, "structured_schema": schema}
+
+    def _delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _content(self, messages: list[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        if self.fail_when is not None and self.fail_when(prompt):
+            raise RuntimeError("fake model failure")
+        content = self.responder(prompt, self.structured_schema) if self.responder is not None else None
+        if content is not None:
+            return content
+        if self.structured_schema is not None:
+            return json.dumps(fake_structured_output(self.structured_schema, prompt))
+        return f"Fake response ({_digest(prompt)[:8]}) to: {prompt[:60]}"
+
+    # model_name in response_metadata, as ChatOpenAI reports it (UsageMetadataCallbackHandler keys on it)
+    def _respond(self, content: str, usage: dict | None = None) -> ChatResult:
+        message = AIMessage(content=content, usage_metadata=usage, response_metadata={"model_name": self.model_name})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        content = self._content(messages)
+        time.sleep(self._delay() + self.token_latency * max(len(_tokens(content)) - 1, 0))
+        return self._respond(content, _usage(messages, content))
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        content = self._content(messages)
+        await asyncio.sleep(self._delay() + self.token_latency * max(len(_tokens(content)) - 1, 0))
+        return self._respond(content, _usage(messages, content))
+
+    def _stream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        content = self._content(messages)
+        time.sleep(self._delay())
+        tokens = _tokens(content)
+        for index, token in enumerate(tokens):
+            if index:
+                time.sleep(self.token_latency)
+            # Usage rides on the last chunk, since chunk usage adds up when chunks are merged
+            last = index == len(tokens) - 1
+            usage = _usage(messages, content) if last else None
+            metadata = {"model_name": self.model_name} if last else {}
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage, response_metadata=metadata))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        content = self._content(messages)
+        await asyncio.sleep(self._delay())
+        tokens = _tokens(content)
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(self.token_latency)
+            # Usage rides on the last chunk, since chunk usage adds up when chunks are merged
+            last = index == len(tokens) - 1
+            usage = _usage(messages, content) if last else None
+            metadata = {"model_name": self.model_name} if last else {}
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage, response_metadata=metadata))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema: type[BaseModel], **kwargs: Any):
+        return self.model_copy(update={"structured_schema": schema}) | PydanticOutputParser(pydantic_object=schema)
+
+
+# Word-sized "tokens", each keeping its trailing whitespace so they join back exactly
+def _tokens(content: str) -> list[str]:
+    return re.findall(r"\S+\s*|\s+", content) or [""]
+
+
+# Token counts in the shape ChatOpenAI reports them, counting the same word-sized tokens
+def _usage(messages: list[BaseMessage], content: str) -> dict:
+    prompt = len(_tokens("\n".join(str(message.content) for message in messages)))
+    completion = len(_tokens(content))
+    return {"input_tokens": prompt, "output_tokens": completion, "total_tokens": prompt + completion}
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# Build a valid instance of `schema` whose values are derived from a hash of the prompt
+def fake_structured_output(schema: type[BaseModel], prompt: str) -> dict:
+    seed = int(_digest(prompt), 16)
+    values = {}
+    for index, (name, field) in enumerate(schema.model_fields.items()):
+        pick = seed >> (index * 8)
+        annotation = field.annotation
+        if get_origin(annotation) is Literal:
+            choices = get_args(annotation)
+            values[name] = choices[pick % len(choices)]
+        elif annotation in (int, float):
+            low, high = 0, 10
+            for constraint in field.metadata:
+                low = getattr(constraint, "ge", low)
+                high = getattr(constraint, "le", high)
+            values[name] = annotation(low + pick % (int(high - low) + 1))
+        elif annotation is bool:
+            values[name] = bool(pick % 2)
+        elif get_origin(annotation) is list:
+            values[name] = []
+        elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            values[name] = fake_structured_output(annotation, f"{prompt}\x00{name}")
+        else:
+            values[name] = f"Fake {name} ({_digest(prompt)[:8]})"
+    return values
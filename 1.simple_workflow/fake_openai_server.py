@@ -0,0 +1,204 @@
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Local stand-in for the OpenAI chat completions endpoint, with rate limits, so clients and the
+# scheduler (llm_scheduler.py) can be load-tested offline. Point ChatOpenAI at it with
+# base_url=server.url and any api_key.
+#   - requests/min and tokens/min are token buckets holding `burst` seconds' worth; a request
+#     over either limit gets a 429 with retry-after headers, like the real API
+#   - each request takes latency + token_latency per completion token, slowed down in
+#     proportion once more than `capacity` requests are in progress; beyond 2 x capacity the
+#     server answers 503 (overloaded)
+#   - the answer is `completion_tokens` words, or a placeholder value matching the requested JSON
+#     schema or tool; prompt tokens are counted as characters / 4
+class FakeOpenAIServer:
+    def __init__(
+        self,
+        requests_per_minute: float = 600,
+        tokens_per_minute: float = 60_000,
+        capacity: int = 16,
+        latency: float = 0.2,
+        token_latency: float = 0.002,
+        completion_tokens: int = 50,
+        burst: float = 1.0,
+        port: int = 0,
+    ):
+        from llm_scheduler import TokenBucket
+
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60 * burst)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60 * burst)
+        self.capacity = capacity
+        self.latency = latency
+        self.token_latency = token_latency
+        self.completion_tokens = completion_tokens
+        self.counters = {"served": 0, "rate_limited": 0, "overloaded": 0}
+        self.active = 0
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    # (status, headers, body) for one request body
+    def complete(self, body: dict) -> tuple[int, dict, bytes]:
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in body.get("messages", [])) // 4 + 1
+        tokens = prompt_tokens + int(body.get("max_tokens") or self.completion_tokens)
+        with self._lock:
+            wait = max(self.requests.take(1), self.tokens.take(tokens))
+            if wait > 0:
+                self.requests.adjust(1)
+                self.tokens.adjust(tokens)
+                self.counters["rate_limited"] += 1
+                return 429, {"retry-after-ms": str(int(wait * 1000) + 1), "retry-after": f"{wait:.3f}"}, _error("Rate limit reached", "rate_limit_exceeded")
+            if self.active >= 2 * self.capacity:
+                self.requests.adjust(1)
+                self.tokens.adjust(tokens)
+                self.counters["overloaded"] += 1
+                return 503, {}, _error("The server is overloaded", "server_overloaded")
+            self.active += 1
+            slowdown = max(1.0, self.active / self.capacity)
+        try:
+            time.sleep((self.latency + self.token_latency * self.completion_tokens) * slowdown)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.counters["served"] += 1
+        content = " ".join(f"word{index}" for index in range(self.completion_tokens))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.completion_tokens, "total_tokens": prompt_tokens + self.completion_tokens}
+        message = _message(body, content)
+        if body.get("stream"):
+            return 200, {"content-type": "text/event-stream"}, _stream(body.get("model", "fake"), message, usage)
+        return 200, {"content-type": "application/json"}, json.dumps(_completion(body.get("model", "fake"), message, usage)).encode()
+
+
+# The assistant message: `content` as text, or a value matching the requested JSON schema
+# (response_format) or the first tool's parameters (tools), so structured output parses
+def _message(body: dict, content: str) -> dict:
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return {"role": "assistant", "content": json.dumps(_fake_value(response_format["json_schema"].get("schema", {})))}
+    if response_format.get("type") == "json_object":
+        return {"role": "assistant", "content": json.dumps({"content": content})}
+    if body.get("tools"):
+        function = body["tools"][0]["function"]
+        arguments = json.dumps(_fake_value(function.get("parameters", {})))
+        call = {"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function", "function": {"name": function["name"], "arguments": arguments}}
+        return {"role": "assistant", "content": None, "tool_calls": [call]}
+    return {"role": "assistant", "content": content}
+
+
+def _fake_value(schema: dict, definitions: dict | None = None):
+    definitions = definitions if definitions is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return _fake_value(definitions[schema["$ref"].rsplit("/", 1)[-1]], definitions)
+    for combined in ("anyOf", "oneOf", "allOf"):
+        if schema.get(combined):
+            return _fake_value(schema[combined][0], definitions)
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {name: _fake_value(field, definitions) for name, field in schema.get("properties", {}).items()}
+    if kind in ("integer", "number"):
+        return schema.get("minimum", 0) + (1 if "maximum" in schema else 0)
+    return {"boolean": False, "array": [], "null": None}.get(kind, "fake")
+
+
+# Room for bursts of new connections (the default listen backlog is 5)
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 256
+
+
+def _error(message: str, code: str) -> bytes:
+    return json.dumps({"error": {"message": message, "type": "requests", "param": None, "code": code}}).encode()
+
+
+def _completion(model: str, message: dict, usage: dict) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+        "usage": usage,
+    }
+
+
+# The whole answer as server-sent events, one word per chunk (sent at once, not paced)
+def _stream(model: str, message: dict, usage: dict) -> bytes:
+    base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+    if message.get("tool_calls"):
+        deltas = [{"role": "assistant", "tool_calls": [{"index": 0, **message["tool_calls"][0]}]}]
+    else:
+        deltas = [{"role": "assistant", "content": word} for word in re.findall(r"\S+\s*", message["content"])]
+    chunks = [{**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]} for delta in deltas]
+    chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage})
+    return b"".join(f"data: {json.dumps(chunk)}\n\n".encode() for chunk in chunks) + b"data: [DONE]\n\n"
+
+
+def _handler(server: FakeOpenAIServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def do_POST(self):
+            length = int(self.headers.get("content-length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                status, headers, payload = 404, {}, _error(f"Unknown path {self.path}", "not_found")
+            else:
+                status, headers, payload = server.complete(body)
+            self.send_response(status)
+            self.send_header("content-type", headers.pop("content-type", "application/json"))
+            self.send_header("content-length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rate-limited stand-in for the OpenAI chat completions API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rpm", type=float, default=600)
+    parser.add_argument("--tpm", type=float, default=60_000)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(args.rpm, args.tpm, port=args.port)
+    print(f"Serving on {server.url} (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
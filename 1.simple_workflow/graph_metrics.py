@@ -0,0 +1,508 @@
+import argparse
+import copy
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import var_child_runnable_config
+from langchain_core.tracers.context import register_configure_hook
+
+# Histogram bucket upper bounds in seconds, from pure-Python nodes (tens of µs) to LLM calls
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD per 1M (prompt, completion) tokens; a model matches the longest name it starts with
+PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+
+# The token callback of the node run in progress. LangChain adds it to every callback manager
+# configured while it is set, so LLM calls made inside a node report to it, while the graph's
+# other runnables never see it (a graph-level handler costs ~3% of a pure-Python invoke even
+# when it ignores chain events). Setting it costs less than adding the handler to the node's
+# callback manager, which every node run would pay for.
+_node_tokens: ContextVar["TokenUsageCallback | None"] = ContextVar("graph_metrics_node_tokens", default=None)
+register_configure_hook(_node_tokens, inheritable=True)
+
+
+# Fixed-bucket histogram in the Prometheus layout: counts[i] holds the values <= bounds[i]
+# (and above bounds[i - 1]), the last slot everything above the largest bound
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...] = BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Estimated quantile, interpolating linearly inside the bucket it falls in
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.bounds[index - 1] if index else 0.0
+                high = self.bounds[index] if index < len(self.bounds) else low
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": {str(bound): count for bound, count in zip(self.bounds, self.counts)} | {"+Inf": self.counts[-1]},
+        }
+
+
+@dataclass
+class NodeStats:
+    duration: Histogram  # seconds spent in the node function
+    wait: Histogram  # seconds between the first task of the superstep starting and this one
+    runs: int = 0
+    errors: int = 0
+    retries: int = 0
+    tokens: dict[str, list[int]] = field(default_factory=dict)  # model -> [prompt, completion]
+
+
+# Per-node latency, queue time, token and cost metrics for any compiled graph.
+#
+#   metrics = GraphMetrics()
+#   workflow = metrics.instrument(get_workflow())
+#   workflow.invoke(...)
+#   print(metrics.to_prometheus())
+#
+# Node functions are wrapped directly instead of listening to LangChain chain callbacks: a
+# callback handler that listens to chain events costs ~7% of a pure-Python invoke even when
+# it does nothing. Token usage comes from a callback handler that only listens to LLM events.
+class GraphMetrics:
+    def __init__(
+        self,
+        buckets: tuple[float, ...] = BUCKETS,
+        prices: dict[str, tuple[float, float]] | None = None,
+        max_open: int = 4096,
+        fold_every: int = 1024,
+    ):
+        self.buckets = buckets
+        self.prices = PRICES if prices is None else prices
+        self.max_open = max_open
+        self.fold_every = fold_every
+        self._pending: list = []  # (node key, start, end, checkpoint_map, task id, failed) not folded yet
+        self.nodes: dict[tuple[str, str], NodeStats] = {}
+        self._steps: OrderedDict = OrderedDict()  # superstep key -> first task start
+        self._failed: OrderedDict = OrderedDict()  # task ids that raised, to count retries
+        self._lock = threading.Lock()
+
+    # A copy of `workflow` (compiled from the same builder, with the same checkpointer, store
+    # and interrupts) whose nodes report to this object. `graph` labels its metrics.
+    def instrument(self, workflow, graph: str | None = None):
+        from langgraph.errors import GraphBubbleUp
+
+        label = graph or workflow.name
+        tokens = TokenUsageCallback(self, label)
+        builder = copy.copy(workflow.builder)
+        builder.nodes = {
+            name: replace(spec, runnable=self._wrap_runnable(label, name, spec.runnable, tokens, GraphBubbleUp))
+            for name, spec in workflow.builder.nodes.items()
+        }
+        instrumented = builder.compile(
+            checkpointer=workflow.checkpointer,
+            cache=workflow.cache,
+            store=workflow.store,
+            interrupt_before=workflow.interrupt_before_nodes,
+            interrupt_after=workflow.interrupt_after_nodes,
+            debug=workflow.debug,
+            name=workflow.name,
+        )
+        return instrumented.with_config(workflow.config) if workflow.config else instrumented
+
+    # Node functions are swapped on a copy of the node runnable, so the signature inspection
+    # LangGraph did (config, store, writer, ... arguments) still applies. Nodes that are not
+    # function wrappers (e.g. a compiled subgraph) are left as they are.
+    def _wrap_runnable(self, graph: str, node: str, runnable, tokens: "TokenUsageCallback", control_flow: type[BaseException]):
+        func, afunc = getattr(runnable, "func", None), getattr(runnable, "afunc", None)
+        if func is None and afunc is None:
+            return runnable
+        wrapped = copy.copy(runnable)
+        if func is not None:
+            wrapped.func = self._timed(graph, node, func, tokens, control_flow)
+        if afunc is not None:
+            wrapped.afunc = self._atimed(graph, node, afunc, tokens, control_flow)
+        return wrapped
+
+    def _timed(self, graph: str, node: str, func: Callable, tokens: "TokenUsageCallback", control_flow: type[BaseException]) -> Callable:
+        key = (graph, node)
+        pending = self._pending
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            config = var_child_runnable_config.get()
+            configurable = config.get("configurable") if config else None
+            node_tokens = _node_tokens.set(tokens)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except control_flow:
+                raise
+            except BaseException:
+                self._record(key, start, configurable, True)
+                raise
+            finally:
+                _node_tokens.reset(node_tokens)
+            if configurable is not None and len(pending) < self.fold_every:  # _record, inlined
+                pending.append((key, start, time.perf_counter(), configurable.get("checkpoint_map"), configurable.get("__pregel_task_id"), False))
+            else:
+                self._record(key, start, configurable, False)
+            return result
+
+        return timed
+
+    def _atimed(self, graph: str, node: str, afunc: Callable, tokens: "TokenUsageCallback", control_flow: type[BaseException]) -> Callable:
+        key = (graph, node)
+        pending = self._pending
+
+        @wraps(afunc)
+        async def timed(*args, **kwargs):
+            config = var_child_runnable_config.get()
+            configurable = config.get("configurable") if config else None
+            node_tokens = _node_tokens.set(tokens)
+            start = time.perf_counter()
+            try:
+                result = await afunc(*args, **kwargs)
+            except control_flow:
+                raise
+            except BaseException:
+                self._record(key, start, configurable, True)
+                raise
+            finally:
+                _node_tokens.reset(node_tokens)
+            if configurable is not None and len(pending) < self.fold_every:  # _record, inlined
+                pending.append((key, start, time.perf_counter(), configurable.get("checkpoint_map"), configurable.get("__pregel_task_id"), False))
+            else:
+                self._record(key, start, configurable, False)
+            return result
+
+        return timed
+
+    # The hot path only appends the run to `_pending` (list.append is atomic); the histograms
+    # and counters are updated in batches of `fold_every` runs, or when the metrics are read.
+    # Only the superstep's checkpoint ids and the task id are kept, not the whole config, which
+    # would keep the run's callback managers alive until the fold.
+    def _record(self, key: tuple[str, str], start: float, configurable: dict | None, failed: bool) -> None:
+        end = time.perf_counter()
+        if configurable:
+            self._pending.append((key, start, end, configurable.get("checkpoint_map"), configurable.get("__pregel_task_id"), failed))
+        else:
+            self._pending.append((key, start, end, None, None, failed))
+        if len(self._pending) >= self.fold_every:
+            self._fold()
+
+    # Folds the pending runs into the node stats. A superstep is identified by its checkpoint
+    # ids (`checkpoint_map`), which change every step; its first task start is the earliest
+    # start folded so far, so a wait is exact unless a fold splits a superstep.
+    def _fold(self) -> None:
+        with self._lock:
+            count = len(self._pending)
+            runs = self._pending[:count]
+            del self._pending[:count]  # runs appended meanwhile stay for the next fold
+            first_starts = self._steps
+            step_keys = []
+            for _, start, _, steps, _, _ in runs:
+                step = tuple(steps.values()) if steps else None
+                if step is not None and start < first_starts.get(step, start + 1):
+                    first_starts[step] = start
+                step_keys.append(step)
+            nodes, bounds = self.nodes, self.buckets
+            for (key, start, end, _, task_id, failed), step in zip(runs, step_keys):
+                stats = nodes.get(key)
+                if stats is None:
+                    stats = nodes[key] = NodeStats(Histogram(bounds), Histogram(bounds))
+                stats.runs += 1
+                # Histogram.observe, inlined
+                duration, wait = stats.duration, stats.wait
+                value = end - start
+                duration.counts[bisect_left(bounds, value)] += 1
+                duration.sum += value
+                duration.count += 1
+                value = start - first_starts[step] if step is not None else 0.0
+                wait.counts[bisect_left(bounds, value)] += 1
+                wait.sum += value
+                wait.count += 1
+                if self._failed and self._failed.pop(task_id, None) is not None:
+                    stats.retries += 1  # the same task ran again after raising
+                if failed:
+                    stats.errors += 1
+                    if task_id is not None:
+                        self._failed[task_id] = True
+                        if len(self._failed) > self.max_open:
+                            self._failed.popitem(last=False)
+            while len(first_starts) > self.max_open:
+                first_starts.popitem(last=False)
+
+    def record_tokens(self, graph: str, node: str, model: str, prompt: int, completion: int) -> None:
+        with self._lock:
+            stats = self.nodes.get((graph, node))
+            if stats is None:
+                stats = self.nodes[(graph, node)] = NodeStats(Histogram(self.buckets), Histogram(self.buckets))
+            counts = stats.tokens.setdefault(model, [0, 0])
+            counts[0] += prompt
+            counts[1] += completion
+
+    def cost(self, model: str, prompt: int, completion: int) -> float:
+        matches = [name for name in self.prices if model.startswith(name)]
+        if not matches:
+            return 0.0
+        prompt_price, completion_price = self.prices[max(matches, key=len)]
+        return (prompt * prompt_price + completion * completion_price) / 1_000_000
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self.nodes.clear()
+            self._steps.clear()
+            self._failed.clear()
+
+    # {graph: {node: {...}}}, durations in seconds
+    def snapshot(self) -> dict:
+        self._fold()
+        with self._lock:
+            items = sorted(self.nodes.items())
+            report: dict = {}
+            for (graph, node), stats in items:
+                report.setdefault(graph, {})[node] = {
+                    "runs": stats.runs,
+                    "errors": stats.errors,
+                    "retries": stats.retries,
+                    "duration_seconds": stats.duration.to_dict(),
+                    "wait_seconds": stats.wait.to_dict(),
+                    "tokens": {
+                        model: {"prompt": prompt, "completion": completion, "cost_usd": self.cost(model, prompt, completion)}
+                        for model, (prompt, completion) in sorted(stats.tokens.items())
+                    },
+                }
+            return report
+
+    def to_json(self, indent: int | None = 2) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+    # Prometheus text exposition format (version 0.0.4)
+    def to_prometheus(self) -> str:
+        self._fold()
+        with self._lock:
+            items = sorted(self.nodes.items())
+            lines = []
+            for name, kind, text, value in (
+                ("langgraph_node_runs_total", "counter", "Node runs, including failed ones", lambda s: s.runs),
+                ("langgraph_node_errors_total", "counter", "Node runs that raised", lambda s: s.errors),
+                ("langgraph_node_retries_total", "counter", "Node runs that retried a task which raised", lambda s: s.retries),
+            ):
+                lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{{{_labels(graph=graph, node=node)}}} {value(stats)}" for (graph, node), stats in items]
+            for name, text, histogram in (
+                ("langgraph_node_duration_seconds", "Wall time of the node function", lambda s: s.duration),
+                ("langgraph_node_wait_seconds", "Time between the superstep's first task starting and this node starting", lambda s: s.wait),
+            ):
+                lines += [f"# HELP {name} {text}", f"# TYPE {name} histogram"]
+                for (graph, node), stats in items:
+                    lines += _histogram_lines(name, _labels(graph=graph, node=node), histogram(stats))
+            for name, text, value in (
+                ("langgraph_node_prompt_tokens_total", "Prompt tokens sent by LLM calls in the node", lambda model, p, c: p),
+                ("langgraph_node_completion_tokens_total", "Completion tokens received by LLM calls in the node", lambda model, p, c: c),
+                ("langgraph_node_cost_usd_total", "Estimated LLM cost of the node in USD", lambda model, p, c: f"{self.cost(model, p, c):.8f}"),
+            ):
+                lines += [f"# HELP {name} {text}", f"# TYPE {name} counter"]
+                for (graph, node), stats in items:
+                    for model, (prompt, completion) in sorted(stats.tokens.items()):
+                        lines.append(f"{name}{{{_labels(graph=graph, node=node, model=model)}}} {value(model, prompt, completion)}")
+            return "\n".join(lines) + "\n"
+
+    # Serve /metrics (Prometheus) and /metrics.json from a background thread
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body, content_type = metrics.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# Attributes LLM token usage to the node that made the call (metadata["langgraph_node"]).
+# Chain, retriever and agent events are ignored, so runnables inside a node that are not
+# models (parsers, prompt templates) cost next to nothing extra.
+class TokenUsageCallback(BaseCallbackHandler):
+    ignore_chain = True
+    ignore_retriever = True
+    ignore_agent = True
+    ignore_custom_event = True
+
+    def __init__(self, metrics: GraphMetrics, graph: str):
+        self.metrics = metrics
+        self.graph = graph
+        self._calls: dict = {}  # run_id -> (node, model)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, invocation_params=None, **kwargs: Any) -> None:
+        self._started(run_id, metadata, invocation_params)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, invocation_params=None, **kwargs: Any) -> None:
+        self._started(run_id, metadata, invocation_params)
+
+    def _started(self, run_id, metadata: dict | None, invocation_params: dict | None) -> None:
+        metadata = metadata or {}
+        params = invocation_params or {}
+        node = metadata.get("langgraph_node")
+        if node is not None:
+            model = metadata.get("ls_model_name") or params.get("model_name") or params.get("model") or "unknown"
+            self._calls[run_id] = (node, model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any) -> None:
+        call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        prompt = completion = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                # LangChain marks responses served from the LLM cache with total_cost 0
+                if usage and usage.get("total_cost") != 0:
+                    prompt += usage.get("input_tokens", 0)
+                    completion += usage.get("output_tokens", 0)
+        if not prompt and not completion:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        self.metrics.record_tokens(self.graph, call[0], call[1], prompt, completion)
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._calls.pop(run_id, None)
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _histogram_lines(name: str, labels: str, histogram: Histogram) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+# Cost of the instrumentation on the BMI graph: `runs` pairs of plain and instrumented
+# workflow.invoke of the same graph, back to back (alternating which goes first), so drift in
+# machine load hits both alike. The garbage collector is paused; the overhead is the median of
+# the per-pair differences, which is far less noisy than either timing on its own, plus the
+# time spent folding the recorded runs, spread over all invokes.
+# Returns (plain invoke µs, instrumentation µs per invoke).
+def measure_overhead(runs: int = 10000) -> tuple[float, float]:
+    import gc
+    from statistics import median
+
+    from bmi_calculator_workflow import get_workflow
+
+    plain = get_workflow()
+    metrics = GraphMetrics()
+    instrumented = metrics.instrument(plain)
+    state = {"weight": 70.0, "height": 1.75, "bmi": 0.0, "category": ""}
+
+    def timed(workflow) -> float:
+        start = time.perf_counter()
+        workflow.invoke(dict(state))
+        return time.perf_counter() - start
+
+    for _ in range(200):  # warm up
+        timed(plain), timed(instrumented)
+    metrics._fold()
+    plain_us, differences, folding = [], [], 0.0
+    gc.disable()
+    try:
+        for index in range(runs):
+            order = (plain, instrumented) if index % 2 == 0 else (instrumented, plain)
+            timings = {workflow: timed(workflow) for workflow in order}
+            plain_us.append(timings[plain] * 1e6)
+            differences.append((timings[instrumented] - timings[plain]) * 1e6)
+            if len(metrics._pending) >= metrics.fold_every // 2:
+                start = time.perf_counter()
+                metrics._fold()
+                folding += time.perf_counter() - start
+    finally:
+        gc.enable()
+    return median(plain_us), median(differences) + folding / runs * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-node metrics for LangGraph workflows")
+    parser.add_argument("--runs", type=int, default=10000, help="BMI invokes per graph for the overhead check")
+    parser.add_argument("--essays", type=int, default=20, help="essays to evaluate with the fake model")
+    parser.add_argument("--format", choices=["prometheus", "json"], default="prometheus")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="keep serving /metrics on this port")
+    args = parser.parse_args()
+
+    invoke_us, overhead_us = measure_overhead(args.runs)
+    print(f"bmi_calculator_workflow: {invoke_us:.0f} µs per invoke, instrumentation {overhead_us:.1f} µs per invoke ({overhead_us / invoke_us:.2%})\n")
+
+    # Token and cost metrics from the parallel essay graph, with the fake model standing in for OpenAI
+    os.environ.setdefault("LLM_CACHE", "off")
+    import llm_parallel_workflow
+    from fake_models import FakeChatModel
+
+    llm_parallel_workflow.model.override(FakeChatModel(model_name="gpt-4o-mini", latency=0.05, token_latency=0.001))
+    metrics = GraphMetrics()
+    workflow = metrics.instrument(llm_parallel_workflow.get_workflow(), graph="essay_evaluation")
+    for index in range(args.essays):
+        workflow.invoke({"eassy": f"Essay #{index}: small pieces make big things possible. " * 20})
+    print(metrics.to_prometheus() if args.format == "prometheus" else metrics.to_json())
+
+    if args.serve:
+        metrics.serve(args.serve)
+        print(f"Serving http://127.0.0.1:{args.serve}/metrics (Ctrl+C to stop)")
+        threading.Event().wait()
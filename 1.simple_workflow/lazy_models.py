@@ -0,0 +1,90 @@
+import threading
+from typing import Any, Callable
+
+
+# Stand-in for a chat model (or any runnable built from one) that is only constructed on first
+# use, so importing a workflow module does not import langchain_openai, read .env or open the
+# response cache. Attribute access (invoke, ainvoke, batch, with_structured_output, ...) is
+# forwarded to the real object.
+class LazyModel:
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    # Use `instance` instead of building the real object, e.g. a fake model for offline runs.
+    # Lazy structured models built from this one follow it. Returns the object used so far
+    # (None if nothing was built yet); passing that back restores it, and None rebuilds the
+    # real object on next use.
+    def override(self, instance: Any) -> Any:
+        with self._lock:
+            previous, self._instance = self._instance, instance
+        return previous
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+# Lazy ChatOpenAI(**kwargs), sharing the process-wide response cache when `cached` and sending
+# every request through the process-wide scheduler (rate limits, adaptive concurrency, retries,
+# one pooled HTTP client) when `scheduled`
+def chat_openai(cached: bool = True, scheduled: bool = True, **kwargs: Any) -> LazyModel:
+    def build():
+        from dotenv import load_dotenv
+        from langchain_openai import ChatOpenAI
+
+        load_dotenv()
+        if cached:
+            from llm_cache import get_llm_cache
+
+            kwargs.setdefault("cache", get_llm_cache())
+        if scheduled:
+            from llm_scheduler import get_http_clients
+
+            clients = get_http_clients()
+            if clients is not None:
+                kwargs.setdefault("http_client", clients[0])
+                kwargs.setdefault("http_async_client", clients[1])
+                kwargs.setdefault("max_retries", 0)  # the scheduler retries
+        return ChatOpenAI(**kwargs)
+
+    return LazyModel(build)
+
+
+# Lazy model.with_structured_output(schema). With a lazy `model`, it is built again whenever
+# that model's object changes (e.g. after an override), unless it was overridden itself.
+def structured(model: Any, schema: type) -> LazyModel:
+    if isinstance(model, LazyModel):
+        return _DerivedModel(model, lambda base: base.with_structured_output(schema))
+    return LazyModel(lambda: model.with_structured_output(schema))
+
+
+class _DerivedModel(LazyModel):
+    def __init__(self, source: LazyModel, build: Callable[[Any], Any]):
+        super().__init__(lambda: build(source.get()))
+        self._source = source
+        self._build = build
+        self._built_from = None
+        self._pinned = False
+
+    def get(self) -> Any:
+        base = self._source.get()
+        if self._instance is None or not (self._pinned or self._built_from is base):
+            with self._lock:
+                if self._instance is None or not (self._pinned or self._built_from is base):
+                    self._instance, self._built_from = self._build(base), base
+        return self._instance
+
+    def override(self, instance: Any) -> Any:
+        with self._lock:
+            previous, self._instance, self._pinned = self._instance, instance, instance is not None
+        return previous
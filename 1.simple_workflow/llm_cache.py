@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+from pydantic import BaseModel
+
+_CLASS_REPR = re.compile(r"<class '([\w.]+)'>")
+
+# Only model outputs are ever stored, so only those classes may be revived from disk
+_STORED_CLASSES = [ChatGeneration, Generation, AIMessage]
+
+
+# Two-tier response cache for chat models: an in-memory LRU (size + TTL eviction) in front of
+# a SQLite table that survives restarts. Plug it into a model with ChatOpenAI(cache=...);
+# with_structured_output variants share it, and the output schema is part of the key.
+class TieredLLMCache(BaseCache):
+    def __init__(self, path: str = ".llm_cache.sqlite", max_entries: int = 1024, ttl: float | None = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._memory: OrderedDict[str, tuple[float, RETURN_VAL_TYPE]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+        self._db.commit()
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[1]
+
+            row = self._db.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                generations = loads(row[0], allowed_objects=_STORED_CLASSES)
+                self._remember(key, row[1], generations)
+                self.counters["disk_hits"] += 1
+                return generations
+
+            self.counters["misses"] += 1
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = cache_key(prompt, llm_string)
+        expires_at = time.time() + self.ttl if self.ttl is not None else float("inf")
+        generations = [_serializable(generation) for generation in return_val]
+        with self._lock:
+            self._remember(key, expires_at, generations)
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, dumps(generations), expires_at),
+            )
+            self._db.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM llm_cache")
+            self._db.commit()
+
+    # Local lookups are fast enough to run on the event loop directly
+    async def alookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        return self.lookup(prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.update(prompt, llm_string, return_val)
+
+    # Drop the in-memory tier only, e.g. to simulate a fresh process that still has the disk store
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> dict:
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {**self.counters, "hit_rate": hits / lookups if lookups else 0.0, "memory_entries": len(self._memory)}
+
+    def _remember(self, key: str, expires_at: float, generations: RETURN_VAL_TYPE) -> None:
+        self._memory[key] = (expires_at, generations)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+
+# ChatOpenAI's structured output keeps the parsed pydantic object in additional_kwargs;
+# store it as a plain dict, which the structured-output parser accepts as well.
+def _serializable(generation):
+    if isinstance(generation, ChatGeneration):
+        parsed = generation.message.additional_kwargs.get("parsed")
+        if isinstance(parsed, BaseModel):
+            message = generation.message.model_copy(
+                update={"additional_kwargs": {**generation.message.additional_kwargs, "parsed": parsed.model_dump()}}
+            )
+            return generation.model_copy(update={"message": message})
+    return generation
+
+
+# llm_string names the output schema only as "<class 'module.Schema'>"; swap in its JSON schema
+# so that editing a schema (or two schemas sharing a name) never reuses a stale answer.
+def _expand_schema(match: re.Match) -> str:
+    module_name, _, class_name = match.group(1).rpartition(".")
+    cls = getattr(sys.modules.get(module_name), class_name, None)
+    if isinstance(cls, type) and issubclass(cls, BaseModel):
+        return json.dumps(cls.model_json_schema(), sort_keys=True)
+    return match.group(0)
+
+
+def _normalize_prompt(prompt: str) -> str:
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt.strip()
+    for message in messages if isinstance(messages, list) else []:
+        content = message.get("kwargs", {}).get("content")
+        if isinstance(content, str):
+            message["kwargs"]["content"] = content.replace("\r\n", "\n").strip()
+    return json.dumps(messages, sort_keys=True, separators=(",", ":"))
+
+
+# Hash of model name + parameters (+ output schema) and the normalized prompt
+def cache_key(prompt: str, llm_string: str) -> str:
+    normalized = _CLASS_REPR.sub(_expand_schema, llm_string) + "\x00" + _normalize_prompt(prompt)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+_shared_cache: TieredLLMCache | None = None
+
+
+# Process-wide cache shared by every workflow. Configure with environment variables:
+# LLM_CACHE=off, LLM_CACHE_PATH, LLM_CACHE_SIZE (entries), LLM_CACHE_TTL (seconds)
+def get_llm_cache() -> TieredLLMCache | None:
+    global _shared_cache
+    if os.getenv("LLM_CACHE", "on").lower() in ("off", "0", "false"):
+        return None
+    if _shared_cache is None:
+        _shared_cache = TieredLLMCache(
+            path=os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite"),
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+        )
+    return _shared_cache
+
+
+def _p50_ms(model, prompts: list[str]) -> float:
+    timings = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        model.invoke(prompt)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+# Cold vs warm latency against a local fake model (no network, no API key)
+def benchmark(prompts: int = 50, latency: float = 0.2):
+    import tempfile
+
+    from fake_models import FakeChatModel
+
+    class FeedbackSchema(BaseModel):
+        feedback: str
+        score: int
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredLLMCache(path=os.path.join(tmp, "cache.sqlite"), max_entries=prompts)
+        model = FakeChatModel(latency=latency, cache=cache)
+        structured = model.with_structured_output(FeedbackSchema)
+        texts = [f"Provide feedback on essay number {i}" for i in range(prompts)]
+
+        print(f"{prompts} prompts, fake model latency {latency * 1000:.0f} ms")
+        for label, runnable in (("text", model), ("structured", structured)):
+            cold = _p50_ms(runnable, texts)
+            memory = _p50_ms(runnable, texts)
+            cache.clear_memory()
+            disk = _p50_ms(runnable, texts)
+            print(f"{label:>10}: cold p50 {cold:8.2f} ms | warm (memory) p50 {memory:6.3f} ms | warm (disk) p50 {disk:6.3f} ms")
+        print(cache.stats())
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,307 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any
+
+
+# Hedged model calls (as in "The Tail at Scale"): when a call has not answered by the usual
+# latency of that model (a percentile of its recent calls), a duplicate is sent and the first
+# valid answer wins; the other request is cancelled. A few percent of extra calls remove most
+# of the stragglers that otherwise set the p99 of a graph run.
+#   - each HedgedModel keeps a rolling latency histogram of its own calls (a rubric prompt and
+#     a summary prompt have different latencies); the hedge delay is its `percentile`
+#   - one HedgeBudget per process caps the duplicates at `budget` extra calls per call
+#   - "valid" means the call returned: a duplicate also covers a primary that fails (e.g. an
+#     answer that does not parse into the schema) after the duplicate was sent
+#   - the async path cancels the losing request; the sync path can only drop its answer
+
+
+# Log-spaced latency buckets (`growth` apart, from `smallest` seconds), counting the last
+# `window` to 2 × `window` samples: the previous generation is dropped when the current one fills
+class LatencyHistogram:
+    def __init__(self, window: int = 1000, growth: float = 1.05, smallest: float = 0.001):
+        self.window = window
+        self.growth = growth
+        self.smallest = smallest
+        self._current: dict[int, int] = {}
+        self._previous: dict[int, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size + sum(self._previous.values())
+
+    def record(self, seconds: float) -> None:
+        bucket = max(0, math.ceil(math.log(max(seconds, self.smallest) / self.smallest, self.growth)))
+        with self._lock:
+            if self._size >= self.window:
+                self._previous, self._current, self._size = self._current, {}, 0
+            self._current[bucket] = self._current.get(bucket, 0) + 1
+            self._size += 1
+
+    # Upper edge of the bucket holding the `q` quantile (None without samples)
+    def percentile(self, q: float) -> float | None:
+        with self._lock:
+            counts = dict(self._previous)
+            for bucket, count in self._current.items():
+                counts[bucket] = counts.get(bucket, 0) + count
+        total = sum(counts.values())
+        seen = 0
+        for bucket in sorted(counts):
+            seen += counts[bucket]
+            if seen >= q * total:
+                return self.smallest * self.growth ** bucket
+        return None
+
+
+# At most `budget` duplicates per call over time: every call adds `budget` tokens (up to
+# `burst`), every duplicate takes one
+class HedgeBudget:
+    def __init__(self, budget: float = 0.05, burst: float = 5.0):
+        self.budget = budget
+        self.burst = burst
+        self.tokens = burst
+        self._lock = threading.Lock()
+
+    def add_call(self) -> None:
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.budget)
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+# Hedging settings and counters shared by the HedgedModels of a process: calls, hedged
+# (duplicates sent), hedge_wins (the duplicate answered first), denied (slow calls not hedged
+# because the budget was spent), failed (attempts that raised)
+class Hedger:
+    def __init__(self, percentile: float = 0.95, budget: float = 0.05, min_samples: int = 50, window: int = 1000):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.budget = HedgeBudget(budget)
+        self.counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "denied": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += amount
+
+    # Seconds to wait before hedging a call of a model with this histogram (None: don't hedge yet)
+    def delay(self, histogram: LatencyHistogram) -> float | None:
+        if len(histogram) < self.min_samples:
+            return None
+        return histogram.percentile(self.percentile)
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self.counters["calls"]
+            return {**self.counters, "extra_calls": self.counters["hedged"] / calls if calls else 0.0}
+
+
+# `runnable` (a model, or a structured-output chain) with hedged invoke/ainvoke. Other
+# attributes are forwarded, so it stands in wherever the nodes call the model.
+class HedgedModel:
+    def __init__(self, runnable: Any, hedger: Hedger):
+        self.runnable = runnable
+        self.hedger = hedger
+        self.histogram = LatencyHistogram(window=hedger.window)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.runnable, name)
+
+    def _timed(self, input: Any, config: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            result = self.runnable.invoke(input, config, **kwargs)
+        except Exception:
+            self.hedger.count("failed")
+            raise
+        self.histogram.record(time.perf_counter() - start)
+        return result
+
+    async def _atimed(self, input: Any, config: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await self.runnable.ainvoke(input, config, **kwargs)
+        except Exception:
+            self.hedger.count("failed")
+            raise
+        self.histogram.record(time.perf_counter() - start)
+        return result
+
+    def _start(self) -> float | None:
+        self.hedger.count("calls")
+        self.hedger.budget.add_call()
+        return self.hedger.delay(self.histogram)
+
+    def _hedge(self) -> bool:
+        if self.hedger.budget.take():
+            self.hedger.count("hedged")
+            return True
+        self.hedger.count("denied")
+        return False
+
+    def invoke(self, input: Any, config: Any = None, **kwargs: Any) -> Any:
+        from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+        delay = self._start()
+        if delay is None:
+            return self._timed(input, config, **kwargs)
+        pool = ContextThreadPoolExecutor(max_workers=2)
+        try:
+            primary = pool.submit(self._timed, input, config, **kwargs)
+            attempts = [primary]
+            done, _ = wait(attempts, timeout=delay)
+            if not done and self._hedge():
+                attempts.append(pool.submit(self._timed, input, config, **kwargs))
+            pending, errors = set(attempts), []
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                found, result = self._first_valid(done, attempts, errors)
+                if found:
+                    return result
+            raise errors[0]
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def ainvoke(self, input: Any, config: Any = None, **kwargs: Any) -> Any:
+        delay = self._start()
+        if delay is None:
+            return await self._atimed(input, config, **kwargs)
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(self._atimed(input, config, **kwargs))
+        attempts = [primary]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done and self._hedge():
+                attempts.append(asyncio.ensure_future(self._atimed(input, config, **kwargs)))
+            pending, errors = set(attempts), []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                found, result = self._first_valid(done, attempts, errors)
+                if found:
+                    return result
+            raise errors[0]
+        finally:
+            if not primary.done():
+                # a primary cancelled after losing was at least this slow; leaving it out of the
+                # histogram would hide exactly the slow calls
+                self.histogram.record(time.perf_counter() - start)
+            for attempt in attempts:
+                attempt.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+    # (True, result) for the earliest attempt in `done` that returned, else (False, None) with
+    # the errors added to `errors`. Works for thread and asyncio futures alike.
+    def _first_valid(self, done: set, attempts: list, errors: list) -> tuple[bool, Any]:
+        for attempt in sorted(done, key=attempts.index):
+            if attempt.exception() is None:
+                if attempt is not attempts[0]:
+                    self.hedger.count("hedge_wins")
+                return True, attempt.result()
+            errors.append(attempt.exception())
+        return False, None
+
+
+_shared_hedger: Hedger | None = None
+_shared_lock = threading.Lock()
+
+
+# Process-wide hedger, or None when hedging is off. Configure with environment variables:
+# LLM_HEDGE=on (default off), LLM_HEDGE_PERCENTILE (default 0.95), LLM_HEDGE_BUDGET (extra calls
+# per call, default 0.05)
+def get_hedger() -> Hedger | None:
+    global _shared_hedger
+    if os.getenv("LLM_HEDGE", "off").lower() not in ("on", "1", "true"):
+        return None
+    with _shared_lock:
+        if _shared_hedger is None:
+            _shared_hedger = Hedger(
+                percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+                budget=float(os.getenv("LLM_HEDGE_BUDGET", "0.05")),
+            )
+    return _shared_hedger
+
+
+# `runnable` hedged by `hedger` (default: the process-wide one); unchanged when hedging is off
+def hedged(runnable: Any, hedger: Hedger | None = None) -> Any:
+    hedger = hedger or get_hedger()
+    return runnable if hedger is None else HedgedModel(runnable, hedger)
+
+
+# Essay latency (llm_parallel_workflow, fan-out mode) with and without hedging, on a fake model
+# with a heavy tail: most calls take ~100 ms (log-normal), `straggler_rate` of them 5-15x that.
+# `essays` runs through ainvoke, `concurrency` at a time; the first few essays of the hedged run
+# fill the histograms before any call is hedged.
+def benchmark(essays: int = 400, concurrency: int = 16, straggler_rate: float = 0.02, percentile: float = 0.95, budget: float = 0.05) -> None:
+    import json
+    import random
+    import statistics
+
+    import llm_parallel_workflow as essay_workflow
+    from essay_benchmarks import simulated_responder
+    from fake_models import FakeChatModel
+    from lazy_models import structured
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(directory, "sample_essays.jsonl")) as f:
+        texts = [json.loads(line)["essay"] for line in f if line.strip()]
+    rng = random.Random(0)
+
+    def latency() -> float:
+        seconds = rng.lognormvariate(math.log(0.1), 0.3)
+        return seconds * rng.uniform(5, 15) if rng.random() < straggler_rate else seconds
+
+    essay_workflow.model.override(FakeChatModel(latency=latency, responder=simulated_responder(texts)))
+    workflow = essay_workflow.get_workflow()
+    plain = structured(essay_workflow.model, essay_workflow.FeedbackSchema)
+
+    async def run(model: Any) -> tuple[list[float], list[dict]]:
+        essay_workflow.structure_model = model
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one(index: int) -> tuple[float, dict]:
+            async with limit:
+                start = time.perf_counter()
+                result = await workflow.ainvoke({"eassy": texts[index % len(texts)]})
+                return time.perf_counter() - start, result
+
+        timings, results = zip(*await asyncio.gather(*(one(index) for index in range(essays))))
+        return list(timings), list(results)
+
+    print(f"{essays} essays (4 calls each), {concurrency} at a time; fake model ~100 ms, {straggler_rate:.0%} of calls 5-15x slower")
+    print(f"{'mode':<24} {'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'max ms':>7} {'extra calls':>11} {'hedge wins':>10} {'denied':>6}")
+    expected = None
+    for name, hedger in (("unhedged", None), (f"hedged p{percentile * 100:g}, {budget:.0%} budget", Hedger(percentile, budget))):
+        timings, results = asyncio.run(run(plain if hedger is None else HedgedModel(plain, hedger)))
+        expected = expected or results
+        assert results == expected, "hedging changed a result"
+        stats = hedger.stats() if hedger else {"extra_calls": 0.0, "hedge_wins": 0, "denied": 0}
+        cuts = statistics.quantiles(timings, n=100)
+        print(
+            f"{name:<24} {cuts[49] * 1000:>7.0f} {cuts[89] * 1000:>7.0f} {cuts[98] * 1000:>7.0f} {max(timings) * 1000:>7.0f} "
+            f"{stats['extra_calls']:>11.1%} {stats['hedge_wins']:>10} {stats['denied']:>6}"
+        )
+    essay_workflow.structure_model = hedged(plain)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Tail latency of the essay workflow with and without hedged model calls")
+    parser.add_argument("--essays", type=int, default=400)
+    parser.add_argument("--straggler-rate", type=float, default=0.02, help="fraction of calls 5-15x slower")
+    parser.add_argument("--percentile", type=float, default=0.95, help="hedge after this latency percentile")
+    parser.add_argument("--budget", type=float, default=0.05, help="extra calls per call")
+    args = parser.parse_args()
+    benchmark(args.essays, straggler_rate=args.straggler_rate, percentile=args.percentile, budget=args.budget)
@@ -1,22 +1,43 @@
 
-from langgraph.graph import StateGraph, START, END
-from langchain_openai import ChatOpenAI
+import asyncio
+import difflib
+import hashlib
+import time
+import zlib
+from collections import Counter
+from functools import cache
+from lazy_models import chat_openai, structured
+from llm_hedging import hedged
 from typing import Annotated, TypedDict
-from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 import operator
 
-load_dotenv()
-
 # Define a schema for structured output
 class FeedbackSchema(BaseModel):
     feedback : str = Field(description="detailed feedback on the essay")
     score: int = Field(description="score out of 10 for the essay", ge=0, le=10)
 
-model = ChatOpenAI(model='gpt-4o-mini')
+# All three rubrics (and the summary) from one call, for the single-call mode
+class RubricEvaluation(BaseModel):
+    clarity_of_thought: FeedbackSchema = Field(description="feedback and score for the clarity of thought")
+    depth_of_analysis: FeedbackSchema = Field(description="feedback and score for the depth of analysis")
+    language: FeedbackSchema = Field(description="feedback and score for the language used")
+    final_feedback: str = Field(description="summary of strengths and areas for improvement across the three rubrics")
+
+# Created on first use (see lazy_models.py)
+model = chat_openai(model='gpt-4o-mini')
 
         
-structure_model = model.with_structured_output(FeedbackSchema)
+# Hedged against straggling responses when LLM_HEDGE=on (see llm_hedging.py)
+structure_model = hedged(structured(model, FeedbackSchema))
+rubric_model = hedged(structured(model, RubricEvaluation))
+
+# Evaluation modes, chosen per run with config={"configurable": {"evaluation_mode": ...}}:
+# "fan_out" (default) runs one call per rubric and a finalize call, "single_call" one call for
+# everything, "incremental" regrades a resubmitted essay (configurable "essay_id") only where
+# it changed (see evaluate_revision)
+FAN_OUT, SINGLE_CALL, INCREMENTAL = "fan_out", "single_call", "incremental"
+EVALUATION_MODES = (FAN_OUT, SINGLE_CALL, INCREMENTAL)
 
 
 # Define states for parallel tasks
@@ -28,93 +49,375 @@ class EssayEvalution(TypedDict):
     individual_scores: Annotated[list[int], operator.add]
     avg_score: float
     final_feedback: str
+    revision: dict  # incremental mode: what was changed, rerun and reused
+
+def clarity_prompt(essay: str) -> str:
+    return f"Provide detailed feedback on the clarity of thought in the following essay:\n\n{essay}\n\nYour response should be structured as JSON with 'feedback' and 'score' (out of 10)."
+
+def depth_prompt(essay: str) -> str:
+    return f"Provide detailed feedback on the depth of analysis in the following essay:\n\n{essay}\n\nYour response should be structured as JSON with 'feedback' and 'score' (out of 10)."
+
+def language_prompt(essay: str) -> str:
+    return f"Provide detailed feedback on the language used in the following essay:\n\n{essay}\n\nYour response should be structured as JSON with 'feedback' and 'score' (out of 10)."
+
+def rubrics_prompt(essay: str) -> str:
+    return f"Provide detailed feedback on the clarity of thought, the depth of analysis and the language used in the following essay, each with a score out of 10, followed by a final feedback summary of its strengths and areas for improvement:\n\n{essay}\n\nYour response should be structured as JSON with 'clarity_of_thought', 'depth_of_analysis' and 'language' (each with 'feedback' and 'score') and 'final_feedback'."
+
+def finalize_prompt(state: EssayEvalution) -> str:
+    return f"""Based on the following individual feedbacks and scores, provide a comprehensive final feedback summary for the essay.
+    \nClarity of Thought Feedback: {state['clarity_of_thought_feedback']}
+    \nDepth of Analysis Feedback: {state['deptpth_of_analysis_feedback']}
+    \nLanguage Feedback: {state['language_feedback']}
+    \nIndividual Scores: {state['individual_scores']}
+    \nYour final feedback should include an overall average score out of 10 and a summary of strengths and areas for improvement."""
 
 def evaluate_clarity_of_thought(state: EssayEvalution) -> EssayEvalution:
-    essay = state["eassy"]
-    
-    prompt = f"Provide detailed feedback on the clarity of thought in the following essay:\n\n{essay}\n\nYour response should be structured as JSON with 'feedback' and 'score' (out of 10)."
-    response = structure_model.invoke(prompt)
-    
+    response = structure_model.invoke(clarity_prompt(state["eassy"]))
     return {"clarity_of_thought_feedback": response.feedback, "individual_scores": [response.score]}
 
 def evaluate_depth_of_analysis(state: EssayEvalution) -> EssayEvalution:
-    essay = state["eassy"]
-    
-    prompt = f"Provide detailed feedback on the depth of analysis in the following essay:\n\n{essay}\n\nYour response should be structured as JSON with 'feedback' and 'score' (out of 10)."
-    response = structure_model.invoke(prompt)
-    
+    response = structure_model.invoke(depth_prompt(state["eassy"]))
     return {"deptpth_of_analysis_feedback": response.feedback, "individual_scores": [response.score]}
 
 def evaluate_language(state: EssayEvalution) -> EssayEvalution:
-    essay = state["eassy"]
-
-    prompt = f"Provide detailed feedback on the language used in the following essay:\n\n{essay}\n\nYour response should be structured as JSON with 'feedback' and 'score' (out of 10)."    
-    response = structure_model.invoke(prompt)
-
+    response = structure_model.invoke(language_prompt(state["eassy"]))
     return {"language_feedback": response.feedback, "individual_scores": [response.score]  }
 
 def finalize_evaluation(state: EssayEvalution):
-    prompt = f"""Based on the following individual feedbacks and scores, provide a comprehensive final feedback summary for the essay.
-    \nClarity of Thought Feedback: {state['clarity_of_thought_feedback']}
-    \nDepth of Analysis Feedback: {state['deptpth_of_analysis_feedback']}
-    \nLanguage Feedback: {state['language_feedback']}
-    \nIndividual Scores: {state['individual_scores']}
-    \nYour final feedback should include an overall average score out of 10 and a summary of strengths and areas for improvement."""    
-    response = structure_model.invoke(prompt)
+    response = structure_model.invoke(finalize_prompt(state))
     return {"final_feedback": response.feedback, "avg_score": response.score}
+
+# Single-call mode: the average is computed here from the three scores, not asked of the model
+def rubric_update(response: RubricEvaluation) -> dict:
+    scores = [response.clarity_of_thought.score, response.depth_of_analysis.score, response.language.score]
+    return {
+        "clarity_of_thought_feedback": response.clarity_of_thought.feedback,
+        "deptpth_of_analysis_feedback": response.depth_of_analysis.feedback,
+        "language_feedback": response.language.feedback,
+        "individual_scores": scores,
+        "avg_score": sum(scores) / len(scores),
+        "final_feedback": response.final_feedback,
+    }
+
+def evaluate_all_rubrics(state: EssayEvalution):
+    return rubric_update(rubric_model.invoke(rubrics_prompt(state["eassy"])))
+
+def route_evaluation(state: EssayEvalution, config) -> list[str]:
+    mode = config.get("configurable", {}).get("evaluation_mode", FAN_OUT)
+    if mode == FAN_OUT:
+        return ["Evaluate Clarity of Thought", "Evaluate Depth of Analysis", "Evaluate Language"]
+    if mode == SINGLE_CALL:
+        return ["Evaluate All Rubrics"]
+    if mode == INCREMENTAL:
+        return ["Evaluate Revision"]
+    raise ValueError(f"Unknown evaluation_mode {mode!r}, expected one of {EVALUATION_MODES}")
+
+# Async versions of the nodes, used by workflow.ainvoke / abatch so model calls don't block
+async def aevaluate_clarity_of_thought(state: EssayEvalution) -> EssayEvalution:
+    response = await structure_model.ainvoke(clarity_prompt(state["eassy"]))
+    return {"clarity_of_thought_feedback": response.feedback, "individual_scores": [response.score]}
+
+async def aevaluate_depth_of_analysis(state: EssayEvalution) -> EssayEvalution:
+    response = await structure_model.ainvoke(depth_prompt(state["eassy"]))
+    return {"deptpth_of_analysis_feedback": response.feedback, "individual_scores": [response.score]}
+
+async def aevaluate_language(state: EssayEvalution) -> EssayEvalution:
+    response = await structure_model.ainvoke(language_prompt(state["eassy"]))
+    return {"language_feedback": response.feedback, "individual_scores": [response.score]}
+
+async def afinalize_evaluation(state: EssayEvalution):
+    response = await structure_model.ainvoke(finalize_prompt(state))
+    return {"final_feedback": response.feedback, "avg_score": response.score}
+
+async def aevaluate_all_rubrics(state: EssayEvalution):
+    return rubric_update(await rubric_model.ainvoke(rubrics_prompt(state["eassy"])))
+
+# Incremental mode. For each essay_id the graph's store keeps the last evaluation: per rubric its
+# feedback and score plus the essay as it was when that rubric was last graded (a hash per
+# word, grouped by paragraph), and the finalize prompt's hash.
+#   - a rubric is graded again when the share of words changed since its own last grading
+#     reaches its threshold, so small edits add up instead of slipping through one by one;
+#     clarity of thought is also graded again when paragraphs were reordered
+#   - finalize_evaluation runs again only if its prompt (all feedback and scores) changed
+#   - the other rubrics, and the final feedback, are reused
+# Thresholds can be set per run with configurable "revision_thresholds".
+REVISION_THRESHOLDS = {"clarity_of_thought": 0.10, "depth_of_analysis": 0.10, "language": 0.05}
+REVISION_NAMESPACE = ("essay_revisions",)
+
+# rubric -> (node, async node, feedback field)
+RUBRICS = {
+    "clarity_of_thought": (evaluate_clarity_of_thought, aevaluate_clarity_of_thought, "clarity_of_thought_feedback"),
+    "depth_of_analysis": (evaluate_depth_of_analysis, aevaluate_depth_of_analysis, "deptpth_of_analysis_feedback"),
+    "language": (evaluate_language, aevaluate_language, "language_feedback"),
+}
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode()).hexdigest()[:16]
+
+# One CRC-32 per word, per paragraph (paragraphs are separated by newlines)
+def essay_paragraphs(essay: str) -> list[list[int]]:
+    return [[zlib.crc32(word.encode()) for word in paragraph.split()] for paragraph in essay.strip().split("\n") if paragraph.strip()]
+
+# Share of words added, removed or replaced between two versions. Paragraphs found unchanged in
+# both are left out first, so moving a paragraph changes no words.
+def changed_fraction(before: list[list[int]], after: list[list[int]]) -> float:
+    common = Counter(_paragraph_hashes(before)) & Counter(_paragraph_hashes(after))
+    old = [word for paragraph in _without(before, common) for word in paragraph]
+    new = [word for paragraph in _without(after, common) for word in paragraph]
+    total = max(sum(map(len, before)), sum(map(len, after)), 1)
+    matcher = difflib.SequenceMatcher(a=old, b=new, autojunk=False)
+    changed = sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal")
+    return changed / total
+
+def _paragraph_hashes(paragraphs: list[list[int]]) -> list[str]:
+    return [_hash(" ".join(map(str, paragraph))) for paragraph in paragraphs]
+
+def _without(paragraphs: list[list[int]], common: Counter) -> list[list[int]]:
+    skip, kept = Counter(common), []
+    for paragraph, digest in zip(paragraphs, _paragraph_hashes(paragraphs)):
+        if skip[digest]:
+            skip[digest] -= 1
+        else:
+            kept.append(paragraph)
+    return kept
+
+# Whether the paragraphs found in both versions come in a different order
+def reordered(before: list[list[int]], after: list[list[int]]) -> bool:
+    old, new = _paragraph_hashes(before), _paragraph_hashes(after)
+    common = set(old) & set(new)
+    return [digest for digest in old if digest in common] != [digest for digest in new if digest in common]
+
+# The plan for a submission: which rubrics to grade again, and the revision report
+def plan_revision(state: EssayEvalution, config, record: dict | None) -> tuple[list[str], dict]:
+    paragraphs = essay_paragraphs(state["eassy"])
+    if record is None:
+        return list(RUBRICS), {"changed_paragraphs": list(range(len(paragraphs))), "rerun": list(RUBRICS), "reused": []}
+    thresholds = {**REVISION_THRESHOLDS, **config.get("configurable", {}).get("revision_thresholds", {})}
+    # against the last submission too: a paragraph edited since the rubric's grading, then moved
+    moved = reordered(record["paragraphs"], paragraphs)
+    rerun = []
+    for rubric, previous in record["rubrics"].items():
+        change = changed_fraction(previous["paragraphs"], paragraphs)
+        if change >= thresholds[rubric] or (rubric == "clarity_of_thought" and (moved or reordered(previous["paragraphs"], paragraphs))):
+            rerun.append(rubric)
+    known = set(_paragraph_hashes(record["paragraphs"]))
+    changed = [index for index, digest in enumerate(_paragraph_hashes(paragraphs)) if digest not in known]
+    report = {
+        "changed_paragraphs": changed,
+        "change": round(changed_fraction(record["paragraphs"], paragraphs), 3),
+        "rerun": rerun,
+        "reused": [rubric for rubric in RUBRICS if rubric not in rerun],
+    }
+    return rerun, report
+
+# Reused and new rubric results -> the state update, the finalize state and the new record
+def _merge_revision(state: EssayEvalution, record: dict | None, updates: dict[str, dict]) -> tuple[dict, dict]:
+    paragraphs = essay_paragraphs(state["eassy"])
+    rubrics, update = {}, {"individual_scores": []}
+    for rubric, (_, _, field) in RUBRICS.items():
+        if rubric in updates:
+            rubrics[rubric] = {"feedback": updates[rubric][field], "score": updates[rubric]["individual_scores"][0], "paragraphs": paragraphs}
+        else:
+            rubrics[rubric] = record["rubrics"][rubric]
+        update[field] = rubrics[rubric]["feedback"]
+        update["individual_scores"].append(rubrics[rubric]["score"])
+    return update, {"paragraphs": paragraphs, "rubrics": rubrics, "final": record["final"] if record else None}
+
+def _finalize_reusable(record: dict, prompt: str) -> bool:
+    return record["final"] is not None and record["final"]["prompt"] == _hash(prompt)
+
+def _store_final(record: dict, prompt: str, final: dict) -> dict:
+    record["final"] = {"prompt": _hash(prompt), "feedback": final["final_feedback"], "score": final["avg_score"]}
+    return {"final_feedback": final["final_feedback"], "avg_score": final["avg_score"]}
+
+def evaluate_revision(state: EssayEvalution, config):
+    from langchain_core.runnables.config import ContextThreadPoolExecutor
+    from langgraph.config import get_store
+
+    store, essay_id = get_store(), _essay_id(config)
+    item = store.get(REVISION_NAMESPACE, essay_id)
+    previous = item.value if item else None
+    rerun, report = plan_revision(state, config, previous)
+    with ContextThreadPoolExecutor(max_workers=3) as pool:
+        futures = {rubric: pool.submit(RUBRICS[rubric][0], state) for rubric in rerun}
+        updates = {rubric: future.result() for rubric, future in futures.items()}
+    update, record = _merge_revision(state, previous, updates)
+    prompt = finalize_prompt({**state, **update})
+    report["finalized"] = not _finalize_reusable(record, prompt)
+    final = finalize_evaluation({**state, **update}) if report["finalized"] else {"final_feedback": record["final"]["feedback"], "avg_score": record["final"]["score"]}
+    update |= _store_final(record, prompt, final)
+    store.put(REVISION_NAMESPACE, essay_id, record)
+    return {**update, "revision": report}
+
+async def aevaluate_revision(state: EssayEvalution, config):
+    from langgraph.config import get_store
+
+    store, essay_id = get_store(), _essay_id(config)
+    item = await store.aget(REVISION_NAMESPACE, essay_id)
+    previous = item.value if item else None
+    rerun, report = plan_revision(state, config, previous)
+    results = await asyncio.gather(*(RUBRICS[rubric][1](state) for rubric in rerun))
+    update, record = _merge_revision(state, previous, dict(zip(rerun, results)))
+    prompt = finalize_prompt({**state, **update})
+    report["finalized"] = not _finalize_reusable(record, prompt)
+    final = await afinalize_evaluation({**state, **update}) if report["finalized"] else {"final_feedback": record["final"]["feedback"], "avg_score": record["final"]["score"]}
+    update |= _store_final(record, prompt, final)
+    await store.aput(REVISION_NAMESPACE, essay_id, record)
+    return {**update, "revision": report}
+
+def _essay_id(config) -> str:
+    essay_id = config.get("configurable", {}).get("essay_id")
+    if not essay_id:
+        raise ValueError(f"evaluation_mode {INCREMENTAL!r} needs configurable 'essay_id' to find the previous submission")
+    return str(essay_id)
    
 
-# Define the workflow graph
-graph = StateGraph(EssayEvalution)
+# Build and compile the workflow graph on first use, so importing this module stays cheap
+# `store` keeps the previous evaluations for the incremental mode (default: in memory, for the
+# life of the process; pass a persistent LangGraph store to keep them across restarts)
+@cache
+def get_workflow(store=None):
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import StateGraph, START, END
+    from langgraph.store.memory import InMemoryStore
+
+    # Define the workflow graph
+    graph = StateGraph(EssayEvalution)
+
+    # Add nodes to your graph
+    # RunnableLambda pairs each sync node with its async version
+    graph.add_node("Evaluate Clarity of Thought", RunnableLambda(evaluate_clarity_of_thought, afunc=aevaluate_clarity_of_thought))
+    graph.add_node("Evaluate Depth of Analysis", RunnableLambda(evaluate_depth_of_analysis, afunc=aevaluate_depth_of_analysis))
+    graph.add_node("Evaluate Language", RunnableLambda(evaluate_language, afunc=aevaluate_language))
+    graph.add_node("Finalize Evaluation", RunnableLambda(finalize_evaluation, afunc=afinalize_evaluation))
+    graph.add_node("Evaluate All Rubrics", RunnableLambda(evaluate_all_rubrics, afunc=aevaluate_all_rubrics))
+    graph.add_node("Evaluate Revision", RunnableLambda(evaluate_revision, afunc=aevaluate_revision))
+
+    # add edges to your graph
+    # the evaluation mode of the run picks the three evaluators or the single call
+    graph.add_conditional_edges(
+        START,
+        route_evaluation,
+        ["Evaluate Clarity of Thought", "Evaluate Depth of Analysis", "Evaluate Language", "Evaluate All Rubrics", "Evaluate Revision"],
+    )
+
+    graph.add_edge("Evaluate Clarity of Thought", "Finalize Evaluation")
+    graph.add_edge("Evaluate Depth of Analysis", "Finalize Evaluation")
+    graph.add_edge("Evaluate Language", "Finalize Evaluation")
+
+    graph.add_edge("Finalize Evaluation", END)
+    graph.add_edge("Evaluate All Rubrics", END)
+    graph.add_edge("Evaluate Revision", END)
 
-# Add nodes to your graph
-graph.add_node("Evaluate Clarity of Thought", evaluate_clarity_of_thought)
-graph.add_node("Evaluate Depth of Analysis", evaluate_depth_of_analysis)
-graph.add_node("Evaluate Language", evaluate_language)
-graph.add_node("Finalize Evaluation", finalize_evaluation)
+    # compile the graph
+    return graph.compile(store=store if store is not None else InMemoryStore())
 
-# add edges to your graph
-graph.add_edge(START, "Evaluate Clarity of Thought")
-graph.add_edge(START, "Evaluate Depth of Analysis")
-graph.add_edge(START, "Evaluate Language")
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-graph.add_edge("Evaluate Clarity of Thought", "Finalize Evaluation")
-graph.add_edge("Evaluate Depth of Analysis", "Finalize Evaluation")
-graph.add_edge("Evaluate Language", "Finalize Evaluation")
+# Progressive results: run the graph with stream_mode "updates" and yield each result the moment
+# the node that produced it finishes, instead of waiting for the whole run as invoke does
+#   - {"event": "rubric", "rubric", "feedback", "score"} per rubric, as each evaluator finishes
+#     (in single_call and incremental mode all three come from the same node, at once)
+#   - {"event": "provisional", "avg_score", "individual_scores"} once all three scores are in:
+#     their mean, computed here while finalize_evaluation is still writing the summary
+#   - {"event": "final", "avg_score", "final_feedback", "state"} with the state invoke returns
+# Every event has "elapsed", the seconds since the run started.
+def stream_evaluation(inputs: EssayEvalution, config: dict | None = None):
+    progress = _Progress()
+    for mode, chunk in get_workflow().stream(inputs, config=config, stream_mode=["updates", "values"]):
+        yield from progress.events(mode, chunk)
+    yield progress.final()
 
-graph.add_edge("Finalize Evaluation", END)
+# Async twin of stream_evaluation, built on workflow.astream
+async def astream_evaluation(inputs: EssayEvalution, config: dict | None = None):
+    progress = _Progress()
+    async for mode, chunk in get_workflow().astream(inputs, config=config, stream_mode=["updates", "values"]):
+        for event in progress.events(mode, chunk):
+            yield event
+    yield progress.final()
 
-# compile the graph
-workflow   = graph.compile()
+class _Progress:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.scores: dict[str, int] = {}
+        self.state = None
 
-# execute the workflow with sample data
-essay = """A piece is a part of something big. When you break a chocolet, you get many pieces. Each piece may be small but it is still important. If one piece is missing, then the chocolet is not full. I like pieces because I can share them with my friends and family. 
+    def _event(self, event: str, **fields) -> dict:
+        return {"event": event, **fields, "elapsed": time.perf_counter() - self.start}
+
+    def events(self, mode: str, chunk: dict) -> list[dict]:
+        if mode == "values":
+            self.state = chunk
+            return []
+        events = []
+        for update in chunk.values():
+            if not isinstance(update, dict):
+                continue
+            # individual_scores lists the scores in RUBRICS order when a node grades several
+            rubrics = [rubric for rubric, (_, _, field) in RUBRICS.items() if field in update]
+            for rubric, score in zip(rubrics, update.get("individual_scores", [])):
+                self.scores[rubric] = score
+                events.append(self._event("rubric", rubric=rubric, feedback=update[RUBRICS[rubric][2]], score=score))
+            if rubrics and len(self.scores) == len(RUBRICS):
+                scores = [self.scores[rubric] for rubric in RUBRICS]
+                events.append(self._event("provisional", avg_score=sum(scores) / len(scores), individual_scores=scores))
+        return events
+
+    def final(self) -> dict:
+        return self._event("final", avg_score=self.state["avg_score"], final_feedback=self.state["final_feedback"], state=self.state)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate an essay on clarity, depth and language")
+    parser.add_argument("--mode", choices=EVALUATION_MODES, default=FAN_OUT, help="one call per rubric, one call for all, or regrade only what changed")
+    parser.add_argument("--essay-id", default="sample", help="with --mode incremental: the essay whose previous submission to compare with")
+    parser.add_argument("--progressive", action="store_true", help="print each rubric's result as soon as it is ready")
+    args = parser.parse_args()
+
+    workflow = get_workflow()
+
+    # execute the workflow with sample data
+    essay = """A piece is a part of something big. When you break a chocolet, you get many pieces. Each piece may be small but it is still important. If one piece is missing, then the chocolet is not full. I like pieces because I can share them with my friends and family. 
 In school, my teacher gives us a piece of paper to write on. That small piece helps me learn and do my homework. When we do puzzles, every piece has a special shape. If we lose one piece, the puzzle never gets finish. It makes me feel sad because the picture looks wrong.
 My mom cuts pizza into pieces so everyone gets some. I like the biggest piece but my mom says sharing is good. When I give my sister a piece, she smiles and that makes me happy.
 A piece can also be a piece of art or music. My brother plays a music piece on piano and it sounds nice. I think every piece matters, even if it is small. Small pieces make big things possible."""    
 
 
-initial_state: EssayEvalution = {
-        "eassy": essay       
-    }
+    initial_state: EssayEvalution = {
+            "eassy": essay       
+        }
 
 
-final_state = workflow.invoke(initial_state)
+    if args.progressive:
+        for event in stream_evaluation(initial_state, config={"configurable": {"evaluation_mode": args.mode, "essay_id": args.essay_id}}):
+            if event["event"] == "rubric":
+                print(f"[{event['elapsed']:.1f}s] {event['rubric']}: {event['score']}/10\n{event['feedback']}\n")
+            elif event["event"] == "provisional":
+                print(f"[{event['elapsed']:.1f}s] Provisional Average Score: {event['avg_score']:.1f}/10\n")
+            else:
+                print(f"[{event['elapsed']:.1f}s] Average Score: {event['avg_score']}/10\nFinal Feedback:\n{event['final_feedback']}")
+        raise SystemExit
 
-print("Essay Evaluation Results:")
-print ("Individual Scores:", final_state['individual_scores'])
-print(f"Average Score: {final_state['avg_score']}/10")
-print("Final Feedback:")
-print(final_state['final_feedback'])
+    final_state = workflow.invoke(initial_state, config={"configurable": {"evaluation_mode": args.mode, "essay_id": args.essay_id}})
 
+    print("Essay Evaluation Results:")
+    print ("Individual Scores:", final_state['individual_scores'])
+    print(f"Average Score: {final_state['avg_score']}/10")
+    print("Final Feedback:")
+    print(final_state['final_feedback'])
 
 
-# Visualize the workflow
-try:    
-    from IPython.display import Image, display
-    display(Image(workflow.get_graph().draw_mermaid_png()))
-except Exception:
-    # If not in Jupyter, print ASCII representation
-    print("\nWorkflow Graph:")
-    print(workflow.get_graph().draw_ascii())    
 
+    # Visualize the workflow
+    try:    
+        from IPython.display import Image, display
+        display(Image(workflow.get_graph().draw_mermaid_png()))
+    except Exception:
+        # If not in Jupyter, print ASCII representation
+        print("\nWorkflow Graph:")
+        print(workflow.get_graph().draw_ascii())
@@ -0,0 +1,499 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any
+
+
+# Token bucket refilled continuously at per_minute / 60 per second, holding at most `capacity`
+# (default: one second's worth, since per-minute API limits are enforced over shorter windows).
+# take() never blocks: it takes the amount at once, going into debt if need be, and returns how
+# long the caller has to wait before spending it. Callers are therefore served in arrival
+# order, and on average no faster than the rate.
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.rate = per_minute / 60
+        self.capacity = capacity if capacity is not None else self.rate
+        self.level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            return -self.level / self.rate if self.level < 0 else 0.0
+
+    # Give back (or, negative, take more of) an earlier amount, e.g. once actual usage is known
+    def adjust(self, amount: float) -> None:
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+# Concurrency limit that adapts to what the server can take (AIMD, as in TCP congestion
+# control): it grows by about one per round of successful calls whose latency stays within
+# `tolerance` x the lowest latency seen, and is cut back by `backoff` on a 429/503 or on a
+# slower call, at most once per latency period so one bad round does not collapse it. Slots
+# (acquire / aacquire, then release) are handed out in arrival order, to threads and to
+# asyncio tasks on any event loop alike.
+class AdaptiveConcurrency:
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 256, tolerance: float = 2.0, backoff: float = 0.7):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.baseline: float | None = None  # lowest recent latency, drifting up 1% per call
+        self._last_decrease = 0.0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    def _free(self) -> bool:
+        return self.in_flight < max(self.minimum, int(self.limit))
+
+    def acquire(self) -> None:
+        with self._lock:
+            if not self._waiters and self._free():
+                self.in_flight += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event.set)
+        event.wait()
+
+    async def aacquire(self) -> None:
+        with self._lock:
+            if not self._waiters and self._free():
+                self.in_flight += 1
+                return
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+
+            def grant() -> None:
+                loop.call_soon_threadsafe(self._granted, future)
+
+            self._waiters.append(grant)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if grant in self._waiters:
+                    self._waiters.remove(grant)  # never granted, nothing to release
+            raise
+
+    # A slot granted to a task that was cancelled meanwhile goes to the next waiter
+    def _granted(self, future: asyncio.Future) -> None:
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._free():
+            self.in_flight += 1
+            self._waiters.popleft()()
+
+    def succeeded(self, latency: float) -> None:
+        with self._lock:
+            self.baseline = latency if self.baseline is None else min(latency, self.baseline * 1.01)
+            if latency <= self.tolerance * self.baseline:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self._wake()
+            else:
+                self._decrease(latency)
+
+    def throttled(self) -> None:
+        with self._lock:
+            self._decrease(self.baseline or 1.0)
+
+    def _decrease(self, period: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease >= period:
+            self.limit = max(self.minimum, self.limit * self.backoff)
+            self._last_decrease = now
+
+
+# Process-wide gate for model calls: token buckets on requests/min and tokens/min, an adaptive
+# concurrency limit, and retries with full jitter. After a 429 with a retry-after header every
+# caller waits it out, not just the one that got it, so a burst of 429s does not turn into a
+# burst of retries. Counters are in `stats`.
+class LLMScheduler:
+    RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = 450,
+        tokens_per_minute: float | None = 180_000,
+        concurrency: AdaptiveConcurrency | None = None,
+        max_retries: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        completion_estimate: float = 256,
+    ):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.completion_estimate = completion_estimate
+        self.paused_until = 0.0
+        self.stats = {"calls": 0, "attempts": 0, "succeeded": 0, "throttled": 0, "retries": 0, "failed": 0, "tokens": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, **increments: int) -> None:
+        with self._lock:
+            for name, increment in increments.items():
+                self.stats[name] += increment
+
+    # Tokens a request will count against tokens/min: prompt characters / 4 plus max_tokens, or
+    # else the average completion seen so far (completion_estimate until the first answer).
+    # Corrected with the reported usage when the answer arrives.
+    def estimate_tokens(self, body: bytes) -> int:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self.completion_estimate
+        prompt = sum(len(json.dumps(message.get("content", ""))) for message in payload.get("messages", []))
+        return prompt // 4 + int(payload.get("max_tokens") or payload.get("max_completion_tokens") or self.completion_estimate)
+
+    # Seconds to wait before sending a request estimated at `tokens`
+    def admission_delay(self, tokens: int) -> float:
+        delay = self.paused_until - time.monotonic()
+        if self.requests is not None:
+            delay = max(delay, self.requests.take(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.take(tokens))
+        return max(delay, 0.0)
+
+    # Full-jitter exponential backoff, on top of any wait the server asked for, so that callers
+    # told to come back at the same time do not all come back at once
+    def retry_delay(self, attempt: int, retry_after: float | None) -> float:
+        return (retry_after or 0.0) + random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def throttled(self, retry_after: float | None) -> None:
+        self.concurrency.throttled()
+        self._count(throttled=1)
+        if retry_after:
+            with self._lock:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def succeeded(self, latency: float | None, estimate: int, usage: dict | None) -> None:
+        if latency is not None:
+            self.concurrency.succeeded(latency)
+        usage = usage or {}
+        used = usage.get("total_tokens")
+        if used is not None and self.tokens is not None:
+            self.tokens.adjust(estimate - used)
+        if usage.get("completion_tokens") is not None:
+            with self._lock:
+                self.completion_estimate += 0.2 * (usage["completion_tokens"] - self.completion_estimate)
+        self._count(succeeded=1, tokens=used or 0)
+
+
+def _retry_after(response) -> float | None:
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(response.headers[header]) * scale
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+def _usage(response) -> dict | None:
+    try:
+        return json.loads(response.content).get("usage")
+    except (ValueError, AttributeError):
+        return None
+
+
+# httpx transports that send every request through an LLMScheduler. A JSON answer is read in
+# full before its slot is released, so its latency feeds the concurrency limit and its usage
+# corrects the token estimate; a streamed answer holds its slot until the stream is closed
+# (its latency, only the time to the first byte, is not used). After the last retry the
+# failed response is returned, so the client raises its usual error.
+def _scheduling_transports():
+    import httpx
+
+    def streamed(response) -> bool:
+        return response.is_success and response.headers.get("content-type", "").startswith("text/event-stream")
+
+    # (retry?, delay) once a response has been read and its slot released
+    def outcome(scheduler: LLMScheduler, response, attempt: int, estimate: int, latency: float) -> tuple[bool, float]:
+        if response.status_code in scheduler.RETRY_STATUSES and attempt < scheduler.max_retries:
+            retry_after = _retry_after(response)
+            if response.status_code in (429, 503):
+                scheduler.throttled(retry_after)
+            return True, scheduler.retry_delay(attempt, retry_after)
+        if response.is_success:
+            scheduler.succeeded(latency, estimate, _usage(response))
+        else:
+            scheduler._count(failed=1)
+        return False, 0.0
+
+    class _ReleasingStream(httpx.SyncByteStream):
+        def __init__(self, stream, release):
+            self._stream, self._release = stream, release
+
+        def __iter__(self):
+            yield from self._stream
+
+        def close(self):
+            try:
+                self._stream.close()
+            finally:
+                release, self._release = self._release, None
+                if release is not None:
+                    release()
+
+    class _AsyncReleasingStream(httpx.AsyncByteStream):
+        def __init__(self, stream, release):
+            self._stream, self._release = stream, release
+
+        async def __aiter__(self):
+            async for chunk in self._stream:
+                yield chunk
+
+        async def aclose(self):
+            try:
+                await self._stream.aclose()
+            finally:
+                release, self._release = self._release, None
+                if release is not None:
+                    release()
+
+    class SchedulingTransport(httpx.BaseTransport):
+        def __init__(self, scheduler: LLMScheduler, transport: httpx.BaseTransport):
+            self.scheduler = scheduler
+            self.transport = transport
+
+        def handle_request(self, request):
+            scheduler, concurrency = self.scheduler, self.scheduler.concurrency
+            estimate = scheduler.estimate_tokens(request.read())
+            scheduler._count(calls=1)
+            for attempt in range(scheduler.max_retries + 1):
+                time.sleep(scheduler.admission_delay(estimate))
+                scheduler._count(attempts=1, retries=int(attempt > 0))
+                concurrency.acquire()
+                start = time.monotonic()
+                try:
+                    response = self.transport.handle_request(request)
+                    if streamed(response):
+                        scheduler.succeeded(None, estimate, None)
+                        response.stream = _ReleasingStream(response.stream, concurrency.release)
+                        return response
+                    response.read()
+                except httpx.TransportError:
+                    concurrency.release()
+                    if attempt == scheduler.max_retries:
+                        scheduler._count(failed=1)
+                        raise
+                    time.sleep(scheduler.retry_delay(attempt, None))
+                    continue
+                except BaseException:
+                    concurrency.release()
+                    raise
+                concurrency.release()
+                retry, delay = outcome(scheduler, response, attempt, estimate, time.monotonic() - start)
+                if not retry:
+                    return response
+                time.sleep(delay)
+
+        def close(self):
+            self.transport.close()
+
+    # One pooled connection transport per event loop: httpx connections cannot move between loops
+    class AsyncSchedulingTransport(httpx.AsyncBaseTransport):
+        def __init__(self, scheduler: LLMScheduler, transport_factory):
+            self.scheduler = scheduler
+            self._factory = transport_factory
+            self._transports: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+        def _transport(self) -> httpx.AsyncBaseTransport:
+            loop = asyncio.get_running_loop()
+            if loop not in self._transports:
+                self._transports[loop] = self._factory()
+            return self._transports[loop]
+
+        async def handle_async_request(self, request):
+            scheduler, concurrency = self.scheduler, self.scheduler.concurrency
+            estimate = scheduler.estimate_tokens(await request.aread())
+            scheduler._count(calls=1)
+            transport = self._transport()
+            for attempt in range(scheduler.max_retries + 1):
+                await asyncio.sleep(scheduler.admission_delay(estimate))
+                scheduler._count(attempts=1, retries=int(attempt > 0))
+                await concurrency.aacquire()
+                start = time.monotonic()
+                try:
+                    response = await transport.handle_async_request(request)
+                    if streamed(response):
+                        scheduler.succeeded(None, estimate, None)
+                        response.stream = _AsyncReleasingStream(response.stream, concurrency.release)
+                        return response
+                    await response.aread()
+                except httpx.TransportError:
+                    concurrency.release()
+                    if attempt == scheduler.max_retries:
+                        scheduler._count(failed=1)
+                        raise
+                    await asyncio.sleep(scheduler.retry_delay(attempt, None))
+                    continue
+                except BaseException:
+                    concurrency.release()
+                    raise
+                concurrency.release()
+                retry, delay = outcome(scheduler, response, attempt, estimate, time.monotonic() - start)
+                if not retry:
+                    return response
+                await asyncio.sleep(delay)
+
+        async def aclose(self):
+            for transport in list(self._transports.values()):
+                await transport.aclose()
+
+    return SchedulingTransport, AsyncSchedulingTransport
+
+
+# A pooled keep-alive httpx.Client and httpx.AsyncClient that schedule every request through
+# `scheduler`. Pass them to ChatOpenAI(http_client=..., http_async_client=..., max_retries=0);
+# the scheduler does the retrying.
+def http_clients(scheduler: LLMScheduler, max_connections: int = 100, keepalive: float = 30.0) -> tuple[Any, Any]:
+    import httpx
+
+    SchedulingTransport, AsyncSchedulingTransport = _scheduling_transports()
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections, keepalive_expiry=keepalive)
+    timeout = httpx.Timeout(600.0, connect=5.0)
+    client = httpx.Client(transport=SchedulingTransport(scheduler, httpx.HTTPTransport(limits=limits)), timeout=timeout, follow_redirects=True)
+    async_client = httpx.AsyncClient(
+        transport=AsyncSchedulingTransport(scheduler, lambda: httpx.AsyncHTTPTransport(limits=limits)), timeout=timeout, follow_redirects=True
+    )
+    return client, async_client
+
+
+_shared_scheduler: LLMScheduler | None = None
+_shared_clients: tuple[Any, Any] | None = None
+_shared_lock = threading.Lock()
+
+
+# Process-wide scheduler shared by every workflow. Configure with environment variables:
+# LLM_SCHEDULER=off, LLM_RPM, LLM_TPM (0 = no limit; the defaults are 10% below gpt-4o-mini's
+# tier-1 limits, leave similar headroom below your own), LLM_CONCURRENCY (initial limit),
+# LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES
+def get_llm_scheduler() -> LLMScheduler | None:
+    global _shared_scheduler
+    if os.getenv("LLM_SCHEDULER", "on").lower() in ("off", "0", "false"):
+        return None
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = LLMScheduler(
+                requests_per_minute=float(os.getenv("LLM_RPM", "450")),
+                tokens_per_minute=float(os.getenv("LLM_TPM", "180000")),
+                concurrency=AdaptiveConcurrency(
+                    initial=int(os.getenv("LLM_CONCURRENCY", "8")), maximum=int(os.getenv("LLM_MAX_CONCURRENCY", "256"))
+                ),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "6")),
+            )
+    return _shared_scheduler
+
+
+# The shared scheduler's HTTP clients, or None when LLM_SCHEDULER=off
+def get_http_clients() -> tuple[Any, Any] | None:
+    global _shared_clients
+    scheduler = get_llm_scheduler()
+    if scheduler is None:
+        return None
+    with _shared_lock:
+        if _shared_clients is None:
+            _shared_clients = http_clients(scheduler)
+    return _shared_clients
+
+
+# Offered load vs goodput against FakeOpenAIServer: requests arrive at a fixed rate for
+# `duration` seconds (open loop, as from independent workflows), through a plain ChatOpenAI
+# (the SDK's own 2 retries) and through a scheduler that either knows the server's limits or
+# has to find them from 429s alone
+def load_test(offered: list[float], duration: float = 5.0, server_rpm: float = 600, server_tpm: float = 60_000) -> list[dict]:
+    from langchain_openai import ChatOpenAI
+    from openai import DefaultAsyncHttpxClient
+
+    from fake_openai_server import FakeOpenAIServer
+
+    def scheduled(rpm, tpm):
+        return lambda: LLMScheduler(rpm, tpm, AdaptiveConcurrency(initial=8), base_delay=0.25)
+
+    modes = {
+        "plain client": None,
+        "scheduled, limits known": scheduled(server_rpm * 0.95, server_tpm * 0.95),
+        "scheduled, limits unknown": scheduled(None, None),
+    }
+    rows = []
+    with FakeOpenAIServer(server_rpm, server_tpm) as server:
+        print(f"Stand-in server: {server_rpm:.0f} requests/min, {server_tpm:.0f} tokens/min, {duration:.0f} s per run\n")
+        print(f"{'offered/s':>9} {'mode':<26} {'goodput/s':>9} {'ok':>6} {'failed':>6} {'429s':>6} {'p50 s':>6} {'p99 s':>6}")
+        for rate in offered:
+            for mode, make_scheduler in modes.items():
+                server.reset()
+                if make_scheduler is None:
+                    # a fresh client per run: the SDK's shared default one is tied to the first event loop
+                    model = ChatOpenAI(model="gpt-4o-mini", base_url=server.url, api_key="sk-local", http_async_client=DefaultAsyncHttpxClient())
+                else:
+                    client, async_client = http_clients(make_scheduler())
+                    model = ChatOpenAI(model="gpt-4o-mini", base_url=server.url, api_key="sk-local", http_client=client, http_async_client=async_client, max_retries=0)
+                row = asyncio.run(_offer(model, rate, duration))
+                row.update(offered=rate, mode=mode, rate_limited=server.counters["rate_limited"] + server.counters["overloaded"])
+                rows.append(row)
+                print(
+                    f"{rate:>9.0f} {mode:<26} {row['goodput']:>9.1f} {row['ok']:>6} {row['failed']:>6} {row['rate_limited']:>6} "
+                    f"{row['p50']:>6.2f} {row['p99']:>6.2f}"
+                )
+    return rows
+
+
+async def _offer(model, rate: float, duration: float) -> dict:
+    latencies, failures = [], 0
+    start = time.monotonic()
+
+    async def call(index: int) -> None:
+        nonlocal failures
+        await asyncio.sleep(start + index / rate - time.monotonic())
+        sent = time.monotonic()
+        try:
+            await model.ainvoke(f"Request {index}: summarise the review in one sentence.")
+            latencies.append(time.monotonic() - sent)
+        except Exception:
+            failures += 1
+
+    await asyncio.gather(*(call(index) for index in range(int(rate * duration))))
+    elapsed = time.monotonic() - start
+    latencies.sort()
+
+    def percentile(q: float) -> float:
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else float("nan")
+
+    return {"ok": len(latencies), "failed": failures, "goodput": len(latencies) / elapsed, "p50": percentile(0.5), "p99": percentile(0.99)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Goodput vs offered load against a rate-limited stand-in server")
+    parser.add_argument("--offered", type=float, nargs="*", default=[5, 10, 20, 40], help="requests per second")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of arrivals per run")
+    args = parser.parse_args()
+    load_test(args.offered, args.duration)
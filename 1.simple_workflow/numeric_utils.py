@@ -0,0 +1,14 @@
+import numpy as np
+
+
+# np.round(values, n) works on values * 10**n, which can land on the other side of a .5 tie
+# than Python's round(value, n) does. Only those near-tie values are redone with round(),
+# so the result matches the pure-Python nodes exactly while staying vectorized.
+def round_like_python(values: np.ndarray, ndigits: int) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    rounded = np.round(scaled) / scale
+    ties = np.flatnonzero(np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6)
+    rounded[ties] = [round(value, ndigits) for value in values[ties].tolist()]
+    return rounded
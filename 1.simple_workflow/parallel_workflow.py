@@ -1,9 +1,7 @@
-from langgraph.graph import StateGraph, START, END
+from functools import cache
 from typing import TypedDict
-from dotenv import load_dotenv
 
 
-load_dotenv()
 
 # Define states for parallel tasks
 class BatsState(TypedDict):
@@ -37,48 +35,66 @@ def calculate_balls_per_run(state: BatsState) -> BatsState:
     state["ballsperrun"] = round(ballsperrun, 2)
     return {"ballsperrun": state["ballsperrun"]}
 
-# Define the workflow graph
-graph = StateGraph(BatsState)
-
-# Add nodes to your graph
-graph.add_node("Calculate Strike Rate", calculate_strike_rate)
-graph.add_node("Calculate Balls Per Run", calculate_balls_per_run)
-graph.add_node("Calculate Bounce Rate", calculate_bountrate)
-# add edges to your graph
-graph.add_edge(START, "Calculate Strike Rate")
-graph.add_edge(START, "Calculate Balls Per Run")
-graph.add_edge(START, "Calculate Bounce Rate")
-graph.add_edge("Calculate Strike Rate", END)
-graph.add_edge("Calculate Balls Per Run", END)
-graph.add_edge("Calculate Bounce Rate", END)
-
-# compile the graph
-workflow   = graph.compile()
-
-# execute the workflow with sample data
-initial_state: BatsState = {
-        "runs": 150,
-        "balls": 120,
-        "fours": 10,
-        "sixes": 5,
-        "sr": 0.0,
-        "ballsperrun": 0.0,
-        "bountrate": 0.0    
-    }
-
-final_state = workflow.invoke(initial_state)
-
-print(f"Calculated Strike Rate: {final_state['sr']}") # Output: Calculated Strike Rate: 125.0
-print(f"Calculated Balls Per Run: {final_state['ballsperrun']}") # Output: Calculated Balls Per Run: 0.8
-print(f"Calculated Bounce Rate: {final_state['bountrate']}") # Output: Calculated Bounce Rate: 12.5
-
-# Visualize the workflow
-try:
-    from IPython.display import Image, display
-    display(Image(workflow.get_graph().draw_mermaid_png()))
-except Exception:
-    # If not in Jupyter, print ASCII representation
-    print("\nWorkflow Graph:")
-    print(workflow.get_graph().draw_ascii()) 
-
-    
\ No newline at end of file
+# Build and compile the workflow graph on first use, so importing this module stays cheap.
+# processes=True runs every node in the shared process pool (see process_pool.py).
+@cache
+def get_workflow(processes: bool = False):
+    from langgraph.graph import StateGraph, START, END
+
+    if processes:
+        from process_pool import offload as node
+    else:
+        node = lambda function: function
+
+    # Define the workflow graph
+    graph = StateGraph(BatsState)
+
+    # Add nodes to your graph
+    graph.add_node("Calculate Strike Rate", node(calculate_strike_rate))
+    graph.add_node("Calculate Balls Per Run", node(calculate_balls_per_run))
+    graph.add_node("Calculate Bounce Rate", node(calculate_bountrate))
+    # add edges to your graph
+    graph.add_edge(START, "Calculate Strike Rate")
+    graph.add_edge(START, "Calculate Balls Per Run")
+    graph.add_edge(START, "Calculate Bounce Rate")
+    graph.add_edge("Calculate Strike Rate", END)
+    graph.add_edge("Calculate Balls Per Run", END)
+    graph.add_edge("Calculate Bounce Rate", END)
+
+    # compile the graph
+    return graph.compile()
+
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if __name__ == "__main__":
+    workflow = get_workflow()
+
+    # execute the workflow with sample data
+    initial_state: BatsState = {
+            "runs": 150,
+            "balls": 120,
+            "fours": 10,
+            "sixes": 5,
+            "sr": 0.0,
+            "ballsperrun": 0.0,
+            "bountrate": 0.0    
+        }
+
+    final_state = workflow.invoke(initial_state)
+
+    print(f"Calculated Strike Rate: {final_state['sr']}") # Output: Calculated Strike Rate: 125.0
+    print(f"Calculated Balls Per Run: {final_state['ballsperrun']}") # Output: Calculated Balls Per Run: 0.8
+    print(f"Calculated Bounce Rate: {final_state['bountrate']}") # Output: Calculated Bounce Rate: 12.5
+
+    # Visualize the workflow
+    try:
+        from IPython.display import Image, display
+        display(Image(workflow.get_graph().draw_mermaid_png()))
+    except Exception:
+        # If not in Jupyter, print ASCII representation
+        print("\nWorkflow Graph:")
+        print(workflow.get_graph().draw_ascii())
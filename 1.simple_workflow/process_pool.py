@@ -0,0 +1,172 @@
+import asyncio
+import atexit
+import importlib
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from typing import Any, Callable, Iterable
+
+
+# Process-pool execution for CPU-bound graphs. workflow.batch runs its inputs on threads, and
+# pure-Python nodes hold the GIL, so a large batch uses one core however many there are.
+#   - process_batch runs whole graph runs in worker processes: the inputs are split into about
+#     4 chunks per worker (so one slow chunk does not hold up the end of the batch) and each
+#     worker runs its chunk with workflow.invoke, one after another
+#   - offload(node) runs a single node function in the pool, for graphs where one node is heavy
+#   - the pool is started once per worker count and reused; each worker imports the workflow
+#     module and compiles its graph once (get_workflow is cached per process)
+#   - chunks travel as columns (keys once, then one list per key) instead of a dict per row,
+#     which pickles ~40% smaller and several times faster
+#   - workers are spawned, not forked, so they don't inherit LangGraph's thread pools or locks
+
+
+def cpu_count() -> int:
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+# The shared pool with `workers` processes (default: one per available CPU), shut down at exit
+def get_process_pool(workers: int | None = None) -> ProcessPoolExecutor:
+    return _pool(workers or cpu_count())
+
+
+@cache
+def _pool(workers: int) -> ProcessPoolExecutor:
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    atexit.register(pool.shutdown, cancel_futures=True)
+    return pool
+
+
+# Start every worker of the pool and import `modules` in them, so the first real batch does not
+# pay for process start-up and imports (a second or so per worker)
+def warm_up(workers: int | None = None, modules: Iterable[str] = ()) -> None:
+    workers = workers or cpu_count()
+    pool = get_process_pool(workers)
+    modules = tuple(modules)
+    # each task waits a little so that every worker gets one
+    list(pool.map(_import, [modules] * workers, [0.05] * workers))
+
+
+def _import(modules: tuple[str, ...], wait: float) -> None:
+    for name in modules:
+        importlib.import_module(name).get_workflow()
+    time.sleep(wait)
+
+
+# Rows -> (keys, columns) when every row is a dict with the same keys; otherwise the rows as is
+def _pack(rows: list) -> tuple[list, list[list]] | list:
+    if not rows or not all(isinstance(row, dict) for row in rows):
+        return rows
+    keys = list(rows[0])
+    if any(len(row) != len(keys) or list(row) != keys for row in rows):
+        return rows
+    return keys, [[row[key] for row in rows] for key in keys]
+
+
+def _unpack(packed) -> list:
+    if isinstance(packed, tuple):
+        keys, columns = packed
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+    return packed
+
+
+def _run_chunk(module_name: str, packed, return_exceptions: bool):
+    workflow = importlib.import_module(module_name).get_workflow()
+    results = []
+    for state in _unpack(packed):
+        try:
+            results.append(workflow.invoke(state))
+        except Exception as exc:
+            if not return_exceptions:
+                raise
+            results.append(exc)
+    return _pack(results)
+
+
+# workflow.batch for the graph of `module_name` (a module with get_workflow(), importable in the
+# workers: its directory must be on sys.path when the pool starts), spread over `workers`
+# processes. Results are in input order. Inputs and results must be picklable.
+def process_batch(
+    module_name: str,
+    inputs: Iterable[dict],
+    workers: int | None = None,
+    chunk_size: int | None = None,
+    return_exceptions: bool = False,
+) -> list:
+    inputs = list(inputs)
+    if not inputs:
+        return []
+    workers = workers or cpu_count()
+    pool = get_process_pool(workers)
+    chunk_size = chunk_size or math.ceil(len(inputs) / (workers * 4))
+    futures = [
+        pool.submit(_run_chunk, module_name, _pack(inputs[start:start + chunk_size]), return_exceptions)
+        for start in range(0, len(inputs), chunk_size)
+    ]
+    results = []
+    for future in futures:
+        results.extend(_unpack(future.result()))
+    return results
+
+
+# Run a CPU-heavy node function in the shared pool. The calling thread waits without holding the
+# GIL, so workflow.batch's threads keep several workers busy. `node` must be a module-level
+# function (it is pickled by reference). Each call pays a round trip to a worker (~0.1-0.5 ms),
+# so this only pays off for nodes that take milliseconds; for many small runs use process_batch.
+def offload(node: Callable[[dict], Any], workers: int | None = None):
+    from langchain_core.runnables import RunnableLambda
+
+    def run(state: dict) -> Any:
+        return get_process_pool(workers).submit(node, dict(state)).result()
+
+    async def arun(state: dict) -> Any:
+        return await asyncio.wrap_future(get_process_pool(workers).submit(node, dict(state)))
+
+    return RunnableLambda(run, afunc=arun, name=node.__name__)
+
+
+# Sample inputs for the CPU-bound graphs
+BENCHMARK_INPUTS = {
+    "bmi_calculator_workflow": lambda i: {"weight": 50.0 + i % 60, "height": 1.5 + i % 50 / 100, "bmi": 0.0, "category": ""},
+    "quadratic_equation_worfflow": lambda i: {"a": 1 + i % 7, "b": 10 + i % 13, "c": i % 5},
+    "parallel_workflow": lambda i: {"runs": i % 200, "balls": 1 + i % 150, "fours": i % 20, "sixes": i % 10, "sr": 0.0, "ballsperrun": 0.0, "bountrate": 0.0},
+}
+
+
+# workflow.batch (threads) vs process_batch with 1..N workers on `rows` inputs per graph, and
+# per-node offload (get_workflow(processes=True)) on a smaller batch
+def benchmark(rows: int = 20_000, worker_counts: list[int] | None = None, offload_rows: int = 500) -> None:
+    worker_counts = worker_counts or sorted({1, 2, 4, 8, cpu_count()} - {n for n in (2, 4, 8) if n > cpu_count()})
+    print(f"{rows:,} runs per graph, {cpu_count()} CPUs available")
+    print(f"{'graph':<28} {'mode':<18} {'runs/s':>9} {'speedup':>8} {'same':>5}")
+    for module_name, make_input in BENCHMARK_INPUTS.items():
+        module = importlib.import_module(module_name)
+        inputs = [make_input(i) for i in range(rows)]
+        start = time.perf_counter()
+        expected = module.get_workflow().batch([dict(state) for state in inputs])
+        baseline = rows / (time.perf_counter() - start)
+        print(f"{module_name:<28} {'workflow.batch':<18} {baseline:>9,.0f} {1:>7.2f}x")
+        for workers in worker_counts:
+            warm_up(workers, [module_name])
+            start = time.perf_counter()
+            results = process_batch(module_name, inputs, workers)
+            throughput = rows / (time.perf_counter() - start)
+            print(f"{'':<28} {f'{workers} processes':<18} {throughput:>9,.0f} {throughput / baseline:>7.2f}x {str(results == expected):>5}")
+
+        inputs = inputs[:offload_rows]
+        start = time.perf_counter()
+        results = module.get_workflow(processes=True).batch([dict(state) for state in inputs])
+        throughput = len(inputs) / (time.perf_counter() - start)
+        print(f"{'':<28} {'per-node offload':<18} {throughput:>9,.0f} {throughput / baseline:>7.2f}x {str(results == expected[:offload_rows]):>5}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scaling of process_batch over 1..N worker processes")
+    parser.add_argument("--rows", type=int, default=20_000, help="graph runs per graph")
+    parser.add_argument("--workers", type=int, nargs="*", help="worker counts to try (default: 1, 2, 4, 8 up to the CPU count)")
+    args = parser.parse_args()
+    benchmark(args.rows, args.workers)
@@ -0,0 +1,212 @@
+import sys
+import time
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+
+from quadratic_equation_worfflow import QuadraticState, workflow
+
+# Largest |coefficient| for which b**2 - 4ac still fits in int64 without overflow
+MAX_INT_COEFFICIENT = 2**30
+
+ROUTES = np.array(["real_roots", "repeated_roots", "no_real_roots"])
+
+
+def _as_array(values) -> np.ndarray:
+    array = np.asarray(values)
+    if array.dtype.kind in "iub":
+        if array.size and np.abs(array.astype(np.int64)).max() > MAX_INT_COEFFICIENT:
+            raise ValueError(f"integer coefficients must be within ±{MAX_INT_COEFFICIENT}")
+        return array.astype(np.int64)
+    return array.astype(np.float64)
+
+
+# Vectorized version of show_equation (text is built only when asked for)
+def show_equation_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> list[str]:
+    return [f'{ai}x² + {bi}x + {ci} = 0' for ai, bi, ci in zip(a.tolist(), b.tolist(), c.tolist())]
+
+
+# Vectorized version of calculate_discriminant. On floats, numpy's b**2 is b*b, while Python's
+# goes through libm pow() and can differ in the last bit; exact=True squares like the graph does.
+def calculate_discriminant_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray, exact: bool = False) -> np.ndarray:
+    if exact and b.dtype.kind == "f":
+        return np.fromiter(map(pow, b.tolist(), repeat(2)), dtype=np.float64, count=b.size) - (4*a*c)
+    return b**2 - (4*a*c)
+
+
+# Vectorized version of check_condition: one mask per branch instead of per-row routing
+def check_condition_batch(discriminant: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    real = discriminant > 0
+    repeated = discriminant == 0
+    no_real = ~(real | repeated)
+    return real, repeated, no_real
+
+
+# Python's ** 0.5 goes through libm pow(), which is not always correctly rounded like np.sqrt.
+# exact=True reproduces it element by element so roots match the graph to the last digit.
+def _sqrt(values: np.ndarray, exact: bool) -> np.ndarray:
+    values = values.astype(np.float64)
+    if not exact:
+        return np.sqrt(values)
+    return np.fromiter(map(pow, values.tolist(), repeat(0.5)), dtype=np.float64, count=values.size)
+
+
+def solve_batch(a, b, c, text: bool = True, exact: bool = True) -> dict:
+    a, b, c = _as_array(a), _as_array(b), _as_array(c)
+    if not (a.shape == b.shape == c.shape) or a.ndim != 1:
+        raise ValueError("a, b and c must be 1-D arrays of the same length")
+
+    discriminant = calculate_discriminant_batch(a, b, c, exact)
+    real, repeated, no_real = check_condition_batch(discriminant)
+
+    # The graph divides by 2a in both root branches, so a == 0 raises ZeroDivisionError there
+    divide_by_zero = (a == 0) & ~no_real
+
+    root1 = np.full(a.shape, np.nan)
+    root2 = np.full(a.shape, np.nan)
+
+    # real_roots branch
+    rows = real & ~divide_by_zero
+    sqrt_d = _sqrt(discriminant[rows], exact)
+    root1[rows] = (-b[rows] + sqrt_d) / (2*a[rows])
+    root2[rows] = (-b[rows] - sqrt_d) / (2*a[rows])
+
+    # repeated_roots branch
+    rows = repeated & ~divide_by_zero
+    root1[rows] = (-b[rows]) / (2*a[rows])
+
+    route = np.select([real, repeated], ROUTES[:2], default=ROUTES[2])
+    batch = {
+        "a": a,
+        "b": b,
+        "c": c,
+        "discriminant": discriminant,
+        "route": route,
+        "root1": root1,
+        "root2": root2,
+        "error": np.where(divide_by_zero, "ZeroDivisionError", ""),
+    }
+    if text:
+        batch["equation"] = show_equation_batch(a, b, c)
+        batch["result"] = _results_text(route, root1, root2, divide_by_zero)
+    return batch
+
+
+# Same messages as real_roots / repeated_roots / no_real_roots; None where the graph would raise
+def _results_text(route, root1, root2, divide_by_zero) -> list:
+    results = []
+    for name, r1, r2, failed in zip(route.tolist(), root1.tolist(), root2.tolist(), divide_by_zero.tolist()):
+        if failed:
+            results.append(None)
+        elif name == "real_roots":
+            results.append(f'The roots are {r1} and {r2}')
+        elif name == "repeated_roots":
+            results.append(f'Only repeating root is {r1}')
+        else:
+            results.append('No real roots')
+    return results
+
+
+# Turn a batch back into QuadraticState dicts, the shape workflow.invoke returns
+def to_states(batch: dict) -> list[QuadraticState]:
+    states = []
+    for i, (a, b, c, d) in enumerate(zip(batch["a"].tolist(), batch["b"].tolist(), batch["c"].tolist(), batch["discriminant"].tolist())):
+        state: QuadraticState = {"a": a, "b": b, "c": c, "equation": batch["equation"][i], "discriminant": d}
+        if batch["result"][i] is not None:
+            state["result"] = batch["result"][i]
+        states.append(state)
+    return states
+
+
+# Load a/b/c columns from a CSV (with header) or Parquet file
+def load_coefficients(path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    path = Path(path)
+    if path.suffix == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ImportError("reading Parquet files requires pyarrow (pip install pyarrow)") from exc
+        table = pq.read_table(path, columns=["a", "b", "c"])
+        return tuple(table.column(name).to_numpy() for name in ("a", "b", "c"))
+
+    with open(path) as f:
+        header = [name.strip() for name in f.readline().split(",")]
+    columns = [header.index(name) for name in ("a", "b", "c")]
+    data = np.loadtxt(path, delimiter=",", skiprows=1, usecols=columns, ndmin=2)
+    if np.all(data == np.round(data)):
+        data = data.astype(np.int64)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+def solve_file(path: str, text: bool = True, exact: bool = True) -> dict:
+    return solve_batch(*load_coefficients(path), text=text, exact=exact)
+
+
+# Run each row through the compiled graph, recording ZeroDivisionError like solve_batch does
+def solve_per_row(a, b, c) -> list:
+    states = []
+    for ai, bi, ci in zip(a, b, c):
+        try:
+            states.append(workflow.invoke({"a": ai, "b": bi, "c": ci}))
+        except ZeroDivisionError:
+            states.append(None)
+    return states
+
+
+def check_matches_graph(a, b, c) -> int:
+    batch = solve_batch(a, b, c)
+    expected = solve_per_row(np.asarray(a).tolist(), np.asarray(b).tolist(), np.asarray(c).tolist())
+    mismatches = 0
+    for i, state in enumerate(expected):
+        if state is None:
+            mismatches += batch["error"][i] != "ZeroDivisionError"
+            continue
+        mismatches += (
+            state["equation"] != batch["equation"][i]
+            or state["discriminant"] != batch["discriminant"][i]
+            or state["result"] != batch["result"][i]
+        )
+    return mismatches
+
+
+def benchmark(rows: int = 1_000_000, graph_rows: int = 2_000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    a, b, c = (rng.integers(-20, 21, rows) for _ in range(3))
+
+    mismatches = check_matches_graph(a[:graph_rows], b[:graph_rows], c[:graph_rows])
+    print(f"Checked {graph_rows:,} integer rows against the graph: {mismatches} mismatches")
+    fa, fb, fc = (rng.uniform(-10, 10, graph_rows) for _ in range(3))
+    mismatches = check_matches_graph(fa, fb, fc)
+    print(f"Checked {graph_rows:,} float rows against the graph: {mismatches} mismatches")
+
+    start = time.perf_counter()
+    solve_per_row(a[:graph_rows].tolist(), b[:graph_rows].tolist(), c[:graph_rows].tolist())
+    graph_rate = graph_rows / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    solve_batch(a, b, c, text=False, exact=False)
+    numeric_rate = rows / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    solve_batch(a, b, c, text=False)
+    exact_rate = rows / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    solve_batch(a, b, c)
+    text_rate = rows / (time.perf_counter() - start)
+
+    print(f"Per-row workflow.invoke : {graph_rate:>14,.0f} rows/sec")
+    print(f"Batch (numeric, sqrt)   : {numeric_rate:>14,.0f} rows/sec  ({numeric_rate / graph_rate:,.0f}x)")
+    print(f"Batch (numeric, exact)  : {exact_rate:>14,.0f} rows/sec  ({exact_rate / graph_rate:,.0f}x)")
+    print(f"Batch (with text)       : {text_rate:>14,.0f} rows/sec  ({text_rate / graph_rate:,.0f}x)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # python quadratic_equation_batch.py coefficients.csv
+        batch = solve_file(sys.argv[1])
+        for equation, result in zip(batch["equation"], batch["result"]):
+            print(f"{equation}: {result if result is not None else 'division by zero (a = 0)'}")
+    else:
+        benchmark()
@@ -1,5 +1,5 @@
 
-from langgraph.graph import StateGraph, START, END
+from functools import cache
 from typing import TypedDict, Literal
 
 # Define states for quadratic equation workflow
@@ -42,45 +42,65 @@ def check_condition(state: QuadraticState) -> Literal["real_roots", "repeated_ro
     else:
         return "no_real_roots"
      
-# Define the workflow graph
-graph = StateGraph(QuadraticState)
-
-# Add nodes to your graph
-graph.add_node('show_equation', show_equation)
-graph.add_node('calculate_discriminant', calculate_discriminant)
-graph.add_node('real_roots', real_roots)
-graph.add_node('repeated_roots', repeated_roots)
-graph.add_node('no_real_roots', no_real_roots)
-
-# add edges to your graph
-graph.add_edge(START, 'show_equation')
-graph.add_edge('show_equation', 'calculate_discriminant')
-
-graph.add_conditional_edges('calculate_discriminant', check_condition)
-graph.add_edge('real_roots', END)
-graph.add_edge('repeated_roots', END)
-graph.add_edge('no_real_roots', END)
-
-# compile the graph
-workflow = graph.compile()
-
-# execute the workflow with sample data
-initial_state: QuadraticState = {
-    "a": 1,
-    "b": 3,
-    "c": 2 
-}
-final_state = workflow.invoke(initial_state)
-
-print(f"Equation: {final_state['equation']}")
-print(f"Discriminant: {final_state['discriminant']}")
-print(f"Result: {final_state['result']}")
-
-# Visualize the workflow
-try:
-    from IPython.display import Image, display
-    display(Image(workflow.get_graph().draw_mermaid_png()))
-except Exception:
-    # If not in Jupyter, print ASCII representation
-    print("\nWorkflow Graph:")
-    print(workflow.get_graph().draw_ascii())
+# Build and compile the workflow graph on first use, so importing this module stays cheap.
+# processes=True runs every node in the shared process pool (see process_pool.py).
+@cache
+def get_workflow(processes: bool = False):
+    from langgraph.graph import StateGraph, START, END
+
+    if processes:
+        from process_pool import offload as node
+    else:
+        node = lambda function: function
+
+    # Define the workflow graph
+    graph = StateGraph(QuadraticState)
+
+    # Add nodes to your graph
+    graph.add_node('show_equation', node(show_equation))
+    graph.add_node('calculate_discriminant', node(calculate_discriminant))
+    graph.add_node('real_roots', node(real_roots))
+    graph.add_node('repeated_roots', node(repeated_roots))
+    graph.add_node('no_real_roots', node(no_real_roots))
+
+    # add edges to your graph
+    graph.add_edge(START, 'show_equation')
+    graph.add_edge('show_equation', 'calculate_discriminant')
+
+    graph.add_conditional_edges('calculate_discriminant', check_condition)
+    graph.add_edge('real_roots', END)
+    graph.add_edge('repeated_roots', END)
+    graph.add_edge('no_real_roots', END)
+
+    # compile the graph
+    return graph.compile()
+
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if __name__ == "__main__":
+    workflow = get_workflow()
+
+    # execute the workflow with sample data
+    initial_state: QuadraticState = {
+        "a": 1,
+        "b": 3,
+        "c": 2 
+    }
+    final_state = workflow.invoke(initial_state)
+
+    print(f"Equation: {final_state['equation']}")
+    print(f"Discriminant: {final_state['discriminant']}")
+    print(f"Result: {final_state['result']}")
+
+    # Visualize the workflow
+    try:
+        from IPython.display import Image, display
+        display(Image(workflow.get_graph().draw_mermaid_png()))
+    except Exception:
+        # If not in Jupyter, print ASCII representation
+        print("\nWorkflow Graph:")
+        print(workflow.get_graph().draw_ascii())
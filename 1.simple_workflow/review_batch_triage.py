@@ -0,0 +1,325 @@
+import argparse
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Mapping
+
+from langchain_core.callbacks import BaseCallbackHandler
+from pydantic import BaseModel, Field, ValidationError
+
+import review_reply_workflow
+from fake_models import FakeChatModel, fake_structured_output
+from review_reply_workflow import (
+    DiagnosisSchema,
+    ReviewState,
+    SentimentSchema,
+    check_sentiment,
+    diagnosis_prompt,
+    negative_prompt,
+    positive_prompt,
+    pre_classify,
+    sentiment_prompt,
+)
+
+# Packed results: one item per review, keyed by review_id. Fields are plain strings here and
+# are validated per item against SentimentSchema / DiagnosisSchema, so one bad item does not
+# throw away the answers for the rest of the batch.
+class PackedSentiment(BaseModel):
+    review_id: str = Field(description='The id of the review, copied from the input')
+    sentiment: str = Field(description='Sentiment of the review: "positive" or "negative"')
+
+class SentimentBatch(BaseModel):
+    results: list[PackedSentiment] = Field(description='One result per review')
+
+class PackedDiagnosis(BaseModel):
+    review_id: str = Field(description='The id of the review, copied from the input')
+    issue_type: str = Field(description='The category of issue: "UX", "Performance", "Bug", "Support" or "Other"')
+    tone: str = Field(description='The emotional tone: "angry", "frustrated", "disappointed" or "calm"')
+    urgency: str = Field(description='How urgent the issue is: "low", "medium" or "high"')
+
+class DiagnosisBatch(BaseModel):
+    results: list[PackedDiagnosis] = Field(description='One result per review')
+
+
+# One classification step of the workflow, in packed and single-review form
+@dataclass(frozen=True)
+class TriageTask:
+    instruction: str
+    packed_schema: type[BaseModel]
+    schema: type[BaseModel]
+    single_prompt: Callable[[str], str]
+    single_model: str  # attribute of review_reply_workflow, looked up at call time
+    output_tokens: int  # estimated output tokens per review
+
+
+SENTIMENT = TriageTask(
+    instruction="For each of the following reviews find out the sentiment.",
+    packed_schema=SentimentBatch,
+    schema=SentimentSchema,
+    single_prompt=sentiment_prompt,
+    single_model="sentiment_model",
+    output_tokens=20,
+)
+
+DIAGNOSIS = TriageTask(
+    instruction="Diagnose each of the following negative reviews. Return issue_type, tone, and urgency for each.",
+    packed_schema=DiagnosisBatch,
+    schema=DiagnosisSchema,
+    single_prompt=diagnosis_prompt,
+    single_model="diagnosis_model",
+    output_tokens=40,
+)
+
+_REVIEW_BLOCK = re.compile(r'<review id="([^"]*)">\n(.*?)\n</review>', re.S)
+
+
+# Rough token count (about 4 characters per token for English text); good enough for budgeting
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def packed_prompt(task: TriageTask, reviews: list[tuple[str, str]]) -> str:
+    blocks = "\n\n".join(f'<review id="{review_id}">\n{text}\n</review>' for review_id, text in reviews)
+    return f"{task.instruction} Return one result per review, with its review_id.\n\n{blocks}"
+
+
+# Split reviews into packs that fit the token budget: the packed prompt stays under
+# max_input_tokens and the expected answer under max_output_tokens. Long reviews simply make
+# smaller packs, and a review that is too long on its own gets a pack to itself.
+def pack_reviews(
+    reviews: Mapping[str, str],
+    task: TriageTask,
+    max_input_tokens: int = 8000,
+    max_output_tokens: int = 4000,
+    max_batch: int = 100,
+) -> list[list[str]]:
+    packs, current = [], []
+    input_tokens = estimate_tokens(packed_prompt(task, []))
+    for review_id, text in reviews.items():
+        cost = estimate_tokens(f'<review id="{review_id}">\n{text}\n</review>\n\n')
+        full = (
+            len(current) >= max_batch
+            or input_tokens + cost > max_input_tokens
+            or (len(current) + 1) * task.output_tokens > max_output_tokens
+        )
+        if current and full:
+            packs.append(current)
+            current, input_tokens = [], estimate_tokens(packed_prompt(task, []))
+        current.append(review_id)
+        input_tokens += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+# Classify every review with packed calls, then redo any review whose item is missing,
+# duplicated or fails validation (or whose whole pack failed) with a single-review call.
+# A review whose single-review call fails too is left out of the results, and its error is
+# recorded in counts["errors"] (review id -> "ExceptionType: message").
+def classify_reviews(
+    reviews: Mapping[str, str], task: TriageTask, max_concurrency: int = 8, counts: dict | None = None, **budget
+) -> dict[str, dict]:
+    counts = counts if counts is not None else {}
+    packs = pack_reviews(reviews, task, **budget)
+    packed_model = review_reply_workflow.model.with_structured_output(task.packed_schema)
+    outputs = packed_model.batch(
+        [packed_prompt(task, [(review_id, reviews[review_id]) for review_id in pack]) for pack in packs],
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True,
+    )
+    counts["packed_calls"] = counts.get("packed_calls", 0) + len(packs)
+
+    results = {}
+    for pack, output in zip(packs, outputs):
+        if isinstance(output, Exception):
+            continue
+        wanted = set(pack)
+        for item in output.results:
+            if item.review_id not in wanted or item.review_id in results:
+                continue
+            try:
+                results[item.review_id] = task.schema(**item.model_dump(exclude={"review_id"})).model_dump()
+            except ValidationError:
+                pass
+
+    missing = [review_id for review_id in reviews if review_id not in results]
+    single_model = getattr(review_reply_workflow, task.single_model)
+    singles = single_model.batch(
+        [task.single_prompt(reviews[review_id]) for review_id in missing], config={"max_concurrency": max_concurrency}, return_exceptions=True
+    )
+    counts["fallback_calls"] = counts.get("fallback_calls", 0) + len(missing)
+    for review_id, output in zip(missing, singles):
+        if isinstance(output, Exception):
+            _record_error(counts, review_id, output)
+        else:
+            results[review_id] = output.model_dump()
+    return results
+
+
+def _record_error(counts: dict, review_id: str, error: Exception) -> None:
+    counts.setdefault("errors", {})[review_id] = f"{type(error).__name__}: {error}"
+
+
+# Bulk version of the review reply workflow: the local pre-classifier, packed sentiment for the
+# reviews it is unsure about, the graph's own check_sentiment router over the whole batch,
+# packed diagnosis for the negative ones and, with replies=True, the reply messages (one call
+# per review, as in the graph).
+# Returns one ReviewState per review id, plus call counts. A review whose call failed keeps
+# the fields filled in before the failure, skips the later steps, and is listed in
+# counts["errors"].
+def triage_reviews(
+    reviews: Mapping[str, str], replies: bool = False, max_concurrency: int = 8, **budget
+) -> tuple[dict[str, ReviewState], dict]:
+    counts = {"reviews": len(reviews)}
+    states: dict[str, ReviewState] = {
+        review_id: {"review": text, **pre_classify({"review": text}), "diagnosis": {}, "response": ""}
+        for review_id, text in reviews.items()
+    }
+    ambiguous = {review_id: reviews[review_id] for review_id, state in states.items() if not state["sentiment"]}
+    counts["pre_classified"] = len(reviews) - len(ambiguous)
+    for review_id, sentiment in classify_reviews(ambiguous, SENTIMENT, max_concurrency, counts, **budget).items():
+        states[review_id]["sentiment"] = sentiment["sentiment"]
+
+    negative = {
+        review_id: reviews[review_id] for review_id, state in states.items() if state["sentiment"] and check_sentiment(state) == "run_diagnosis"
+    }
+    for review_id, diagnosis in classify_reviews(negative, DIAGNOSIS, max_concurrency, counts, **budget).items():
+        states[review_id]["diagnosis"] = diagnosis
+
+    if replies:
+        failed = counts.get("errors", {})
+        pending = [review_id for review_id in states if review_id not in failed]
+        prompts = [
+            positive_prompt(states[review_id]["review"]) if review_id not in negative else negative_prompt(states[review_id]["diagnosis"])
+            for review_id in pending
+        ]
+        answers = review_reply_workflow.model.batch(prompts, config={"max_concurrency": max_concurrency}, return_exceptions=True)
+        for review_id, answer in zip(pending, answers):
+            if isinstance(answer, Exception):
+                _record_error(counts, review_id, answer)
+            else:
+                states[review_id]["response"] = answer.content
+        counts["reply_calls"] = len(prompts)
+    return states, counts
+
+
+# Answers packed prompts the way the fake answers each review on its own, so packed and
+# per-review results can be compared. Reviews containing garble_marker get an invalid item.
+def fake_packed_responder(garble_marker: str | None = "GARBLE") -> Callable:
+    single_prompts = {SentimentBatch: (SentimentSchema, sentiment_prompt), DiagnosisBatch: (DiagnosisSchema, diagnosis_prompt)}
+
+    def respond(prompt: str, schema: type[BaseModel] | None) -> str:
+        if schema not in single_prompts:
+            return None
+        single_schema, single_prompt = single_prompts[schema]
+        results = []
+        for review_id, text in _REVIEW_BLOCK.findall(prompt):
+            item = fake_structured_output(single_schema, single_prompt(text))
+            if garble_marker and garble_marker in text:
+                item = {name: "unsure" for name in item}
+            results.append({"review_id": review_id, **item})
+        return json.dumps({"results": results})
+
+    return respond
+
+
+# Swap the workflow's model for an offline fake that takes `latency` to the first token and
+# `token_latency` per further token, so packed calls cost more than single ones. The lazy
+# sentiment and diagnosis models are built from it.
+def use_fake_model(latency: float = 0.2, token_latency: float = 0.002) -> None:
+    review_reply_workflow.model.override(
+        FakeChatModel(latency=latency, token_latency=token_latency, responder=fake_packed_responder())
+    )
+
+
+# Counts chat model calls made inside a graph run, per node
+class _CallCounter(BaseCallbackHandler):
+    def __init__(self):
+        self.calls: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node", "other")
+        with self._lock:
+            self.calls[node] = self.calls.get(node, 0) + 1
+
+
+def synthetic_reviews(count: int) -> dict[str, str]:
+    texts = [
+        "Love the new design, everything feels faster and cleaner.",
+        "The app crashes every time I try to upload a photo. This is so frustrating!",
+        "Support never answered my ticket about the billing issue.",
+        "Great app, I use it every day with my family.",
+        "Since the last update the feed takes forever to load on my phone.",
+        "It does the job, although the settings page confuses me.",
+        "Not sure about the new layout yet, the old one felt more familiar.",
+        "Used to be nice, but now it's bloated and hard to navigate.",
+    ]
+    reviews = {f"review-{i}": f"{texts[i % len(texts)]} (order #{i})" for i in range(count)}
+    # A few items the packed answer gets wrong, to exercise the single-review fallback
+    for i in range(0, count, 97):
+        reviews[f"review-{i}"] += " GARBLE"
+    return reviews
+
+
+def benchmark(reviews: int = 2000, max_concurrency: int = 16):
+    use_fake_model()
+    corpus = synthetic_reviews(reviews)
+    print(f"{len(corpus)} reviews, concurrency {max_concurrency}, fake model 200 ms + 2 ms/token")
+
+    counter = _CallCounter()
+    start = time.perf_counter()
+    graph_states = review_reply_workflow.get_workflow().batch(
+        [{"review": text, "sentiment": "", "diagnosis": {}, "response": ""} for text in corpus.values()],
+        config={"max_concurrency": max_concurrency, "callbacks": [counter]},
+    )
+    graph_seconds = time.perf_counter() - start
+    graph_calls = sum(counter.calls.values())
+    graph_classify = counter.calls.get("find_sentiment", 0) + counter.calls.get("run_diagnosis", 0)
+
+    start = time.perf_counter()
+    states, counts = triage_reviews(corpus, replies=True, max_concurrency=max_concurrency)
+    triage_seconds = time.perf_counter() - start
+    triage_classify = counts["packed_calls"] + counts["fallback_calls"]
+
+    for label, calls, classify, seconds in (
+        ("Per-review graph", graph_calls, graph_classify, graph_seconds),
+        ("Packed triage", triage_classify + counts["reply_calls"], triage_classify, triage_seconds),
+    ):
+        print(
+            f"{label:<17}: {calls / len(corpus):.3f} calls/review ({classify / len(corpus):.3f} classification) "
+            f"| {len(corpus) / seconds:8.1f} reviews/sec"
+        )
+    print(
+        f"Pre-classified: {counts['pre_classified']}, packed calls: {counts['packed_calls']}, "
+        f"single-review fallbacks: {counts['fallback_calls']}"
+    )
+
+    mismatches = sum(
+        (state["sentiment"], state["diagnosis"], state["response"]) != (graph["sentiment"], graph["diagnosis"], graph["response"])
+        for state, graph in zip(states.values(), graph_states)
+    )
+    print(f"Mismatches against the graph: {mismatches}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Triage reviews with packed structured-output calls")
+    parser.add_argument("reviews", nargs="?", help="JSONL file with id and review fields")
+    parser.add_argument("--replies", action="store_true", help="also write a reply for every review")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum calls in flight")
+    parser.add_argument("--fake", action="store_true", help="use the offline fake model")
+    args = parser.parse_args()
+
+    if args.reviews is None:
+        benchmark()
+    else:
+        if args.fake:
+            use_fake_model()
+        with open(args.reviews) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        states, counts = triage_reviews({str(row["id"]): row["review"] for row in rows}, args.replies, args.concurrency)
+        for review_id, state in states.items():
+            print(json.dumps({"id": review_id, **state}))
+        print(counts)
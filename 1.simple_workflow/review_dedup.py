@@ -0,0 +1,243 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Iterable
+
+import review_reply_workflow
+from review_reply_workflow import ReviewState
+
+_WORD = re.compile(r"[a-z0-9']+")
+_NUMBER = re.compile(r"\d+")
+
+
+# Near-duplicate clustering of a review stream with MinHash and LSH, local and in pure Python.
+#   - a review is reduced to its character 5-grams (lowercased, punctuation dropped, numbers
+#     replaced by 0, so order numbers and typos change only a few of them)
+#   - its MinHash signature has `bands` x `rows` values: the minimum of the shingles' CRC-32
+#     XORed with one random mask per value
+#   - a review is compared only with cluster representatives that share a band with it (LSH);
+#     it joins the most similar one if their exact shingle Jaccard similarity is at least
+#     `threshold`, and otherwise starts a cluster of its own
+#   - clusters are anchored on their representative (the first review), so they cannot drift
+#     from one complaint to another through chains of similar members
+#   - a representative older than `window` seconds takes no new members: later reviews start a
+#     new cluster and get a fresh answer
+# With 10 bands of 3 rows, pairs at 0.7 similarity become candidates 98% of the time, at 0.6
+# 91% and at 0.2 8%; the exact check then drops the false candidates. More bands of fewer rows
+# miss fewer pairs near the threshold but check many more candidates (16 x 2: 4x slower).
+class ReviewClusterer:
+    def __init__(self, threshold: float = 0.7, window: float = 3600.0, bands: int = 10, rows: int = 3, shingle: int = 5, seed: int = 0):
+        self.threshold = threshold
+        self.window = window
+        self.bands = bands
+        self.rows = rows
+        self.shingle = shingle
+        rng = random.Random(seed)
+        self._masks = [rng.getrandbits(32) for _ in range(bands * rows)]
+        self._buckets: dict[tuple, list[str]] = {}
+        self._representatives: dict[str, tuple[float, frozenset, list[tuple]]] = {}  # id -> (time, shingles, band keys)
+        self._expiry: deque[tuple[float, str]] = deque()
+        self.cluster_of: dict[str, str] = {}  # review id -> representative id
+        self.counters = {"reviews": 0, "clusters": 0, "candidates": 0, "expired": 0}
+        self._lock = threading.Lock()
+
+    def shingles(self, text: str) -> frozenset:
+        normal = _NUMBER.sub("0", " ".join(_WORD.findall(text.lower())))
+        return frozenset(normal[index:index + self.shingle] for index in range(max(1, len(normal) - self.shingle + 1)))
+
+    def signature(self, shingles: frozenset) -> list[int]:
+        hashes = [zlib.crc32(shingle.encode()) for shingle in shingles]
+        return [min(map(mask.__xor__, hashes)) for mask in self._masks]
+
+    def _band_keys(self, signature: list[int]) -> list[tuple]:
+        return [(band, *signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def _expire(self, now: float) -> None:
+        while self._expiry and self._expiry[0][0] <= now - self.window:
+            _, representative = self._expiry.popleft()
+            _, _, keys = self._representatives.pop(representative)
+            for key in keys:
+                self._buckets[key].remove(representative)
+                if not self._buckets[key]:
+                    del self._buckets[key]
+            self.counters["expired"] += 1
+
+    # Cluster one review; returns the id of its representative (its own id for a new cluster).
+    # Reviews must be added in time order.
+    def add(self, review_id: str, text: str, timestamp: float | None = None) -> str:
+        timestamp = time.time() if timestamp is None else timestamp
+        shingles = self.shingles(text)
+        keys = self._band_keys(self.signature(shingles))
+        with self._lock:
+            self._expire(timestamp)
+            self.counters["reviews"] += 1
+            candidates = {representative for key in keys for representative in self._buckets.get(key, ())}
+            self.counters["candidates"] += len(candidates)
+            best, best_similarity = None, self.threshold
+            for candidate in candidates:
+                other = self._representatives[candidate][1]
+                similarity = len(shingles & other) / len(shingles | other)
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best is None:
+                best = review_id
+                self._representatives[review_id] = (timestamp, shingles, keys)
+                self._expiry.append((timestamp, review_id))
+                for key in keys:
+                    self._buckets.setdefault(key, []).append(review_id)
+                self.counters["clusters"] += 1
+            self.cluster_of[review_id] = best
+            return best
+
+
+# Reply sent to the other members of a cluster, formatted with the representative's answer:
+# {response}, {sentiment}, {issue_type}, {tone}, {urgency} (empty for positive reviews) and
+# {cluster_size}. The default says that the reply was written for a similar review.
+REPLY_TEMPLATE = "Thank you for your review. {cluster_size} customers told us much the same thing, so this is the reply we wrote for one of them:\n\n{response}"
+
+
+# Answer a batch of reviews ((id, text, timestamp) in time order) with one graph run per
+# cluster of near-duplicates. Members get the representative's sentiment and diagnosis, and
+# `template` filled in with its answer. Returns one ReviewState per review id, and counts.
+def answer_reviews(
+    reviews: Iterable[tuple[str, str, float]],
+    clusterer: ReviewClusterer | None = None,
+    template: str = REPLY_TEMPLATE,
+    max_concurrency: int = 8,
+    config: dict | None = None,
+) -> tuple[dict[str, ReviewState], dict]:
+    clusterer = clusterer or ReviewClusterer()
+    texts, clusters = {}, {}
+    for review_id, text, timestamp in reviews:
+        texts[review_id] = text
+        clusters.setdefault(clusterer.add(review_id, text, timestamp), []).append(review_id)
+
+    representatives = list(clusters)
+    results = review_reply_workflow.get_workflow().batch(
+        [{"review": texts[review_id], "sentiment": "", "diagnosis": {}, "response": ""} for review_id in representatives],
+        config={**(config or {}), "max_concurrency": max_concurrency},
+    )
+    states: dict[str, ReviewState] = {}
+    for representative, result in zip(representatives, results):
+        members = clusters[representative]
+        fields = {"sentiment": result["sentiment"], "issue_type": "", "tone": "", "urgency": "", **result["diagnosis"], "response": result["response"], "cluster_size": len(members)}
+        for review_id in members:
+            response = result["response"] if review_id == representative else template.format_map(fields)
+            states[review_id] = {"review": texts[review_id], "sentiment": result["sentiment"], "diagnosis": result["diagnosis"], "response": response}
+    counts = {"reviews": len(texts), "clusters": len(clusters), "graph_runs": len(representatives), "largest_cluster": max(map(len, clusters.values()), default=0)}
+    return {review_id: states[review_id] for review_id in texts}, counts
+
+
+# A simulated incident: `count` reviews over `hours`, mostly varied everyday reviews, plus a
+# burst of complaints about a bad release (three phrasings of a photo-upload crash, a login
+# loop and a slow feed) making up `incident_share` of the traffic for the middle hour. Each
+# review carries noise: typos, casing, extra phrases and an order number. Returns
+# (id, text, timestamp, topic) with the topic that generated it.
+def simulated_burst(count: int = 10_000, hours: float = 3.0, incident_share: float = 0.7, seed: int = 0) -> list[tuple[str, str, float, str]]:
+    rng = random.Random(seed)
+    incidents = {
+        "photo_crash_1": "The app crashes every time I try to upload a photo.",
+        "photo_crash_2": "Uploading a picture makes the whole app close immediately.",
+        "photo_crash_3": "Photo upload is broken since the update, it just crashes.",
+        "login_loop": "After the update I keep getting logged out and can't log back in.",
+        "slow_feed": "Since the latest version the feed takes forever to load.",
+    }
+    openers = ["", "Honestly, ", "Well, ", "So ", "I think ", "Overall ", "To be fair, ", "Update: "]
+    subjects = ["the search", "dark mode", "the new layout", "notifications", "the checkout", "syncing between devices", "the widget", "offline mode", "the calendar view", "sharing to friends", "the settings page", "voice notes"]
+    verdicts = [
+        "works really well for me", "is confusing and hard to find", "saves me a lot of time every week", "drains my battery quickly",
+        "looks beautiful on my tablet", "has been flaky for a while", "is exactly what I needed", "could use a few more options",
+        "feels slower than it used to", "is my favourite part of the app",
+    ]
+    extras = ["", "", " Please fix!", " So frustrating.", " 1 star until fixed.", " Thanks!", " Any update?", " Really annoying."]
+    start, end = hours / 3 * 3600, hours * 2 / 3 * 3600
+
+    def noisy(text: str) -> str:
+        characters = list(text)
+        for _ in range(rng.choice((0, 0, 1, 2))):
+            index = rng.randrange(len(characters))
+            if characters[index].isalpha():
+                characters[index] = rng.choice("aeiourstnl")
+        text = "".join(characters)
+        text = text.lower() if rng.random() < 0.2 else text
+        return f"{text}{rng.choice(extras)} (order #{rng.randrange(100_000)})"
+
+    reviews = []
+    for index, timestamp in enumerate(sorted(rng.uniform(0, hours * 3600) for _ in range(count))):
+        if start <= timestamp < end and rng.random() < incident_share:
+            topic = rng.choice(list(incidents))
+            text = incidents[topic]
+        else:
+            opener, subject, verdict = rng.choice(openers), rng.choice(subjects), rng.choice(verdicts)
+            topic = f"{subject}|{verdict}"
+            text = f"{opener}{subject} {verdict}."
+            text = text[0].upper() + text[1:]
+        reviews.append((f"review-{index}", noisy(text), timestamp, topic))
+    return reviews
+
+
+# LLM calls per 10k reviews of simulated_burst: every review through the graph, and one graph
+# run per cluster for each threshold; plus clustering speed and cluster purity (the share of
+# members generated from the same topic as their representative)
+def benchmark(count: int = 10_000, thresholds: Iterable[float] = (0.4, 0.5, 0.6, 0.7, 0.8), window: float = 3600.0) -> None:
+    from fake_models import FakeChatModel
+    from review_batch_triage import _CallCounter
+
+    review_reply_workflow.model.override(FakeChatModel())
+    burst = simulated_burst(count)
+    topic = {review_id: label for review_id, _, _, label in burst}
+    workflow = review_reply_workflow.get_workflow()
+
+    counter = _CallCounter()
+    workflow.batch([{"review": text, "sentiment": "", "diagnosis": {}, "response": ""} for _, text, _, _ in burst], config={"max_concurrency": 16, "callbacks": [counter]})
+    baseline = sum(counter.calls.values())
+    per_10k = 10_000 / count
+    print(f"{count:,} reviews over 3 h, 70% of the middle hour from 5 incident complaints, window {window / 60:.0f} min")
+    print(f"{'':<16} {'clusters':>8} {'LLM calls':>9} {'per 10k':>8} {'saved':>6} {'purity':>7} {'cluster/s':>9}")
+    print(f"{'every review':<16} {count:>8,} {baseline:>9,} {baseline * per_10k:>8,.0f}")
+    for threshold in thresholds:
+        clusterer = ReviewClusterer(threshold=threshold, window=window)
+        start = time.perf_counter()
+        for review_id, text, timestamp, _ in burst:
+            clusterer.add(review_id, text, timestamp)
+        speed = count / (time.perf_counter() - start)
+        clusterer = ReviewClusterer(threshold=threshold, window=window)
+        counter = _CallCounter()
+        _, counts = answer_reviews(((review_id, text, timestamp) for review_id, text, timestamp, _ in burst), clusterer, max_concurrency=16, config={"callbacks": [counter]})
+        calls = sum(counter.calls.values())
+        purity = sum(topic[review_id] == topic[representative] for review_id, representative in clusterer.cluster_of.items()) / count
+        print(
+            f"{f'threshold {threshold:g}':<16} {counts['clusters']:>8,} {calls:>9,} {calls * per_10k:>8,.0f} {1 - calls / baseline:>6.0%} "
+            f"{purity:>7.1%} {speed:>9,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer near-duplicate reviews once per cluster")
+    parser.add_argument("reviews", nargs="?", help="JSONL file with id, review and (optional) timestamp fields")
+    parser.add_argument("--threshold", type=float, default=0.7, help="Jaccard similarity to join a cluster")
+    parser.add_argument("--window", type=float, default=3600.0, help="seconds a cluster keeps taking members")
+    parser.add_argument("--fake", action="store_true", help="use the offline fake model")
+    args = parser.parse_args()
+
+    if args.reviews is None:
+        benchmark(window=args.window)
+    else:
+        if args.fake:
+            from fake_models import FakeChatModel
+
+            review_reply_workflow.model.override(FakeChatModel())
+        with open(args.reviews) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        states, counts = answer_reviews(
+            ((str(row["id"]), row["review"], float(row.get("timestamp", index))) for index, row in enumerate(rows)),
+            ReviewClusterer(threshold=args.threshold, window=args.window),
+        )
+        for review_id, state in states.items():
+            print(json.dumps({"id": review_id, **state}))
+        print(counts)
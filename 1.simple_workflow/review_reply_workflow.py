@@ -1,12 +1,14 @@
-from langgraph.graph import StateGraph, START, END
-from langchain_openai import ChatOpenAI
+import asyncio
+import os
+import threading
+from functools import cache
+from lazy_models import chat_openai, structured
 from typing import TypedDict, Literal
-from dotenv import load_dotenv
 from pydantic import BaseModel, Field
+from sentiment_prefilter import get_pre_classifier
 
-load_dotenv()
-
-model = ChatOpenAI(model='gpt-4o-mini')
+# Created on first use (see lazy_models.py)
+model = chat_openai(model='gpt-4o-mini')
 
 class SentimentSchema(BaseModel):
     sentiment: Literal["positive", "negative"] = Field(description='Sentiment of the review')
@@ -16,8 +18,11 @@ class DiagnosisSchema(BaseModel):
     tone: Literal["angry", "frustrated", "disappointed", "calm"] = Field(description='The emotional tone expressed by the user')
     urgency: Literal["low", "medium", "high"] = Field(description='How urgent or critical the issue appears to be')
 
-sentiment_model = model.with_structured_output(SentimentSchema)
-diagnosis_model = model.with_structured_output(DiagnosisSchema)
+sentiment_model = structured(model, SentimentSchema)
+diagnosis_model = structured(model, DiagnosisSchema)
+
+# Local pre-classifier in front of find_sentiment (None sends every review to the LLM)
+pre_classifier = get_pre_classifier()
 
 # Define states for the workflow
 class ReviewState(TypedDict):
@@ -26,9 +31,42 @@ class ReviewState(TypedDict):
     diagnosis: dict
     response: str
 
+# Prompt builders, shared with the packed batch triage in review_batch_triage.py
+def sentiment_prompt(review: str) -> str:
+    return f'For the following review find out the sentiment \n {review}'
+
+def positive_prompt(review: str) -> str:
+    return f"""Write a warm thank-you message in response to this review:
+    \n\n\"{review}\"\n
+Also, kindly ask the user to leave feedback on our website."""
+
+def diagnosis_prompt(review: str) -> str:
+    return f"""Diagnose this negative review:\n\n{review}\n"
+    "Return issue_type, tone, and urgency.
+"""
+
+def negative_prompt(diagnosis: dict) -> str:
+    return f"""You are a support assistant.
+The user had a '{diagnosis['issue_type']}' issue, sounded '{diagnosis['tone']}', and marked urgency as '{diagnosis['urgency']}'.
+Write an empathetic, helpful resolution message.
+"""
+
+def pre_classify(state: ReviewState):
+
+    sentiment = pre_classifier.classify(state["review"]) if pre_classifier is not None else None
+
+    return {'sentiment': sentiment or ''}
+
+def check_pre_classified(state: ReviewState) -> Literal["find_sentiment", "positive_response", "run_diagnosis"]:
+
+    if state.get('sentiment') in ('positive', 'negative'):
+        return check_sentiment(state)
+    else:
+        return 'find_sentiment'
+
 def find_sentiment(state: ReviewState):
 
-    prompt = f'For the following review find out the sentiment \n {state["review"]}'
+    prompt = sentiment_prompt(state["review"])
     sentiment = sentiment_model.invoke(prompt).sentiment
 
     return {'sentiment': sentiment}
@@ -42,9 +80,7 @@ def check_sentiment(state: ReviewState) -> Literal["positive_response", "run_dia
     
 def positive_response(state: ReviewState):
 
-    prompt = f"""Write a warm thank-you message in response to this review:
-    \n\n\"{state['review']}\"\n
-Also, kindly ask the user to leave feedback on our website."""
+    prompt = positive_prompt(state['review'])
     
     response = model.invoke(prompt).content
 
@@ -52,9 +88,7 @@ Also, kindly ask the user to leave feedback on our website."""
 
 def run_diagnosis(state: ReviewState):
 
-    prompt = f"""Diagnose this negative review:\n\n{state['review']}\n"
-    "Return issue_type, tone, and urgency.
-"""
+    prompt = diagnosis_prompt(state['review'])
     response = diagnosis_model.invoke(prompt)
 
     return {'diagnosis': response.model_dump()}
@@ -63,50 +97,329 @@ def negative_response(state: ReviewState):
 
     diagnosis = state['diagnosis']
 
-    prompt = f"""You are a support assistant.
-The user had a '{diagnosis['issue_type']}' issue, sounded '{diagnosis['tone']}', and marked urgency as '{diagnosis['urgency']}'.
-Write an empathetic, helpful resolution message.
-"""
+    prompt = negative_prompt(diagnosis)
     response = model.invoke(prompt).content
 
     return {'response': response}
 
-# Define the workflow graph
-graph = StateGraph(ReviewState) 
-# Add nodes to your graph
-graph.add_node('find_sentiment', find_sentiment)
-graph.add_node('positive_response', positive_response)
-graph.add_node('run_diagnosis', run_diagnosis)
-graph.add_node('negative_response', negative_response) 
-# add edges to your graph
-graph.add_edge(START, 'find_sentiment')
-graph.add_conditional_edges('find_sentiment', check_sentiment)
-graph.add_edge('positive_response', END)
-graph.add_edge('run_diagnosis', 'negative_response')
-graph.add_edge('negative_response', END)
-
-# compile the graph
-workflow = graph.compile()
-
-# execute the workflow with sample data
-initial_state: ReviewState = {
-    "review": "The app crashes every time I try to upload a photo. This is so frustrating!",
-    "sentiment": "",
-    "diagnosis": {},
-    "response": ""
-}       
-
-final_state = workflow.invoke(initial_state)
-print(f"Review: {final_state['review']}")
-print(f"Sentiment: {final_state['sentiment']}")
-print(f"Diagnosis: {final_state['diagnosis']}")
-print(f"Response: {final_state['response']}")   
-
-# Visualize the workflow
-try:
-    from IPython.display import Image, display
-    display(Image(workflow.get_graph().draw_mermaid_png()))
-except Exception:
-    # If not in Jupyter, print ASCII representation
-    print("\nWorkflow Graph:")
-    print(workflow.get_graph().draw_ascii())
\ No newline at end of file
+# Async twins of the LLM nodes, used by workflow.ainvoke / abatch so model calls don't block,
+# and by speculative_sentiment so a losing branch's request can be cancelled
+async def afind_sentiment(state: ReviewState):
+    return {'sentiment': (await sentiment_model.ainvoke(sentiment_prompt(state["review"]))).sentiment}
+
+async def apositive_response(state: ReviewState):
+    return {'response': (await model.ainvoke(positive_prompt(state['review']))).content}
+
+async def arun_diagnosis(state: ReviewState):
+    return {'diagnosis': (await diagnosis_model.ainvoke(diagnosis_prompt(state['review']))).model_dump()}
+
+async def anegative_response(state: ReviewState):
+    return {'response': (await model.ainvoke(negative_prompt(state['diagnosis']))).content}
+
+BRANCHES = {'positive_response': (positive_response, apositive_response), 'run_diagnosis': (run_diagnosis, arun_diagnosis)}
+
+# When to speculate, and what it cost. A branch is started alongside find_sentiment when its
+# prior probability is at least `min_prior`: 0.5 starts the likelier branch (both on a tie),
+# 0 always starts both, anything above 1 never speculates.
+#   - the prior is the share of positive reviews seen so far, moved towards the pre-classifier's
+#     lean by its confidence (reviews it was sure about never get here)
+#   - cost cap: while the wasted calls exceed `max_waste` per review, reviews run sequentially
+#   - counters: reviews, speculated, hits (the winning branch was already running), misses,
+#     speculative_calls, wasted_calls (started for the losing branch), cancelled (of those, the
+#     ones stopped before they finished), below_prior and over_budget (reviews not speculated)
+class Speculation:
+    def __init__(self, min_prior: float = 0.5, max_waste: float = 0.5):
+        self.min_prior = min_prior
+        self.max_waste = max_waste
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = {key: 0 for key in ("reviews", "speculated", "hits", "misses", "speculative_calls", "wasted_calls", "cancelled", "below_prior", "over_budget")}
+            self.seen = {"positive": 1, "negative": 1}  # Laplace smoothing
+
+    # Probability that `review` is positive
+    def prior(self, review: str) -> float:
+        with self._lock:
+            base = self.seen["positive"] / (self.seen["positive"] + self.seen["negative"])
+        score = getattr(pre_classifier, "score", None)
+        if score is None:
+            return base
+        sentiment, confidence = score(review)
+        return base + (1 - base) * confidence if sentiment == "positive" else base * (1 - confidence)
+
+    # Branch nodes to start for `review`, likelier first
+    def branches(self, review: str) -> list[str]:
+        positive = self.prior(review)
+        ranked = sorted([('positive_response', positive), ('run_diagnosis', 1 - positive)], key=lambda item: -item[1])
+        chosen = [name for name, probability in ranked if probability >= self.min_prior]
+        with self._lock:
+            self.counters["reviews"] += 1
+            if not chosen:
+                self.counters["below_prior"] += 1
+            elif self.counters["wasted_calls"] > self.max_waste * self.counters["reviews"]:
+                self.counters["over_budget"] += 1
+                chosen = []
+            else:
+                self.counters["speculated"] += 1
+                self.counters["speculative_calls"] += len(chosen)
+        return chosen
+
+    def record(self, sentiment: str, started: list[str], cancelled: int) -> None:
+        winner = check_sentiment({'sentiment': sentiment})
+        with self._lock:
+            self.seen["positive" if winner == 'positive_response' else "negative"] += 1
+            if started:
+                self.counters["hits" if winner in started else "misses"] += 1
+            self.counters["wasted_calls"] += sum(name != winner for name in started)
+            self.counters["cancelled"] += cancelled
+
+    def stats(self) -> dict:
+        with self._lock:
+            speculated = self.counters["speculated"]
+            return {**self.counters, "hit_rate": self.counters["hits"] / speculated if speculated else 0.0}
+
+
+# Settings from the environment: REVIEW_SPECULATION_MIN_PRIOR (default 0.5) and
+# REVIEW_SPECULATION_MAX_WASTE (wasted calls per review, default 0.5)
+speculation = Speculation(
+    min_prior=float(os.getenv("REVIEW_SPECULATION_MIN_PRIOR", "0.5")),
+    max_waste=float(os.getenv("REVIEW_SPECULATION_MAX_WASTE", "0.5")),
+)
+
+# find_sentiment with the first call of the likely branch(es) started alongside it. Once the
+# sentiment is known the losing branch is cancelled, and only the sentiment and the winning
+# branch's update are returned. The async path cancels the losing request; the sync path can
+# only cancel a call that has not started yet, and drops the answer of one that has.
+def speculative_sentiment(speculation: Speculation):
+    def speculate(state: ReviewState):
+        from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+        started = speculation.branches(state['review'])
+        if not started:
+            return find_sentiment(state)
+        pool = ContextThreadPoolExecutor(max_workers=len(started))
+        try:
+            futures = {name: pool.submit(BRANCHES[name][0], state) for name in started}
+            update = find_sentiment(state)
+            winner = check_sentiment(update)
+            cancelled = sum(future.cancel() for name, future in futures.items() if name != winner)
+            speculation.record(update['sentiment'], started, cancelled)
+            if winner in futures:
+                update |= futures[winner].result()
+            return update
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def aspeculate(state: ReviewState):
+        started = speculation.branches(state['review'])
+        if not started:
+            return await afind_sentiment(state)
+        tasks = {name: asyncio.create_task(BRANCHES[name][1](state)) for name in started}
+        try:
+            update = await afind_sentiment(state)
+            winner = check_sentiment(update)
+            cancelled = sum(task.cancel() for name, task in tasks.items() if name != winner)
+            speculation.record(update['sentiment'], started, cancelled)
+            if winner in tasks:
+                update |= await tasks[winner]
+            return update
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    return speculate, aspeculate
+
+# After speculative_sentiment: skip the branch step that already ran
+def check_speculated(state: ReviewState) -> Literal["positive_response", "run_diagnosis", "negative_response", "done"]:
+
+    if state.get('response'):
+        return 'done'
+    if state.get('diagnosis'):
+        return 'negative_response'
+    return check_sentiment(state)
+
+# Build and compile the workflow graph on first use, so importing this module stays cheap
+# speculative=True: find_sentiment starts the likely branch alongside it (see Speculation)
+@cache
+def get_workflow(speculative: bool = False):
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import StateGraph, START, END
+
+    # Define the workflow graph
+    graph = StateGraph(ReviewState)
+    # Add nodes to your graph
+    graph.add_node('pre_classify', pre_classify)
+    if speculative:
+        func, afunc = speculative_sentiment(speculation)
+        graph.add_node('find_sentiment', RunnableLambda(func, afunc=afunc, name='find_sentiment'))
+    else:
+        graph.add_node('find_sentiment', RunnableLambda(find_sentiment, afunc=afind_sentiment))
+    # RunnableLambda pairs each sync node with its async version
+    graph.add_node('positive_response', RunnableLambda(positive_response, afunc=apositive_response))
+    graph.add_node('run_diagnosis', RunnableLambda(run_diagnosis, afunc=arun_diagnosis))
+    graph.add_node('negative_response', RunnableLambda(negative_response, afunc=anegative_response))
+    # add edges to your graph
+    graph.add_edge(START, 'pre_classify')
+    graph.add_conditional_edges('pre_classify', check_pre_classified)
+    if speculative:
+        graph.add_conditional_edges('find_sentiment', check_speculated, {'positive_response': 'positive_response', 'run_diagnosis': 'run_diagnosis', 'negative_response': 'negative_response', 'done': END})
+    else:
+        graph.add_conditional_edges('find_sentiment', check_sentiment)
+    graph.add_edge('positive_response', END)
+    graph.add_edge('run_diagnosis', 'negative_response')
+    graph.add_edge('negative_response', END)
+
+    # compile the graph
+    return graph.compile()
+
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# End-to-end latency of the sequential and speculative graphs on a fake model with `latency`
+# (low, high) seconds per call, over the labelled reviews (`repeat` times each, `concurrency`
+# at a time). The fake model answers find_sentiment with each review's label, and every review
+# goes to the LLM: the pre-classifier only supplies the prior. Every mode runs on the async path
+# (ainvoke), where a losing branch's request is cancelled; "both branches" runs once more on the
+# sync path (invoke), which lets it finish. Calls are counted when they start and when they
+# complete, so cancelled requests show up as the difference. The model, the pre-classifier
+# threshold and the speculation settings are put back afterwards.
+def benchmark(latency: tuple[float, float] = (0.05, 0.15), repeat: int = 3, concurrency: int = 8) -> None:
+    import json
+    import random
+    import statistics
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    from fake_models import FakeChatModel
+    from sentiment_prefilter import load_labelled
+
+    labelled = load_labelled(os.path.join(os.path.dirname(os.path.abspath(__file__)), "labelled_reviews.jsonl"))
+
+    class Calls(BaseCallbackHandler):
+        run_inline = True
+
+        def __init__(self):
+            self.started = self.completed = 0
+            self.lock = threading.Lock()
+
+        def on_chat_model_start(self, *args, **kwargs):
+            with self.lock:
+                self.started += 1
+
+        def on_llm_end(self, *args, **kwargs):
+            with self.lock:
+                self.completed += 1
+
+    def respond(prompt: str, schema) -> str | None:
+        if schema is SentimentSchema:
+            return json.dumps({"sentiment": next(label for review, label in labelled if review in prompt)})
+        return None
+
+    rng = random.Random(0)
+    previous_model = model.override(FakeChatModel(latency=lambda: rng.uniform(*latency), responder=respond))
+    previous_threshold = pre_classifier.threshold if pre_classifier is not None else None
+    previous_speculation = speculation.min_prior, speculation.max_waste
+    if pre_classifier is not None:
+        pre_classifier.threshold = float("inf")
+    try:
+        states = [{"review": review, "sentiment": "", "diagnosis": {}, "response": ""} for review, _ in labelled] * repeat
+        modes = [
+            ("sequential", "async", False, None, None),
+            ("likely branch", "async", True, 0.5, 0.5),
+            ("both branches", "async", True, 0.0, float("inf")),
+            ("both, capped", "async", True, 0.0, 0.25),
+            ("both branches", "sync", True, 0.0, float("inf")),
+        ]
+        print(f"{len(states)} reviews, fake model {latency[0] * 1000:.0f}-{latency[1] * 1000:.0f} ms per call, {concurrency} at a time")
+        print(f"{'mode':<14} {'path':<5} {'p50 ms':>7} {'p99 ms':>7} {'started':>7} {'completed':>9} {'hit rate':>8} {'wasted':>6} {'cancelled':>9}")
+        expected = None
+        for name, path, speculative, min_prior, max_waste in modes:
+            if speculative:
+                speculation.min_prior, speculation.max_waste = min_prior, max_waste
+                speculation.reset()
+            workflow = get_workflow(speculative=speculative)
+            calls = Calls()
+            config = {"callbacks": [calls]}
+
+            if path == "sync":
+                def timed(state: ReviewState):
+                    start = time.perf_counter()
+                    result = workflow.invoke(state, config)
+                    return time.perf_counter() - start, result
+
+                with ThreadPoolExecutor(concurrency) as pool:
+                    timings, results = zip(*pool.map(timed, states))
+            else:
+                async def run_all():
+                    limit = asyncio.Semaphore(concurrency)
+
+                    async def timed(state: ReviewState):
+                        async with limit:
+                            start = time.perf_counter()
+                            result = await workflow.ainvoke(state, config)
+                            return time.perf_counter() - start, result
+
+                    return await asyncio.gather(*map(timed, states))
+
+                timings, results = zip(*asyncio.run(run_all()))
+            expected = expected or results
+            assert list(results) == list(expected), "speculation changed a result"
+            stats = speculation.stats() if speculative else {"hit_rate": float("nan"), "wasted_calls": 0, "cancelled": 0}
+            cuts = statistics.quantiles(timings, n=100)
+            print(
+                f"{name:<14} {path:<5} {cuts[49] * 1000:>7.0f} {cuts[98] * 1000:>7.0f} {calls.started / len(states):>7.2f} {calls.completed / len(states):>9.2f} "
+                f"{stats['hit_rate']:>8.0%} {stats['wasted_calls']:>6} {stats['cancelled']:>9}"
+            )
+        print("started and completed: model calls per review")
+    finally:
+        model.override(previous_model)
+        if pre_classifier is not None:
+            pre_classifier.threshold = previous_threshold
+        speculation.min_prior, speculation.max_waste = previous_speculation
+        speculation.reset()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reply to a customer review")
+    parser.add_argument("--speculative", action="store_true", help="start the likely branch alongside sentiment detection")
+    parser.add_argument("--benchmark", action="store_true", help="compare sequential and speculative runs on a fake model")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        raise SystemExit
+
+    workflow = get_workflow(speculative=args.speculative)
+
+    # execute the workflow with sample data
+    initial_state: ReviewState = {
+        "review": "The app crashes every time I try to upload a photo. This is so frustrating!",
+        "sentiment": "",
+        "diagnosis": {},
+        "response": ""
+    }       
+
+    final_state = workflow.invoke(initial_state)
+    print(f"Review: {final_state['review']}")
+    print(f"Sentiment: {final_state['sentiment']}")
+    print(f"Diagnosis: {final_state['diagnosis']}")
+    print(f"Response: {final_state['response']}")   
+
+    # Visualize the workflow
+    try:
+        from IPython.display import Image, display
+        display(Image(workflow.get_graph().draw_mermaid_png()))
+    except Exception:
+        # If not in Jupyter, print ASCII representation
+        print("\nWorkflow Graph:")
+        print(workflow.get_graph().draw_ascii())
@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from typing import Iterable, Literal, Protocol
+
+Sentiment = Literal["positive", "negative"]
+
+# Weighted phrases (1 to 3 words). Longer phrases win over the words inside them, so
+# "not working" or "waste of money" count once, with their own weight.
+LEXICON: dict[str, float] = {
+    # positive
+    "love": 3, "love it": 4, "loved": 3, "amazing": 3, "awesome": 3, "excellent": 3, "fantastic": 3,
+    "great": 2, "good": 1.5, "nice": 1.5, "perfect": 3, "best": 2.5, "wonderful": 3, "brilliant": 3,
+    "helpful": 2, "easy to use": 3, "intuitive": 2, "smooth": 2, "fast": 1.5, "reliable": 2,
+    "recommend": 2.5, "highly recommend": 4, "five stars": 4, "5 stars": 4, "thank you": 2, "thanks": 1.5,
+    "works great": 4, "works perfectly": 4, "works well": 3, "happy": 2, "enjoy": 2, "beautiful": 2,
+    "clean": 1, "impressed": 2.5, "game changer": 3, "lifesaver": 3,
+    # negative
+    "hate": -3, "terrible": -3, "awful": -3, "horrible": -3, "worst": -3, "useless": -3, "garbage": -3,
+    "bad": -2, "poor": -2, "slow": -2, "laggy": -2, "buggy": -2.5, "bug": -1.5, "bugs": -2, "broken": -2.5,
+    "crash": -2.5, "crashes": -2.5, "crashed": -2.5, "crashing": -2.5, "crashes every time": -4,
+    "freezes": -2.5, "frozen": -2, "error": -1.5, "errors": -2, "fails": -2, "failed": -2,
+    "not working": -3, "doesn't work": -3, "does not work": -3, "stopped working": -3, "won't load": -3,
+    "takes forever": -2.5, "waste of money": -4, "waste of time": -4, "refund": -2, "uninstall": -2.5,
+    "uninstalled": -2.5, "frustrating": -2.5, "frustrated": -2.5, "annoying": -2, "disappointed": -2.5,
+    "disappointing": -2.5, "never answered": -3, "no response": -2.5, "scam": -4, "one star": -4, "1 star": -4,
+    "drains my battery": -3, "too many ads": -3, "charged twice": -3,
+    # negated phrases that are positive as a whole
+    "can't recommend it enough": 4, "cannot recommend it enough": 4, "can't recommend this enough": 4,
+}
+
+NEGATORS = {"not", "no", "never", "don't", "doesn't", "didn't", "isn't", "wasn't", "aren't", "can't", "won't", "hardly"}
+NEGATION_WINDOW = 3  # a negator flips the first phrase starting within this many words after it
+CLAUSE_BREAKS = {",", ";", ".", "!", "?", "but"}  # end a negator's window
+
+_WORD = re.compile(r"[a-z0-9']+|[,;.!?]")
+_APOSTROPHES = str.maketrans("\u2019\u2018", "''")  # curly apostrophes, as in "don’t"
+
+
+# Anything with classify(review) -> "positive" | "negative" | None can be plugged in front of
+# find_sentiment; None means "not sure, ask the LLM".
+class PreClassifier(Protocol):
+    def classify(self, review: str) -> Sentiment | None: ...
+
+
+# Lexicon / n-gram sentiment scorer. Sums phrase weights and is
+# confident only when one side clearly dominates:
+#   confidence = |positive - negative| / (positive + negative + smoothing)
+# so mixed reviews ("love the design but it crashes") stay below the threshold.
+# A negator flips only the next phrase in its clause: "never crashes, works great" is positive.
+class LexiconSentimentClassifier:
+    def __init__(self, threshold: float = 0.5, lexicon: dict[str, float] | None = None, smoothing: float = 2.0):
+        self.threshold = threshold
+        self.smoothing = smoothing
+        self.phrases = {tuple(phrase.split()): weight for phrase, weight in (lexicon or LEXICON).items()}
+        self.max_words = max(len(words) for words in self.phrases)
+        self.counters = {"reviews": 0, "skipped": 0, "positive": 0, "negative": 0}
+        self._lock = threading.Lock()
+
+    # Returns (sentiment, confidence) without touching the counters
+    def score(self, review: str) -> tuple[Sentiment, float]:
+        words = _WORD.findall(review.lower().translate(_APOSTROPHES))
+        positive = negative = 0.0
+        negated_until = -1
+        index = 0
+        while index < len(words):
+            for size in range(min(self.max_words, len(words) - index), 0, -1):
+                weight = self.phrases.get(tuple(words[index:index + size]))
+                if weight is not None:
+                    if index <= negated_until:
+                        # "not good" counts as negative; "not bad" is too weak to count either way
+                        weight = -weight if weight > 0 else 0.0
+                        negated_until = -1
+                    if weight > 0:
+                        positive += weight
+                    else:
+                        negative -= weight
+                    index += size
+                    break
+            else:
+                if words[index] in NEGATORS:
+                    negated_until = index + NEGATION_WINDOW
+                elif words[index] in CLAUSE_BREAKS:
+                    negated_until = -1
+                index += 1
+        confidence = abs(positive - negative) / (positive + negative + self.smoothing)
+        return ("positive" if positive >= negative else "negative"), confidence
+
+    def classify(self, review: str) -> Sentiment | None:
+        sentiment, confidence = self.score(review)
+        confident = confidence >= self.threshold
+        with self._lock:
+            self.counters["reviews"] += 1
+            if confident:
+                self.counters["skipped"] += 1
+                self.counters[sentiment] += 1
+        return sentiment if confident else None
+
+    def stats(self) -> dict:
+        reviews = self.counters["reviews"]
+        return {**self.counters, "skip_rate": self.counters["skipped"] / reviews if reviews else 0.0}
+
+
+# Pre-classifier used by review_reply_workflow. Configure with environment variables:
+# SENTIMENT_PREFILTER=off, SENTIMENT_PREFILTER_THRESHOLD (confidence, default 0.5)
+def get_pre_classifier() -> PreClassifier | None:
+    if os.getenv("SENTIMENT_PREFILTER", "on").lower() in ("off", "0", "false"):
+        return None
+    return LexiconSentimentClassifier(threshold=float(os.getenv("SENTIMENT_PREFILTER_THRESHOLD", "0.5")))
+
+
+# Read {"review": ..., "sentiment": "positive" | "negative"} lines
+def load_labelled(path: str) -> list[tuple[str, Sentiment]]:
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["review"], row["sentiment"]) for row in rows]
+
+
+# Offline evaluation: for each threshold, how many reviews skip the LLM, how often those
+# skipped answers agree with the labels, and how much LLM time that saves per 1,000 reviews.
+# llm_latency is the per-call sentiment latency to credit for each skipped review.
+def evaluate(labelled: list[tuple[str, Sentiment]], thresholds: Iterable[float] = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8), llm_latency: float = 0.6):
+    classifier = LexiconSentimentClassifier()
+    start = time.perf_counter()
+    scores = [classifier.score(review) for review, _ in labelled]
+    micros = (time.perf_counter() - start) / len(labelled) * 1e6
+
+    print(f"{len(labelled)} labelled reviews, lexicon scorer {micros:.1f} µs/review, LLM sentiment call {llm_latency * 1000:.0f} ms")
+    print("threshold | LLM skipped | agreement on skipped | LLM time saved per 1k reviews")
+    for threshold in thresholds:
+        skipped = [(sentiment, label) for (sentiment, confidence), (_, label) in zip(scores, labelled) if confidence >= threshold]
+        agree = sum(sentiment == label for sentiment, label in skipped)
+        saved = len(skipped) / len(labelled) * 1000 * (llm_latency - micros / 1e6)
+        print(
+            f"{threshold:>9.2f} | {len(skipped) / len(labelled):>10.0%} | "
+            f"{agree / len(skipped) if skipped else 1.0:>19.1%} | {saved:>10.0f} s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the lexicon sentiment pre-classifier")
+    parser.add_argument("labelled", nargs="?", default=os.path.join(os.path.dirname(__file__), "labelled_reviews.jsonl"))
+    parser.add_argument("--llm-latency-ms", type=float, default=600, help="latency of one LLM sentiment call")
+    args = parser.parse_args()
+    evaluate(load_labelled(args.labelled), llm_latency=args.llm_latency_ms / 1000)
@@ -3,42 +3,98 @@ from langgraph.graph.message import add_messages
 from langgraph.checkpoint.memory import MemorySaver
 from typing import TypedDict, Annotated
 from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
+from functools import cache
+import os
 
-load_dotenv()
+from chat_memory import BoundedCheckpointSaver, CompressedSerializer, SummaryCompaction, WindowCompaction, delta_history
+from lazy_models import chat_openai
 
 class ChatState(TypedDict):
     chat_history: Annotated[list[BaseMessage], add_messages]
 
-model = ChatOpenAI()
+# The same state, but checkpoints store only the messages each step added, plus a full
+# snapshot every 50 updates (see chat_memory.py)
+class DeltaChatState(TypedDict):
+    chat_history: Annotated[list[BaseMessage], delta_history(snapshot_every=50)]
+
+# Created on first use (see lazy_models.py)
+model = chat_openai(cached=False)
 
 def chat_response(state: ChatState):
     chat_history = state["chat_history"]
     response = model.invoke(chat_history)
     return {"chat_history": [response]}
 
-checkpoint = MemorySaver()
+# Build the chatbot graph. With a compaction policy, a "Compact History" node runs first so
+# the history sent to the model (and stored in checkpoints) stays bounded. `delta=True` uses
+# delta-encoded checkpoints for the history (DeltaChatState).
+def build_workflow(checkpointer, compaction=None, delta=False):
+    state = DeltaChatState if delta else ChatState
+    graph = StateGraph(state)
+
+    # Add nodes to your graph
+    graph.add_node("Chat Response", chat_response, input_schema=state)
+
+    # add edges to your graph
+    if compaction is None:
+        graph.add_edge(START, "Chat Response")
+    else:
+        graph.add_node("Compact History", lambda values: {"chat_history": compaction(values["chat_history"])}, input_schema=state)
+        graph.add_edge(START, "Compact History")
+        graph.add_edge("Compact History", "Chat Response")
+    graph.add_edge("Chat Response", END)
+
+    # compile the graph
+    return graph.compile(checkpointer=checkpointer)
+
+# CHAT_CHECKPOINTER=bounded keeps idle threads on disk instead of in memory forever;
+# CHAT_HISTORY=window|summary bounds the history sent to the model on every turn;
+# CHAT_CHECKPOINT_FORMAT=delta stores only each turn's new messages in checkpoints (compressed).
+history_policies = {
+    "window": lambda: WindowCompaction(max_messages=20),
+    "summary": lambda: SummaryCompaction(model, max_messages=20, keep_last=6),
+}
+
+# Define the workflow graph on first use, from the environment settings above
+@cache
+def get_workflow():
+    delta = os.getenv("CHAT_CHECKPOINT_FORMAT") == "delta"
+    serde = CompressedSerializer() if delta else None
+    if os.getenv("CHAT_CHECKPOINTER") == "bounded":
+        checkpoint = BoundedCheckpointSaver(keep_last=2, serde=serde)
+    else:
+        checkpoint = MemorySaver(serde=serde)
+    compaction = history_policies[os.environ["CHAT_HISTORY"]]() if os.getenv("CHAT_HISTORY") else None
+    return build_workflow(checkpoint, compaction, delta=delta)
 
-# Define the workflow graph
-graph = StateGraph(ChatState)
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Add nodes to your graph
-graph.add_node("Chat Response", chat_response)
+if __name__ == "__main__":
+    import argparse
 
-# add edges to your graph
-graph.add_edge(START, "Chat Response")
-graph.add_edge("Chat Response", END)    
+    from streaming import format_ttft, stream_tokens
 
-# compile the graph
-workflow = graph.compile(checkpointer=checkpoint)
+    parser = argparse.ArgumentParser(description="Chat with the bot in the terminal")
+    parser.add_argument("--stream", action="store_true", help="print the reply token by token and report time to first token")
+    args = parser.parse_args()
+    workflow = get_workflow()
 
-print("Chat History:")
+    print("Chat History:")
 
-config = {'configurable': {'thread_id': '1'}}
-while True:
-    user_messages = input("You: ")
-    if user_messages.lower() in ['exit', 'quit']:
-        break
-    final_state = workflow.invoke({'chat_history': [HumanMessage(content=user_messages)]}, config=config)
-    print('AI: ', final_state['chat_history'][-1].content)
+    config = {'configurable': {'thread_id': '1'}}
+    while True:
+        user_messages = input("You: ")
+        if user_messages.lower() in ['exit', 'quit']:
+            break
+        inputs = {'chat_history': [HumanMessage(content=user_messages)]}
+        if args.stream:
+            print('AI: ', end='', flush=True)
+            final_state, ttft = stream_tokens(workflow, inputs, config=config, nodes={"Chat Response"}, show_node=False)
+            print(f"(time to first token: {format_ttft(ttft)})")
+        else:
+            final_state = workflow.invoke(inputs, config=config)
+            print('AI: ', final_state['chat_history'][-1].content)
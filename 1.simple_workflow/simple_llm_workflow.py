@@ -1,11 +1,9 @@
-from langgraph.graph import StateGraph, START, END
-from langchain_openai import ChatOpenAI
+from functools import cache
+from lazy_models import chat_openai
 from typing import TypedDict
-from dotenv import load_dotenv
 
-load_dotenv()
-
-model = ChatOpenAI()
+# Created on first use (see lazy_models.py)
+model = chat_openai()
 
 # Create state definitions
 class LLMState(TypedDict):
@@ -19,26 +17,40 @@ def get_llm_response(state: LLMState) -> LLMState:
     state["answer"] = response.content
     return state
 
-# Create a graph
-graph = StateGraph(LLMState)
+# Build and compile the workflow graph on first use, so importing this module stays cheap
+@cache
+def get_workflow():
+    from langgraph.graph import StateGraph, START, END
+
+    # Create a graph
+    graph = StateGraph(LLMState)
+
+    # Add nodes to the graph
+    graph.add_node("Get LLM Response", get_llm_response)
+
+    # Add edges to the graph
+    graph.add_edge(START, "Get LLM Response")
+    graph.add_edge("Get LLM Response", END)
 
-# Add nodes to the graph
-graph.add_node("Get LLM Response", get_llm_response)
+    # Compile the graph into a workflow
+    return graph.compile()
 
-# Add edges to the graph
-graph.add_edge(START, "Get LLM Response")
-graph.add_edge("Get LLM Response", END) 
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Compile the graph into a workflow
-workflow = graph.compile()
+if __name__ == "__main__":
+    workflow = get_workflow()
 
-# Execute the workflow with sample data
-initial_state: LLMState = {
-    "question": "What is the capital of France?",
-    "answer": ""
-}
+    # Execute the workflow with sample data
+    initial_state: LLMState = {
+        "question": "What is the capital of France?",
+        "answer": ""
+    }
 
-final_state = workflow.invoke(initial_state)
+    final_state = workflow.invoke(initial_state)
 
-print(f"Question: {final_state['question']}")
-print(f"Answer: {final_state['answer']}")
\ No newline at end of file
+    print(f"Question: {final_state['question']}")
+    print(f"Answer: {final_state['answer']}")
@@ -1,67 +1,268 @@
-from langgraph.graph import StateGraph, START, END
-from langchain_openai import ChatOpenAI
+import asyncio
+import re
+from functools import cache
+from lazy_models import chat_openai
 from typing import TypedDict
-from dotenv import load_dotenv
 
-load_dotenv()
-
-model = ChatOpenAI()
+# Created on first use (see lazy_models.py)
+model = chat_openai()
 
 class BlogState(TypedDict):
     topic: str
     outline: str
     content: str
 
+def outline_prompt(topic: str) -> str:
+    return f"Generate a detailed outline for a blog post about: {topic}"
+
+def content_prompt(outline: str) -> str:
+    return f"Write a detailed blog post based on the following outline:\n{outline}"
+
+def section_prompt(topic: str, heading: str, points: str = "") -> str:
+    cover = f"\nThe outline lists these points for it:\n{points}" if points else ""
+    return f"Write the section \"{heading}\" of a detailed blog post about: {topic}{cover}\nWrite only the body of this section, without its heading."
+
 def generate_outline(state: BlogState) -> BlogState:
-    topic = state["topic"]
-    prompt = f"Generate a detailed outline for a blog post about: {topic}"
-    response = model.invoke(prompt)
+    response = model.invoke(outline_prompt(state["topic"]))
     state["outline"] = response.content
     return state
 
 
 def generate_content(state: BlogState) -> BlogState:
-    outline = state["outline"]
-    prompt = f"Write a detailed blog post based on the following outline:\n{outline}"
-    response = model.invoke(prompt)
+    response = model.invoke(content_prompt(state["outline"]))
     state["content"] = response.content
     return state
 
-graph = StateGraph(BlogState)
 
-# Add nodes to the graph
-graph.add_node("Generate Outline", generate_outline)
-graph.add_node("Generate Content", generate_content)    
+# Splits an outline into sections while it streams in. A section heading is a markdown heading
+# at the level of the first one seen ("## Introduction"; "#" is taken to be the title) or, in
+# outlines without markdown headings, an unindented numbered line ("1. Introduction",
+# "II) Ethics"). Deeper headings, numbered sub-points and bullets are the section's points.
+# A section is complete, with all its points, when the next heading (or the end) arrives.
+class SectionParser:
+    _MARKDOWN = re.compile(r"(#{2,6})\s+(.+)")
+    _NUMBERED = re.compile(r"(?:\d+|[IVXLC]+)[.)]\s+(.+)")
+
+    def __init__(self):
+        self._buffer = ""
+        self._level: int | None = None
+        self._section: tuple[str, list[str]] | None = None  # heading and points so far
+
+    # (heading, points) of the sections completed by `text`, in outline order
+    def feed(self, text: str) -> list[tuple[str, str]]:
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        return [section for section in map(self._line, lines) if section]
+
+    # The last sections, once the outline is complete
+    def close(self) -> list[tuple[str, str]]:
+        sections = [section for section in [self._line(self._buffer)] if section]
+        if self._section is not None:
+            sections.append(self._complete())
+        self._buffer, self._section = "", None
+        return sections
+
+    def _line(self, line: str) -> tuple[str, str] | None:
+        heading = self._heading(line)
+        if heading is None:
+            if self._section is not None and line.strip():
+                self._section[1].append(line.rstrip())
+            return None
+        completed = self._complete() if self._section is not None else None
+        self._section = (heading, [])
+        return completed
+
+    def _complete(self) -> tuple[str, str]:
+        heading, points = self._section
+        return heading, "\n".join(points).strip("\n")
+
+    def _heading(self, line: str) -> str | None:
+        if not line or line[0].isspace():
+            return None
+        line = line.strip().strip("*").strip()
+        if match := self._MARKDOWN.fullmatch(line):
+            level = len(match.group(1))
+            self._level = self._level or level
+            if level != self._level:
+                return None
+            line = match.group(2).strip().strip("*").strip()
+            numbered = self._NUMBERED.fullmatch(line)
+            return (numbered.group(1) if numbered else line).rstrip(":").strip()
+        # numbered lines under markdown headings are sub-points
+        if self._level is None and (match := self._NUMBERED.fullmatch(line)):
+            return match.group(1).strip().strip("*").rstrip(":").strip()
+        return None
+
+
+def write_section(topic: str, heading: str, points: str = "") -> str:
+    return model.invoke(section_prompt(topic, heading, points)).content
+
+async def awrite_section(topic: str, heading: str, points: str, limit: asyncio.Semaphore) -> str:
+    async with limit:
+        return (await model.ainvoke(section_prompt(topic, heading, points))).content
+
+# Sections back in outline order, each under its heading
+def assemble(sections: list[tuple[str, str]]) -> str:
+    return "\n\n".join(f"## {heading}\n\n{text.strip()}" for heading, text in sections)
+
+
+# Pipelined outline -> content: the outline is streamed, and each section is written from its
+# heading and points as soon as the next heading arrives, at most `max_concurrency` at a time,
+# while the outline is still being generated. If the outline has no recognisable headings, the
+# content is written from the whole outline in one call, as in the two-step chain.
+def pipelined_generation(max_concurrency: int = 4):
+    def generate_pipelined(state: BlogState):
+        from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+        topic, parser, parts, sections = state["topic"], SectionParser(), [], []
+        # ContextThreadPoolExecutor keeps the node's callbacks, so section tokens stream too
+        with ContextThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            try:
+                for chunk in model.stream(outline_prompt(topic)):
+                    parts.append(chunk.content)
+                    sections += [(heading, pool.submit(write_section, topic, heading, points)) for heading, points in parser.feed(chunk.content)]
+                sections += [(heading, pool.submit(write_section, topic, heading, points)) for heading, points in parser.close()]
+                outline = "".join(parts)
+                if not sections:
+                    return {"outline": outline, "content": model.invoke(content_prompt(outline)).content}
+                return {"outline": outline, "content": assemble([(heading, future.result()) for heading, future in sections])}
+            except BaseException:
+                # a failed outline or section drops the sections not started yet
+                pool.shutdown(cancel_futures=True)
+                raise
+
+    async def agenerate_pipelined(state: BlogState):
+        topic, parser, parts, sections = state["topic"], SectionParser(), [], []
+        limit = asyncio.Semaphore(max_concurrency)
+
+        def start(completed: list[tuple[str, str]]) -> None:
+            sections.extend((heading, asyncio.create_task(awrite_section(topic, heading, points, limit))) for heading, points in completed)
+
+        try:
+            async for chunk in model.astream(outline_prompt(topic)):
+                parts.append(chunk.content)
+                start(parser.feed(chunk.content))
+            start(parser.close())
+            outline = "".join(parts)
+            if not sections:
+                return {"outline": outline, "content": (await model.ainvoke(content_prompt(outline))).content}
+            texts = await asyncio.gather(*(task for _, task in sections))
+            return {"outline": outline, "content": assemble([(heading, text) for (heading, _), text in zip(sections, texts)])}
+        finally:
+            # a failed outline or section cancels the sections still running
+            for _, task in sections:
+                task.cancel()
+
+    return generate_pipelined, agenerate_pipelined
+
+# Build and compile the workflow graph on first use, so importing this module stays cheap
+# pipelined=True: one node that writes the sections while the outline streams in (see
+# pipelined_generation), with at most `max_concurrency` section calls at a time
+@cache
+def get_workflow(pipelined: bool = False, max_concurrency: int = 4):
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import StateGraph, START, END
+
+    graph = StateGraph(BlogState)
+
+    if pipelined:
+        func, afunc = pipelined_generation(max_concurrency)
+        graph.add_node("Generate Outline and Sections", RunnableLambda(func, afunc=afunc))
+        graph.add_edge(START, "Generate Outline and Sections")
+        graph.add_edge("Generate Outline and Sections", END)
+        return graph.compile()
+
+    # Add nodes to the graph
+    graph.add_node("Generate Outline", generate_outline)
+    graph.add_node("Generate Content", generate_content)
+
+    # Add edges to the graph
+    graph.add_edge(START, "Generate Outline")
+    graph.add_edge("Generate Outline", "Generate Content")
+    graph.add_edge("Generate Content", END)
+
+    # Compile the graph into a workflow
+    return graph.compile()
+
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# End-to-end latency of the two-step chain and the pipelined graph on a fake model that
+# streams `sections` outline sections and `words` words per section at the given token rate
+def benchmark(sections: int = 8, words: int = 150, latency: float = 0.3, token_latency: float = 0.01, max_concurrency: int = 4, runs: int = 3) -> None:
+    import statistics
+    import time
+
+    from fake_models import FakeChatModel
+
+    body = " ".join(f"word{index}" for index in range(words))
+
+    def respond(prompt: str, schema) -> str:
+        if prompt.startswith("Generate a detailed outline"):
+            return "# Blog Post Outline\n" + "".join(f"## {index}. Section {index}\n- First point\n- Second point\n- Third point\n" for index in range(1, sections + 1))
+        if prompt.startswith("Write a detailed blog post"):
+            return assemble([(f"Section {index}", body) for index in range(1, sections + 1)])
+        return body
+
+    model.override(FakeChatModel(latency=latency, token_latency=token_latency, responder=respond))
+    state: BlogState = {"topic": "The Future of Artificial Intelligence", "outline": "", "content": ""}
+    print(f"{sections} sections x {words} words, {latency * 1000:.0f} ms to first token, {token_latency * 1000:.0f} ms per token, max_concurrency={max_concurrency}")
+    results = {}
+    for name, workflow in (("two-step chain", get_workflow()), ("pipelined", get_workflow(pipelined=True, max_concurrency=max_concurrency))):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            results[name] = workflow.invoke(state)
+            timings.append(time.perf_counter() - start)
+        print(f"{name:>15}: {statistics.median(timings):6.2f} s")
+    assert results["pipelined"]["content"] == results["two-step chain"]["content"]
+
+
+if __name__ == "__main__":
+    import argparse
 
-# Add edges to the graph
-graph.add_edge(START, "Generate Outline")
-graph.add_edge("Generate Outline", "Generate Content")
-graph.add_edge("Generate Content", END) 
+    from streaming import format_ttft, stream_tokens
 
-# Compile the graph into a workflow
-workflow = graph.compile()
+    parser = argparse.ArgumentParser(description="Generate a blog post outline and content")
+    parser.add_argument("--stream", action="store_true", help="print tokens as they are generated")
+    parser.add_argument("--pipelined", action="store_true", help="write the sections concurrently while the outline streams in")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="section calls at a time with --pipelined")
+    parser.add_argument("--benchmark", action="store_true", help="compare both modes on a fake model")
+    args = parser.parse_args()
 
-# Execute the workflow with sample data
-initial_state: BlogState = {
-    "topic": "The Future of Artificial Intelligence",
-    "outline": "",
-    "content": ""
-}
+    if args.benchmark:
+        benchmark(max_concurrency=args.max_concurrency)
+        raise SystemExit
 
-final_state = workflow.invoke(initial_state)
+    workflow = get_workflow(pipelined=args.pipelined, max_concurrency=args.max_concurrency)
 
-print("Blog Outline:")
-print(final_state["outline"])
-print("\nBlog Content:")
-print(final_state["content"])   
+    # Execute the workflow with sample data
+    initial_state: BlogState = {
+        "topic": "The Future of Artificial Intelligence",
+        "outline": "",
+        "content": ""
+    }
 
+    if args.stream:
+        # Tokens appear under each node's name while it generates
+        final_state, ttft = stream_tokens(workflow, initial_state)
+        print(f"\nTime to first token: {format_ttft(ttft)}")
+    else:
+        final_state = workflow.invoke(initial_state)
 
+        print("Blog Outline:")
+        print(final_state["outline"])
+        print("\nBlog Content:")
+        print(final_state["content"])
 
-# Visualize the workflow
-try:
-    from IPython.display import Image, display
-    display(Image(workflow.get_graph().draw_mermaid_png()))
-except Exception:
-    # If not in Jupyter, print ASCII representation
-    print("\nWorkflow Graph:")
-    print(workflow.get_graph().draw_ascii())
\ No newline at end of file
+    # Visualize the workflow
+    try:
+        from IPython.display import Image, display
+        display(Image(workflow.get_graph().draw_mermaid_png()))
+    except Exception:
+        # If not in Jupyter, print ASCII representation
+        print("\nWorkflow Graph:")
+        print(workflow.get_graph().draw_ascii())
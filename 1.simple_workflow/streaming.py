@@ -0,0 +1,84 @@
+import sys
+import time
+from typing import Any, Container, TextIO
+
+
+# Run a compiled workflow with stream_mode=["messages", "values"] and print LLM tokens as they
+# arrive. Tokens are grouped under the name of the node that produced them (unless show_node is
+# False), and only nodes in `nodes` are printed when it is given.
+# Returns the final state (the same one invoke would return; nodes still return whole messages,
+# so add_messages merges them as usual) and the time to first token per node, in seconds from
+# the start of the run.
+def stream_tokens(
+    workflow,
+    inputs: Any,
+    config: dict | None = None,
+    out: TextIO = sys.stdout,
+    nodes: Container[str] | None = None,
+    show_node: bool = True,
+) -> tuple[dict, dict[str, float]]:
+    printer = _TokenPrinter(out, nodes, show_node)
+    final_state = None
+    for mode, chunk in workflow.stream(inputs, config=config, stream_mode=["messages", "values"]):
+        if mode == "messages":
+            printer.write(*chunk)
+        else:
+            final_state = chunk
+    printer.finish()
+    return final_state, printer.ttft
+
+
+# Async twin of stream_tokens, built on workflow.astream
+async def astream_tokens(
+    workflow,
+    inputs: Any,
+    config: dict | None = None,
+    out: TextIO = sys.stdout,
+    nodes: Container[str] | None = None,
+    show_node: bool = True,
+) -> tuple[dict, dict[str, float]]:
+    printer = _TokenPrinter(out, nodes, show_node)
+    final_state = None
+    async for mode, chunk in workflow.astream(inputs, config=config, stream_mode=["messages", "values"]):
+        if mode == "messages":
+            printer.write(*chunk)
+        else:
+            final_state = chunk
+    printer.finish()
+    return final_state, printer.ttft
+
+
+class _TokenPrinter:
+    def __init__(self, out: TextIO, nodes: Container[str] | None, show_node: bool):
+        self.out = out
+        self.nodes = nodes
+        self.show_node = show_node
+        self.start = time.perf_counter()
+        self.ttft: dict[str, float] = {}
+        self.current_node: str | None = None
+
+    def write(self, message, metadata: dict) -> None:
+        node = metadata.get("langgraph_node")
+        if self.nodes is not None and node not in self.nodes:
+            return
+        text = message.content if isinstance(message.content, str) else ""
+        if not text:
+            return
+        self.ttft.setdefault(node, time.perf_counter() - self.start)
+        if node != self.current_node:
+            if self.show_node:
+                separator = "\n" if self.current_node is None else "\n\n"
+                self.out.write(f"{separator}[{node}]\n")
+            self.current_node = node
+        self.out.write(text)
+        self.out.flush()
+
+    def finish(self) -> None:
+        if self.current_node is not None:
+            self.out.write("\n")
+            self.out.flush()
+
+
+# Compact "node: 123 ms" summary of stream_tokens' time-to-first-token results
+def format_ttft(ttft: dict[str, float]) -> str:
+    return ", ".join(f"{node}: {seconds * 1000:.0f} ms" for node, seconds in ttft.items()) or "no tokens"
@@ -0,0 +1,172 @@
+import importlib
+import os
+import sys
+import uuid
+from dataclasses import dataclass, field
+from types import ModuleType
+from typing import Any, Callable, get_type_hints
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKFLOW_DIRS = [os.path.join(ROOT, "1.simple_workflow"), os.path.join(ROOT, "condition_routing")]
+
+for directory in WORKFLOW_DIRS:
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+from fake_models import FakeChatModel  # noqa: E402
+
+
+# One workflow to benchmark: the module holding `workflow`, an input factory, the same
+# computation written as plain function calls, and how to swap in the fake model (if it uses one)
+@dataclass
+class Case:
+    name: str
+    module: str
+    inputs: Callable[[int], dict]  # run index -> input state
+    plain: Callable[[ModuleType, dict], dict]  # module, input state -> final state
+    use_fake: Callable[[ModuleType, FakeChatModel], None] | None = None
+    threaded: bool = False  # needs a fresh thread_id per run (checkpointer)
+    tags: list[str] = field(default_factory=list)
+    build: Callable[[ModuleType], Any] = lambda module: module.workflow  # compiled graph to measure
+    configurable: dict = field(default_factory=dict)  # per-run options, e.g. an evaluation mode
+
+    def load(self) -> ModuleType:
+        return importlib.import_module(self.module)
+
+    def config(self, index: int) -> dict:
+        configurable = dict(self.configurable)
+        if self.threaded:
+            configurable["thread_id"] = f"bench-{uuid.uuid4()}"
+        return {"configurable": configurable} if configurable else {}
+
+
+# Apply one node's update the way the graph would: plain fields are replaced, and fields listed
+# in `appended` are concatenated (operator.add / add_messages reducers)
+def _merge(state: dict, update: dict, appended: tuple[str, ...] = ()) -> dict:
+    merged = dict(state)
+    for key, value in update.items():
+        merged[key] = merged.get(key, []) + value if key in appended else value
+    return merged
+
+
+def _bmi_plain(m, state):
+    state = _merge(state, m.calculate_bmi(dict(state)))
+    return _merge(state, m.categorize_bmi(dict(state)))
+
+
+def _quadratic_plain(m, state):
+    state = _merge(state, m.show_equation(state))
+    state = _merge(state, m.calculate_discriminant(state))
+    return _merge(state, getattr(m, m.check_condition(state))(state))
+
+
+def _batting_plain(m, state):
+    updates = [m.calculate_strike_rate(dict(state)), m.calculate_balls_per_run(dict(state)), m.calculate_bountrate(dict(state))]
+    for update in updates:
+        state = _merge(state, update)
+    return state
+
+
+def _llm_plain(m, state):
+    return _merge(state, m.get_llm_response(dict(state)))
+
+
+def _chaining_plain(m, state):
+    state = _merge(state, m.generate_outline(dict(state)))
+    return _merge(state, m.generate_content(dict(state)))
+
+
+def _chaining_pipelined_plain(m, state):
+    return _merge(state, m.pipelined_generation()[0](dict(state)))
+
+
+def _chatbot_plain(m, state):
+    return _merge(state, m.chat_response(state), appended=("chat_history",))
+
+
+def _essay_plain(m, state):
+    updates = [m.evaluate_clarity_of_thought(state), m.evaluate_depth_of_analysis(state), m.evaluate_language(state)]
+    for update in updates:
+        state = _merge(state, update, appended=("individual_scores",))
+    return _merge(state, m.finalize_evaluation(state))
+
+
+def _essay_single_call_plain(m, state):
+    return _merge(state, m.evaluate_all_rubrics(state), appended=("individual_scores",))
+
+
+def _review_plain(m, state):
+    state = _merge(state, m.pre_classify(state))
+    route = m.check_pre_classified(state)
+    if route == "find_sentiment":
+        state = _merge(state, m.find_sentiment(state))
+        route = m.check_sentiment(state)
+    if route == "run_diagnosis":
+        state = _merge(state, m.run_diagnosis(state))
+        return _merge(state, m.negative_response(state))
+    return _merge(state, m.positive_response(state))
+
+
+def _basic_routing_plain(m, state):
+    if m.decide_next(state) == "big":
+        return _merge(state, m.big_node(state))
+    state = _merge(state, m.small_node(state))
+    return _merge(state, m.pass_through(state))
+
+
+def _parallel_paths_plain(m, state):
+    for node in m.decide_parallel(state):
+        state = _merge(state, getattr(m, f"{node}_node")(state), appended=("results",))
+    return state
+
+
+def _fan_out_plain(m, state):
+    hints = get_type_hints(m.FanOutState, include_extras=True)
+    reducers = {key: hint.__metadata__[-1] for key, hint in hints.items() if hasattr(hint, "__metadata__")}
+    merged = {"items": state["items"], "results": [], "sizes": {}, "largest": [], "mean": m.RunningMean()}
+    for item in state["items"]:
+        for key, value in m.process_item({"value": item}).items():
+            merged[key] = reducers[key](merged[key], value)
+    return merged
+
+
+def _path_map_plain(m, state):
+    if m.decide_next(state) == "big":
+        return _merge(state, m.big_node(state))
+    while True:
+        state = _merge(state, m.small_node(state))
+        state = _merge(state, m.pass_through(state))
+        if m.check_iteration(state) == "end":
+            return state
+
+
+# The structured (and hedged) models are lazy wrappers around `model`, so they are built from
+# the fake too
+def _use_model(m, fake):
+    m.model.override(fake)
+
+
+_REVIEWS = [
+    "The app crashes every time I try to upload a photo. This is so frustrating!",
+    "Love it, works perfectly on my phone.",
+    "It does the job, although the settings page confuses me.",
+]
+
+CASES = [
+    Case("bmi_calculator", "bmi_calculator_workflow", lambda i: {"weight": 60 + i % 40, "height": 1.6 + (i % 30) / 100, "bmi": 0.0, "category": ""}, _bmi_plain),
+    Case("quadratic_equation", "quadratic_equation_worfflow", lambda i: {"a": 1 + i % 3, "b": i % 11 - 5, "c": i % 7 - 3, "equation": "", "discriminant": 0.0, "result": ""}, _quadratic_plain),
+    Case("batting_stats", "parallel_workflow", lambda i: {"runs": 50 + i % 50, "balls": 30 + i % 40, "fours": i % 8, "sixes": i % 4, "sr": 0.0, "ballsperrun": 0.0, "bountrate": 0.0}, _batting_plain),
+    Case("basic_condition_routing", "basic_condition_routing", lambda i: {"value": i % 20, "result": ""}, _basic_routing_plain),
+    Case("parallel_paths_routing", "parallet_paths_condition_routing", lambda i: {"value": i, "results": []}, _parallel_paths_plain),
+    Case("fan_out_100", "parallet_paths_condition_routing", lambda i: {"items": [(i + index) % 23 for index in range(100)]}, _fan_out_plain, build=lambda m: m.get_fan_out_workflow()),
+    Case("path_map_routing", "path_map_condition_routing", lambda i: {"value": 5, "status": "small", "iteration": 0, "max_iterations": 3, "result": ""}, _path_map_plain),
+    Case("path_map_routing_fused", "path_map_condition_routing", lambda i: {"value": 5, "status": "small", "iteration": 0, "max_iterations": 3, "result": ""}, _path_map_plain, build=lambda m: m.get_workflow(fused=True)),
+    Case("simple_llm", "simple_llm_workflow", lambda i: {"question": f"What is the capital of country #{i}?", "answer": ""}, _llm_plain, _use_model, tags=["llm"]),
+    Case("prompt_chaining", "simple_prompt_chaining", lambda i: {"topic": f"Topic #{i}", "outline": "", "content": ""}, _chaining_plain, _use_model, tags=["llm"]),
+    Case("pipelined_chaining", "simple_prompt_chaining", lambda i: {"topic": f"Topic #{i}", "outline": "", "content": ""}, _chaining_pipelined_plain, _use_model, build=lambda m: m.get_workflow(pipelined=True), tags=["llm"]),
+    Case("chatbot", "simple_chatbot", lambda i: {"chat_history": [("user", f"Hello #{i}")]}, _chatbot_plain, _use_model, threaded=True, tags=["llm"]),
+    Case("essay_evaluation", "llm_parallel_workflow", lambda i: {"eassy": f"Essay #{i}: small pieces make big things possible. " * 10}, _essay_plain, _use_model, tags=["llm"]),
+    Case("essay_single_call", "llm_parallel_workflow", lambda i: {"eassy": f"Essay #{i}: small pieces make big things possible. " * 10}, _essay_single_call_plain, _use_model, tags=["llm"], configurable={"evaluation_mode": "single_call"}),
+    Case("review_reply", "review_reply_workflow", lambda i: {"review": _REVIEWS[i % len(_REVIEWS)] + f" (#{i})", "sentiment": "", "diagnosis": {}, "response": ""}, _review_plain, _use_model, tags=["llm"]),
+    Case("review_reply_speculative", "review_reply_workflow", lambda i: {"review": _REVIEWS[i % len(_REVIEWS)] + f" (#{i})", "sentiment": "", "diagnosis": {}, "response": ""}, _review_plain, _use_model, build=lambda m: m.get_workflow(speculative=True), tags=["llm"]),
+]
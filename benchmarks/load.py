@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.cases import ROOT
+from benchmarks.run import _percentile
+
+# Sample request bodies per route; `--duplicates` of the requests repeat the first few, so
+# identical requests are in flight together and can be coalesced
+BODIES = {
+    "bmi": lambda index: {"weight": 50 + index % 60, "height": 1.5 + index % 50 / 100},
+    "quadratic": lambda index: {"a": 1 + index % 7, "b": 10 + index % 13, "c": index % 5},
+    "review_reply": lambda index: {"review": f"Review {index}: the app crashes when I upload a photo."},
+    "essay": lambda index: {"eassy": f"Essay {index}: small pieces make big things possible. " * 10},
+}
+
+# Server settings compared: every request run on its own as soon as it arrives, and the
+# defaults (micro-batched, coalesced, bounded)
+MODES = {
+    "unbatched": ["--window-ms", "0", "--max-batch", "1", "--max-in-flight", "100000", "--no-coalesce"],
+    "batched": [],
+}
+
+
+# Start serve_workflows.py with the fake model in a subprocess and return it with its URL
+def start_server(options: list[str], latency_ms: float) -> tuple[subprocess.Popen, str]:
+    command = [sys.executable, os.path.join(ROOT, "serve_workflows.py"), "--fake", "--fake-latency-ms", str(latency_ms), "--port", "0", *options]
+    server = subprocess.Popen(command, cwd=ROOT, stderr=subprocess.PIPE, text=True, env={**os.environ, "LLM_CACHE": "off"})
+    line = server.stderr.readline()
+    if "Serving" not in line:
+        server.kill()
+        raise RuntimeError(f"server did not start: {line}{server.stderr.read()}")
+    return server, line.rsplit(" ", 1)[-1].strip()
+
+
+# One keep-alive connection: POST/GET a JSON body, return (status, headers, parsed body)
+class Connection:
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body: dict | None = None) -> tuple[int, dict, dict]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode() if body is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nhost: {self.host}\r\ncontent-length: {len(data)}\r\n\r\n".encode() + data)
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers, json.loads(await self.reader.readexactly(int(headers.get("content-length", 0))))
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+# Closed loop: `concurrency` clients, each on its own connection, send their next request as
+# soon as the previous one is answered, for `duration` seconds. A 503 is counted as rejected
+# and the client waits for its Retry-After before the next request. (A plain asyncio client:
+# httpx's pool gets slow with hundreds of connections, and on a small machine the client would
+# then limit the numbers.)
+async def run_level(url: str, route: str, concurrency: int, duration: float, duplicates: float, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    latencies, counts = [], {"ok": 0, "rejected": 0, "errors": 0}
+    stats = Connection(url)
+    before = (await stats.request("GET", "/stats"))[2]
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        connection = Connection(url)
+        try:
+            while time.perf_counter() < deadline:
+                index = rng.randrange(4) if rng.random() < duplicates else rng.randrange(1_000_000)
+                start = time.perf_counter()
+                status, headers, _ = await connection.request("POST", f"/{route}", BODIES[route](index))
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                    counts["ok"] += 1
+                elif status == 503:
+                    counts["rejected"] += 1
+                    await asyncio.sleep(float(headers.get("retry-after", 0)))
+                else:
+                    counts["errors"] += 1
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    after = (await stats.request("GET", "/stats"))[2]
+    stats.close()
+
+    requests = after["routes"][route]["requests"] - before["routes"][route]["requests"]
+    batches = after["routes"][route]["batches"] - before["routes"][route]["batches"]
+    return {
+        **counts,
+        "throughput": counts["ok"] / elapsed,
+        "p50_ms": _percentile(latencies, 0.5) * 1000 if latencies else float("nan"),
+        "p99_ms": _percentile(latencies, 0.99) * 1000 if latencies else float("nan"),
+        "batch_size": requests / batches if batches else 0.0,
+        "coalesced": after["coalesced"] - before["coalesced"],
+    }
+
+
+def main(route: str, levels: list[int], duration: float, latency_ms: float, duplicates: float, modes: list[str]) -> None:
+    print(f"POST /{route}, fake model {latency_ms:g} ms per call, {duplicates:.0%} duplicate requests, {duration:g}s per level")
+    print(f"{'mode':<10} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'ok':>7} {'503':>6} {'errors':>6} {'batch':>6} {'coalesced':>9}")
+    for mode in modes:
+        server, url = start_server(MODES[mode], latency_ms)
+        try:
+            for concurrency in levels:
+                result = asyncio.run(run_level(url, route, concurrency, duration, duplicates))
+                print(
+                    f"{mode:<10} {concurrency:>7} {result['throughput']:>8.0f} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+                    f"{result['ok']:>7} {result['rejected']:>6} {result['errors']:>6} {result['batch_size']:>6.1f} {result['coalesced']:>9}",
+                    flush=True,
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test serve_workflows.py: throughput and p99 at rising concurrency")
+    parser.add_argument("--route", choices=sorted(BODIES), default="essay")
+    parser.add_argument("--levels", type=int, nargs="*", default=[1, 8, 32, 128, 512], help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per level")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake model latency per call")
+    parser.add_argument("--duplicates", type=float, default=0.25, help="fraction of requests repeating a few hot inputs")
+    parser.add_argument("--modes", nargs="*", choices=sorted(MODES), default=list(MODES))
+    args = parser.parse_args()
+    main(args.route, args.levels, args.duration, args.latency_ms, args.duplicates, args.modes)
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from importlib.metadata import version
+
+# Responses are not cached during benchmarks; a warm cache would hide the node cost
+os.environ.setdefault("LLM_CACHE", "off")
+
+from benchmarks.cases import CASES, ROOT, Case  # noqa: E402
+from fake_models import FakeChatModel  # noqa: E402
+
+# Metrics where a larger value is a regression (everything except throughput)
+LOWER_IS_BETTER = ("compile_ms", "invoke_ms_p50", "invoke_ms_p99", "plain_ms_p50", "overhead_ms_p50", "memory_kib_per_run")
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def _timings_ms(call, count: int) -> list[float]:
+    timings = []
+    for index in range(count):
+        start = time.perf_counter()
+        call(index)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _peak_kib(call) -> float:
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+# Compile time, invoke latency, batch throughput and peak memory for one workflow, next to the
+# same computation as plain function calls (so overhead_ms_p50 is what LangGraph adds per run)
+def measure(case: Case, runs: int = 100, batch_size: int = 64, latency: float = 0.0, token_latency: float = 0.0) -> dict:
+    module = case.load()
+    if case.use_fake is not None:
+        case.use_fake(module, FakeChatModel(latency=latency, token_latency=token_latency))
+    workflow = case.build(module)
+
+    compile_ms = _timings_ms(lambda _: workflow.builder.compile(checkpointer=workflow.checkpointer), 10)
+
+    def invoke(index):
+        return workflow.invoke(case.inputs(index), config=case.config(index))
+
+    def plain(index):
+        return case.plain(module, case.inputs(index))
+
+    invoke(0), plain(0)  # warm up imports and caches
+    graph_ms = _timings_ms(invoke, runs)
+    plain_ms = _timings_ms(plain, runs)
+
+    inputs = [case.inputs(index) for index in range(batch_size)]
+    configs = [case.config(index) for index in range(batch_size)]
+    start = time.perf_counter()
+    workflow.batch(inputs, config=configs)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "compile_ms": _percentile(compile_ms, 0.5),
+        "invoke_ms_p50": _percentile(graph_ms, 0.5),
+        "invoke_ms_p99": _percentile(graph_ms, 0.99),
+        "plain_ms_p50": _percentile(plain_ms, 0.5),
+        "overhead_ms_p50": _percentile(graph_ms, 0.5) - _percentile(plain_ms, 0.5),
+        "batch_runs_per_sec": batch_size / batch_seconds,
+        "memory_kib_per_run": _peak_kib(lambda: invoke(runs)),
+        "plain_memory_kib_per_run": _peak_kib(lambda: plain(runs)),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(cases: list[Case], runs: int, batch_size: int, latency: float, token_latency: float) -> dict:
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "langgraph": version("langgraph"),
+            "runs": runs,
+            "batch_size": batch_size,
+            "fake_latency_ms": latency * 1000,
+            "fake_token_latency_ms": token_latency * 1000,
+        },
+        "results": {},
+    }
+    print(f"{'':<24} {'compile':>8} {'invoke':>8} {'invoke':>8} {'plain':>8} {'overhead':>9} {'batch':>9} {'memory':>8}")
+    print(f"{'workflow':<24} {'ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'p50 ms':>8} {'p50 ms':>9} {'runs/s':>9} {'KiB':>8}")
+    for case in cases:
+        result = measure(case, runs, batch_size, latency, token_latency)
+        report["results"][case.name] = result
+        print(
+            f"{case.name:<24} {result['compile_ms']:>8.2f} {result['invoke_ms_p50']:>8.3f} {result['invoke_ms_p99']:>8.3f} "
+            f"{result['plain_ms_p50']:>8.3f} {result['overhead_ms_p50']:>9.3f} {result['batch_runs_per_sec']:>9.0f} "
+            f"{result['memory_kib_per_run']:>8.1f}"
+        )
+    return report
+
+
+# Print the relative change of every metric against an earlier report; changes in the wrong
+# direction beyond `threshold` are flagged
+def compare(report: dict, baseline: dict, threshold: float = 0.10) -> None:
+    print(f"\nChange vs {baseline['meta']['commit']} (flagged beyond {threshold:.0%}):")
+    settings = ("runs", "batch_size", "fake_latency_ms", "fake_token_latency_ms", "langgraph")
+    differing = [key for key in settings if report["meta"].get(key) != baseline["meta"].get(key)]
+    if differing:
+        print(f"  note: settings differ ({', '.join(differing)}), so changes are not like for like")
+    for name, result in report["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        changes = []
+        for metric, value in result.items():
+            if metric not in before or before[metric] <= 0:
+                continue
+            change = value / before[metric] - 1
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            if metric in LOWER_IS_BETTER or metric == "batch_runs_per_sec":
+                changes.append(f"{metric} {change:+.0%}{' !' if worse else ''}")
+        print(f"  {name:<24} " + ", ".join(changes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every workflow against plain function calls")
+    parser.add_argument("--only", nargs="*", help="workflow names to run (default: all)")
+    parser.add_argument("--runs", type=int, default=100, help="invoke runs per workflow")
+    parser.add_argument("--batch", type=int, default=64, help="inputs per batch() call")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake model time to first token")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="fake model time per further token")
+    parser.add_argument("--output", help="JSON report path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier JSON report to diff against")
+    args = parser.parse_args()
+
+    selected = [case for case in CASES if not args.only or case.name in args.only]
+    report = run(selected, args.runs, args.batch, args.latency_ms / 1000, args.token_latency_ms / 1000)
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
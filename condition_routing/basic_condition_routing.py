@@ -1,4 +1,4 @@
-from langgraph.graph import StateGraph, START, END
+from functools import cache
 from typing import TypedDict, Literal
 
 
@@ -22,34 +22,48 @@ def big_node(state: ConditionState) -> ConditionState:
 def small_node(state: ConditionState) -> ConditionState:
     return {"result": "Value is small"}
 
-# Define the workflow graph
-graph = StateGraph(ConditionState)
-
-# Add nodes to your graph
-graph.add_node("big", big_node)
-graph.add_node("small", small_node)
-graph.add_node("pass_through", pass_through)
-
-graph.add_conditional_edges(START, decide_next)
-graph.add_edge("big", END)
-graph.add_edge("small", "pass_through")
-graph.add_edge("pass_through", END)
-
-workflow = graph.compile()
-
-# execute the workflow with sample data
-initial_state: ConditionState = {
-        "value": 15,        
-        "result": ""
-    }
-final_state = workflow.invoke(initial_state)
-print(f"Final Result: {final_state['result']}") # Output: Final Result: Value is big
-
-# Visualize the workflow
-try:
-    from IPython.display import Image, display
-    display(Image(workflow.get_graph().draw_mermaid_png()))
-except Exception:
-    # If not in Jupyter, print ASCII representation
-    print("\nWorkflow Graph:")
-    print(workflow.get_graph().draw_ascii())
+# Build and compile the workflow graph on first use, so importing this module stays cheap
+@cache
+def get_workflow():
+    from langgraph.graph import StateGraph, START, END
+
+    # Define the workflow graph
+    graph = StateGraph(ConditionState)
+
+    # Add nodes to your graph
+    graph.add_node("big", big_node)
+    graph.add_node("small", small_node)
+    graph.add_node("pass_through", pass_through)
+
+    graph.add_conditional_edges(START, decide_next)
+    graph.add_edge("big", END)
+    graph.add_edge("small", "pass_through")
+    graph.add_edge("pass_through", END)
+
+    return graph.compile()
+
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if __name__ == "__main__":
+    workflow = get_workflow()
+
+    # execute the workflow with sample data
+    initial_state: ConditionState = {
+            "value": 15,        
+            "result": ""
+        }
+    final_state = workflow.invoke(initial_state)
+    print(f"Final Result: {final_state['result']}") # Output: Final Result: Value is big
+
+    # Visualize the workflow
+    try:
+        from IPython.display import Image, display
+        display(Image(workflow.get_graph().draw_mermaid_png()))
+    except Exception:
+        # If not in Jupyter, print ASCII representation
+        print("\nWorkflow Graph:")
+        print(workflow.get_graph().draw_ascii())
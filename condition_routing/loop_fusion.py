@@ -0,0 +1,210 @@
+import argparse
+import copy
+import time
+from collections import defaultdict
+from dataclasses import dataclass, replace
+from typing import Any, Callable
+
+
+# A cycle the graph runs one superstep per node: body[0] -> ... -> body[-1], where the
+# conditional edge on body[-1] either goes back to body[0] or leaves the loop
+@dataclass
+class Loop:
+    body: list[str]
+    condition: Callable[[dict], str]
+    ends: dict[str, str]  # condition result -> node
+
+    @property
+    def head(self) -> str:
+        return self.body[0]
+
+    @property
+    def tail(self) -> str:
+        return self.body[-1]
+
+
+# Loops of `pure` nodes in a StateGraph builder that can run as a plain Python loop:
+#   - every node in the cycle is a plain function of the state (no config, store, ...)
+#   - the nodes are chained by plain edges, and only the head is entered from outside
+#   - the last node has a single conditional edge with a path map, leading back to the head
+#     or out of the loop
+def find_loops(builder, pure: set[str], skip: set[str] = frozenset()) -> list[Loop]:
+    outgoing, incoming = defaultdict(list), defaultdict(set)
+    for source, target in builder.edges:
+        outgoing[source].append(target)
+        incoming[target].add(source)
+    for source, branches in builder.branches.items():
+        for spec in branches.values():
+            for target in (spec.ends or {}).values():
+                incoming[target].add(source)
+    joined = {node for sources, target in builder.waiting_edges for node in (*sources, target)}
+
+    def plain(name: str) -> bool:
+        runnable = builder.nodes[name].runnable
+        return name in pure and name not in skip | joined and getattr(runnable, "func", None) is not None and not getattr(runnable, "func_accepts", {})
+
+    loops = []
+    for tail, branches in builder.branches.items():
+        if tail not in builder.nodes or not plain(tail) or outgoing[tail] or len(branches) != 1:
+            continue
+        spec = next(iter(branches.values()))
+        if not spec.ends or getattr(spec.path, "func", None) is None or getattr(spec.path, "func_accepts", {}):
+            continue
+        for head in set(spec.ends.values()):
+            if head not in builder.nodes or set(spec.ends.values()) == {head}:
+                continue  # not a node, or no way out of the loop
+            body = [head]
+            while body[-1] != tail:
+                node = body[-1]
+                if not plain(node) or node in builder.branches or len(outgoing[node]) != 1:
+                    break
+                following = outgoing[node][0]
+                if following in body or following not in builder.nodes or incoming[following] != {node}:
+                    break
+                body.append(following)
+            if body[-1] == tail and plain(tail):
+                loops.append(Loop(body, spec.path.func, dict(spec.ends)))
+    return loops
+
+
+# How each state key merges a node update: None replaces the value, otherwise the
+# channel's reducer (operator.add, add_messages, ...)
+def _reducers(builder) -> dict[str, Callable | None]:
+    from langgraph.channels import BinaryOperatorAggregate, LastValue
+
+    reducers = {}
+    for key, channel in builder.channels.items():
+        if isinstance(channel, LastValue):
+            reducers[key] = None
+        elif isinstance(channel, BinaryOperatorAggregate):
+            reducers[key] = channel.operator
+    return reducers
+
+
+# The whole loop as one node function. State is merged in place on a local copy, and the
+# node returns only the keys the loop wrote (for reducer keys, the combined update, so the
+# graph applies it once). `limit` bounds the trips round the loop, like recursion_limit does.
+def _fused_loop(builder, loop: Loop, limit: int) -> Callable[[dict], dict]:
+    from langgraph.errors import GraphRecursionError
+
+    funcs = [builder.nodes[name].runnable.func for name in loop.body]
+    reducers = _reducers(builder)
+    condition, ends, head = loop.condition, loop.ends, loop.head
+
+    def run_loop(state: dict) -> dict:
+        state = dict(state)
+        written: dict[str, Any] = {}
+        for _ in range(limit):
+            for func in funcs:
+                update = func(state)
+                if not update:
+                    continue
+                if not isinstance(update, dict):
+                    raise TypeError(f"fused loop {' -> '.join(loop.body)}: nodes must return a dict, got {type(update).__name__}")
+                for key, value in update.items():
+                    if key not in reducers:
+                        raise ValueError(f"fused loop {' -> '.join(loop.body)}: cannot merge key {key!r} in place")
+                    reducer = reducers[key]
+                    if reducer is None:
+                        state[key] = written[key] = value
+                    elif key in written:
+                        state[key] = reducer(state[key], value)
+                        written[key] = reducer(written[key], value)
+                    else:
+                        # copies first, in case the reducer updates in place (reducers.py)
+                        state[key] = reducer(copy.copy(state[key]), value)
+                        written[key] = copy.copy(value)
+            if ends[condition(state)] != head:
+                return written
+        raise GraphRecursionError(f"fused loop {' -> '.join(loop.body)} did not exit after {limit} iterations")
+
+    run_loop.__name__ = f"fused_{head}"
+    return run_loop
+
+
+# Opt-in loop fusion: a copy of `workflow` in which every loop found by find_loops runs as a
+# single node (named after the loop head) that loops in-process, then takes the loop's
+# conditional edge out. Only list nodes in `pure` that have no side effects and do not
+# mutate the state they are given; the rest of the graph runs unchanged.
+def fuse_loops(workflow, pure: set[str], limit: int = 10_000_000):
+    from langgraph.graph import StateGraph
+
+    original = workflow.builder
+    loops = find_loops(original, pure, skip=set(workflow.interrupt_before_nodes or ()) | set(workflow.interrupt_after_nodes or ()))
+    if not loops:
+        return workflow
+
+    builder = copy.copy(original)
+    builder.nodes = dict(original.nodes)
+    builder.edges = set(original.edges)
+    builder.branches = defaultdict(dict, {source: dict(branches) for source, branches in original.branches.items()})
+    for loop in loops:
+        # add_node on a scratch graph wraps the function the way the builder would
+        scratch = StateGraph(original.state_schema)
+        scratch.add_node(loop.head, _fused_loop(original, loop, limit))
+        builder.nodes[loop.head] = replace(original.nodes[loop.head], runnable=scratch.nodes[loop.head].runnable)
+        for name in loop.body[1:]:
+            del builder.nodes[name]
+        builder.edges -= set(zip(loop.body, loop.body[1:]))
+        # the fused node only returns once the condition leaves the loop, so drop the way back
+        builder.branches[loop.head] = {
+            name: spec._replace(ends={key: target for key, target in spec.ends.items() if target != loop.head})
+            for name, spec in builder.branches.pop(loop.tail).items()
+        }
+
+    fused = builder.compile(
+        checkpointer=workflow.checkpointer,
+        cache=workflow.cache,
+        store=workflow.store,
+        interrupt_before=workflow.interrupt_before_nodes,
+        interrupt_after=workflow.interrupt_after_nodes,
+        debug=workflow.debug,
+        name=workflow.name,
+    )
+    return fused.with_config(workflow.config) if workflow.config else fused
+
+
+def _seconds(call) -> float:
+    start = time.perf_counter()
+    call()
+    return time.perf_counter() - start
+
+
+# Time per run of path_map_condition_routing at growing max_iterations: the graph (with the
+# recursion limit raised to fit), the fused graph, and the loop as plain function calls
+def benchmark(iterations: list[int], graph_max: int) -> None:
+    import path_map_condition_routing as m
+
+    graph, fused = m.get_workflow(), m.get_workflow(fused=True)
+
+    def plain(state):
+        state = {**state, **m.small_node(state)}
+        while True:
+            state = {**state, **m.pass_through(state)}
+            if m.check_iteration(state) == "end":
+                return state
+            state = {**state, **m.small_node(state)}
+
+    print(f"{'iterations':>10} {'graph':>10} {'fused':>10} {'plain':>10} {'speedup':>8}")
+    for count in iterations:
+        state = {"value": 5, "status": "small", "iteration": 0, "max_iterations": count, "result": ""}
+        expected = plain(state)
+        fused_result = fused.invoke(state)
+        assert {key: fused_result[key] for key in ("iteration", "result")} == {key: expected[key] for key in ("iteration", "result")}
+        fused_s = min(_seconds(lambda: fused.invoke(state)) for _ in range(3))
+        plain_s = min(_seconds(lambda: plain(state)) for _ in range(3))
+        if count <= graph_max:
+            graph_result = graph.invoke(state, config={"recursion_limit": 2 * count + 10})
+            assert graph_result == fused_result, (graph_result, fused_result)
+            graph_s = _seconds(lambda: graph.invoke(state, config={"recursion_limit": 2 * count + 10}))
+            print(f"{count:>10} {graph_s * 1000:>8.1f}ms {fused_s * 1000:>8.2f}ms {plain_s * 1000:>8.2f}ms {graph_s / fused_s:>7.0f}x")
+        else:
+            print(f"{count:>10} {'-':>10} {fused_s * 1000:>8.2f}ms {plain_s * 1000:>8.2f}ms {'':>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark loop fusion on path_map_condition_routing")
+    parser.add_argument("--iterations", type=int, nargs="*", default=[10, 100, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--graph-max", type=int, default=10_000, help="largest max_iterations to also run through the unfused graph")
+    args = parser.parse_args()
+    benchmark(args.iterations, args.graph_max)
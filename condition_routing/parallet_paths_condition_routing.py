@@ -1,7 +1,11 @@
-from langgraph.graph import StateGraph, START, END
+from functools import cache
 from typing import TypedDict, Annotated
 from operator import add
 
+from reducers import RunningMean, append_in_place, count, in_place_channels, streaming_mean, top_k
+
+largest_3 = top_k(3)
+
 
 # Define a simple state for parallel path routing
 class ParallelState(TypedDict):
@@ -18,37 +22,131 @@ def big_node(state: ParallelState):
 def small_node(state: ParallelState):
     return {"results": [f"Small processed value: {state['value']}"]}
 
-# Define the workflow graph
-graph = StateGraph(ParallelState)
-
-# Add nodes to your graph
-graph.add_node("big", big_node)
-graph.add_node("small", small_node)
-
-# add edges to your graph
-# When decide_parallel returns a list, both nodes execute in parallel
-graph.add_conditional_edges(START, decide_parallel)
-graph.add_edge("big", END)
-graph.add_edge("small", END)
-
-workflow = graph.compile()
-
-# execute the workflow with sample data
-initial_state: ParallelState = {
-    "value": 42,
-    "results": []
-}
-
-final_state = workflow.invoke(initial_state)
-print("Parallel Execution Results:")
-for result in final_state['results']:
-    print(f"  - {result}")
-
-# Visualize the workflow
-try:
-    from IPython.display import Image, display
-    display(Image(workflow.get_graph().draw_mermaid_png()))
-except Exception:
-    # If not in Jupyter, print ASCII representation
-    print("\nWorkflow Graph:")
-    print(workflow.get_graph().draw_ascii())
+# Dynamic fan-out: one branch per input item instead of a fixed list of nodes. The results
+# are merged with in-place reducers (see reducers.py), so merging stays linear in the number
+# of branches where operator.add would copy the list once per branch.
+class FanOutState(TypedDict):
+    items: list[int]
+    results: Annotated[list[str], append_in_place]
+    sizes: Annotated[dict[str, int], count]
+    largest: Annotated[list[int], largest_3]
+    mean: Annotated[RunningMean, streaming_mean]
+
+# The state one branch receives
+class ItemState(TypedDict):
+    value: int
+
+# The state one chunk of items receives (chunked fan-out)
+class ChunkState(TypedDict):
+    values: list[int]
+
+def fan_out(state: FanOutState):
+    from langgraph.types import Send
+
+    return [Send("process_item", {"value": item}) for item in state["items"]]
+
+# LangGraph's cost per superstep grows faster than linearly with the number of tasks, so for
+# very wide fan-outs send one branch per chunk of items instead
+def fan_out_chunks(chunk_size: int):
+    def fan_out(state: FanOutState):
+        from langgraph.types import Send
+
+        items = state["items"]
+        return [Send("process_chunk", {"values": items[start:start + chunk_size]}) for start in range(0, len(items), chunk_size)]
+
+    return fan_out
+
+def process_item(state: ItemState):
+    size = "big" if state["value"] > 10 else "small"
+    return {
+        "results": [f"{size.capitalize()} processed value: {state['value']}"],
+        "sizes": {size: 1},
+        "largest": [state["value"]],
+        "mean": state["value"],
+    }
+
+# Merges its items' updates with the same reducers the graph uses, in item order
+def process_chunk(state: ChunkState):
+    merged = {"results": [], "sizes": {}, "largest": [], "mean": RunningMean()}
+    for value in state["values"]:
+        update = process_item({"value": value})
+        append_in_place(merged["results"], update["results"])
+        count(merged["sizes"], update["sizes"])
+        largest_3(merged["largest"], update["largest"])
+        streaming_mean(merged["mean"], update["mean"])
+    return merged
+
+def fan_out_inputs(branches: int) -> FanOutState:
+    return {"items": [(index * 7) % 23 for index in range(branches)]}
+
+# Build and compile the workflow graph on first use, so importing this module stays cheap
+@cache
+def get_workflow():
+    from langgraph.graph import StateGraph, START, END
+
+    # Define the workflow graph
+    graph = StateGraph(ParallelState)
+
+    # Add nodes to your graph
+    graph.add_node("big", big_node)
+    graph.add_node("small", small_node)
+
+    # add edges to your graph
+    # When decide_parallel returns a list, both nodes execute in parallel
+    graph.add_conditional_edges(START, decide_parallel)
+    graph.add_edge("big", END)
+    graph.add_edge("small", END)
+
+    return graph.compile()
+
+# chunk_size=None: one branch per item; otherwise one branch per chunk_size items
+@cache
+def get_fan_out_workflow(chunk_size: int | None = None):
+    from langgraph.graph import StateGraph, START, END
+
+    graph = in_place_channels(StateGraph(FanOutState))
+    if chunk_size is None:
+        graph.add_node("process_item", process_item)
+        graph.add_conditional_edges(START, fan_out, ["process_item"])
+        graph.add_edge("process_item", END)
+    else:
+        graph.add_node("process_chunk", process_chunk)
+        graph.add_conditional_edges(START, fan_out_chunks(chunk_size), ["process_chunk"])
+        graph.add_edge("process_chunk", END)
+    return graph.compile()
+
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if __name__ == "__main__":
+    workflow = get_workflow()
+
+    # execute the workflow with sample data
+    initial_state: ParallelState = {
+        "value": 42,
+        "results": []
+    }
+
+    final_state = workflow.invoke(initial_state)
+    print("Parallel Execution Results:")
+    for result in final_state['results']:
+        print(f"  - {result}")
+
+    # one branch per item
+    fan_out_state = get_fan_out_workflow().invoke({"items": [3, 42, 7, 15, 42]})
+    print("\nDynamic Fan-Out Results:")
+    for result in fan_out_state['results']:
+        print(f"  - {result}")
+    print(f"  sizes={fan_out_state['sizes']}, largest={fan_out_state['largest']}, mean={fan_out_state['mean'].mean:.1f}")
+
+    # Visualize the workflow
+    try:
+        from IPython.display import Image, display
+        display(Image(workflow.get_graph().draw_mermaid_png()))
+    except Exception:
+        # If not in Jupyter, print ASCII representation
+        print("\nWorkflow Graph:")
+        print(workflow.get_graph().draw_ascii())
@@ -1,4 +1,4 @@
-from langgraph.graph import StateGraph, START, END
+from functools import cache
 from typing import TypedDict, Literal
 
 
@@ -32,40 +32,63 @@ def check_iteration(state: ConditionState) -> Literal["continue_small", "end"]:
     else:
         return "end"
     
-# Define the workflow graph
-graph = StateGraph(ConditionState)
-
-# Add nodes to your graph
-graph.add_node("big", big_node)
-graph.add_node("small", small_node)
-graph.add_node("pass_through", pass_through)
-
-# add edges to your graph
-graph.add_conditional_edges(START, decide_next, {"big": "big", "small": "small"})
-graph.add_edge("big", END)
-graph.add_edge("small", "pass_through")
-graph.add_conditional_edges("pass_through", check_iteration, {"continue_small": "small", "end": END})
-
-workflow = graph.compile()
-
-# execute the workflow with sample data
-initial_state: ConditionState = {
-    "value": 5,        
-    "status": "small",
-    "iteration": 0,
-    "max_iterations": 3,
-    "result": ""
-}
-final_state = workflow.invoke(initial_state)
-print(f"Final Result: {final_state['result']}") # Output: Final Result: Value is big
-
-print(f"Iterations: {final_state['iteration']}") # Output: Iterations: 1
-
-# Visualize the workflow
-try:
-    from IPython.display import Image, display
-    display(Image(workflow.get_graph().draw_mermaid_png()))
-except Exception:
-    # If not in Jupyter, print ASCII representation
-    print("\nWorkflow Graph:")
-    print(workflow.get_graph().draw_ascii())
+# Nodes without side effects, which loop fusion may run as one in-process loop
+PURE_NODES = {"small", "pass_through"}
+
+# Build and compile the workflow graph on first use, so importing this module stays cheap.
+# fused=True runs the small -> pass_through loop in-process (see loop_fusion.py).
+@cache
+def get_workflow(fused: bool = False):
+    from langgraph.graph import StateGraph, START, END
+
+    # Define the workflow graph
+    graph = StateGraph(ConditionState)
+
+    # Add nodes to your graph
+    graph.add_node("big", big_node)
+    graph.add_node("small", small_node)
+    graph.add_node("pass_through", pass_through)
+
+    # add edges to your graph
+    graph.add_conditional_edges(START, decide_next, {"big": "big", "small": "small"})
+    graph.add_edge("big", END)
+    graph.add_edge("small", "pass_through")
+    graph.add_conditional_edges("pass_through", check_iteration, {"continue_small": "small", "end": END})
+
+    workflow = graph.compile()
+    if fused:
+        from loop_fusion import fuse_loops
+
+        return fuse_loops(workflow, PURE_NODES)
+    return workflow
+
+# `workflow` stays available as a module attribute, built on first access
+def __getattr__(name):
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if __name__ == "__main__":
+    workflow = get_workflow()
+
+    # execute the workflow with sample data
+    initial_state: ConditionState = {
+        "value": 5,        
+        "status": "small",
+        "iteration": 0,
+        "max_iterations": 3,
+        "result": ""
+    }
+    final_state = workflow.invoke(initial_state)
+    print(f"Final Result: {final_state['result']}") # Output: Final Result: Value is big
+
+    print(f"Iterations: {final_state['iteration']}") # Output: Iterations: 1
+
+    # Visualize the workflow
+    try:
+        from IPython.display import Image, display
+        display(Image(workflow.get_graph().draw_mermaid_png()))
+    except Exception:
+        # If not in Jupyter, print ASCII representation
+        print("\nWorkflow Graph:")
+        print(workflow.get_graph().draw_ascii())
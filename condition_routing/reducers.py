@@ -0,0 +1,200 @@
+import argparse
+import copy
+import time
+from dataclasses import dataclass
+from functools import cache
+from typing import Any, Callable, Iterable
+
+
+# Accumulating reducers for wide fan-outs. `operator.add` builds a new list for every branch
+# that reports back, so merging n branches copies O(n^2) items. These reducers update the
+# current value in place instead (amortised O(1) per merged item) and return it.
+#
+# LangGraph applies the writes of a superstep in task order, not completion order, so the
+# merged values are deterministic however the branches finish.
+#
+# LangGraph shares a channel's value with the states it streams, the channel copies it makes
+# (e.g. to evaluate a conditional edge with a node's writes applied) and its checkpoints, so an
+# in-place reducer needs a copy-on-write channel: call in_place_channels(graph) after
+# declaring the state.
+
+
+# Append-in-place list: Annotated[list[str], append_in_place]
+def append_in_place(current: list, update: Iterable) -> list:
+    current.extend(update)
+    return current
+
+
+# Counter: Annotated[dict[str, int], count]; each update is {key: increment}
+def count(current: dict, update: dict) -> dict:
+    for key, increment in update.items():
+        current[key] = current.get(key, 0) + increment
+    return current
+
+
+# Top-k: Annotated[list[int], top_k(3)] keeps the k largest items (by `key`), largest first.
+# Ties keep merge order, so the result is deterministic too.
+def top_k(k: int, key: Callable[[Any], Any] | None = None) -> Callable[[list, Iterable], list]:
+    def merge(current: list, update: Iterable) -> list:
+        current.extend(update)
+        current.sort(key=key, reverse=True)  # stable, and at most k + len(update) items
+        del current[k:]
+        return current
+
+    merge.__name__ = f"top_{k}"
+    merge.in_place = True
+    return merge
+
+
+# Running mean without keeping the values (Welford): Annotated[RunningMean, streaming_mean].
+# Updates are numbers or other RunningMeans (e.g. from a subgraph).
+@dataclass(slots=True)
+class RunningMean:
+    count: int = 0
+    mean: float = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+
+    def merge(self, other: "RunningMean") -> None:
+        if other.count:
+            total = self.count + other.count
+            self.mean += (other.mean - self.mean) * other.count / total
+            self.count = total
+
+
+def streaming_mean(current: RunningMean | None, update: "float | RunningMean") -> RunningMean:
+    if current is None:
+        current = RunningMean()
+    if isinstance(update, RunningMean):
+        current.merge(update)
+    else:
+        current.add(update)
+    return current
+
+
+for _reducer in (append_in_place, count, streaming_mean):
+    _reducer.in_place = True
+
+
+# BinaryOperatorAggregate for in-place reducers, copy-on-write: once the value has been handed
+# out (get, checkpoint, copy, restore), the next update copies it (O(n), at most once per
+# superstep) before merging into it, so states, checkpoints and channel copies already handed
+# out never change. Between hand-outs, updates merge in place.
+# Defined on first use, so importing this module does not import LangGraph.
+@cache
+def _in_place_aggregate() -> type:
+    from langgraph.channels import BinaryOperatorAggregate
+
+    class InPlaceAggregate(BinaryOperatorAggregate):
+        __slots__ = ("shared",)
+
+        def __init__(self, typ, operator):
+            super().__init__(typ, operator)
+            self.shared = False
+
+        def copy(self):
+            channel = super().copy()
+            channel.shared = self.shared = True
+            return channel
+
+        def from_checkpoint(self, checkpoint):
+            channel = super().from_checkpoint(checkpoint)
+            channel.shared = True
+            return channel
+
+        def update(self, values):
+            if values and self.shared and self.is_available():
+                self.value = copy.copy(self.value)
+                self.shared = False
+            return super().update(values)
+
+        def get(self):
+            value = super().get()
+            self.shared = True
+            return value
+
+        def checkpoint(self):
+            self.shared = True
+            return super().checkpoint()
+
+    return InPlaceAggregate
+
+
+# Give every state field with an in-place reducer an InPlaceAggregate channel. Call it on the
+# StateGraph before compiling; other fields are left alone.
+def in_place_channels(graph):
+    channel_type = _in_place_aggregate()
+    for key, channel in list(graph.channels.items()):
+        if getattr(getattr(channel, "operator", None), "in_place", False) and type(channel) is not channel_type:
+            replacement = channel_type(channel.typ, channel.operator)
+            replacement.key = channel.key
+            graph.channels[key] = replacement
+    return graph
+
+
+# Time to merge n single-item branch updates into a list channel, the way LangGraph does at
+# the end of a superstep (BinaryOperatorAggregate.update), with operator.add and append_in_place
+def merge_cost(branches: int, reducer: Callable) -> float:
+    from langgraph.channels import BinaryOperatorAggregate
+
+    channel = (_in_place_aggregate() if getattr(reducer, "in_place", False) else BinaryOperatorAggregate)(list, reducer)
+    updates = [[f"Small processed value: {index}"] for index in range(branches)]
+    start = time.perf_counter()
+    channel.update(updates)
+    elapsed = time.perf_counter() - start
+    assert len(channel.get()) == branches
+    return elapsed
+
+
+# Stream the fan-out graph's states and check that none changed after it was yielded
+def check_snapshots(items: list[int]) -> None:
+    from parallet_paths_condition_routing import get_fan_out_workflow
+
+    states, snapshots = [], []
+    for state in get_fan_out_workflow().stream({"items": items}, stream_mode="values"):
+        states.append(state)
+        snapshots.append(copy.deepcopy(state))
+    assert states == snapshots, "a streamed state changed after it was yielded"
+    print(f"{len(states)} streamed states unchanged after later steps")
+
+
+def benchmark(branch_counts: list[int], graph_max: int, chunk_size: int) -> None:
+    from operator import add
+
+    from parallet_paths_condition_routing import fan_out_inputs, get_fan_out_workflow
+
+    check_snapshots([1, 2, 3])
+    print("\nMerging one result per branch into a list channel:")
+    print(f"{'branches':>9} {'operator.add':>14} {'append_in_place':>16} {'per branch':>11}")
+    for branches in branch_counts:
+        copying = merge_cost(branches, add)
+        in_place = merge_cost(branches, append_in_place)
+        print(f"{branches:>9} {copying * 1000:>12.2f}ms {in_place * 1000:>14.3f}ms {in_place / branches * 1e9:>9.0f}ns")
+
+    for title, workflow, limit in (
+        ("one Send per item", get_fan_out_workflow(), graph_max),
+        (f"one Send per {chunk_size} items", get_fan_out_workflow(chunk_size), None),
+    ):
+        print(f"\nWhole fan-out graph ({title}):")
+        for branches in branch_counts:
+            if limit is not None and branches > limit:
+                print(f"{branches:>9} skipped (--graph-max {limit})")
+                continue
+            start = time.perf_counter()
+            final_state = workflow.invoke(fan_out_inputs(branches))
+            elapsed = time.perf_counter() - start
+            print(
+                f"{branches:>9} {elapsed * 1000:>10.1f}ms ({elapsed / branches * 1e6:.0f} µs/item), "
+                f"sizes={final_state['sizes']}, largest={final_state['largest']}, mean={final_state['mean'].mean:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark fan-out merge cost with copying and in-place reducers")
+    parser.add_argument("--branches", type=int, nargs="*", default=[10, 1_000, 100_000])
+    parser.add_argument("--graph-max", type=int, default=1_000, help="largest fan-out to also run through the whole graph")
+    parser.add_argument("--chunk-size", type=int, default=1_000, help="items per Send in the chunked fan-out")
+    args = parser.parse_args()
+    benchmark(args.branches, args.graph_max, args.chunk_size)
@@ -0,0 +1,109 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (directory, module, sample input). Only the module asked for is imported.
+WORKFLOWS = {
+    "bmi": ("1.simple_workflow", "bmi_calculator_workflow", {"weight": 70.0, "height": 1.75, "bmi": 0.0}),
+    "quadratic": ("1.simple_workflow", "quadratic_equation_worfflow", {"a": 1, "b": 3, "c": 2}),
+    "batting": ("1.simple_workflow", "parallel_workflow", {"runs": 150, "balls": 120, "fours": 10, "sixes": 5, "sr": 0.0, "ballsperrun": 0.0, "bountrate": 0.0}),
+    "llm": ("1.simple_workflow", "simple_llm_workflow", {"question": "What is the capital of France?", "answer": ""}),
+    "prompt_chaining": ("1.simple_workflow", "simple_prompt_chaining", {"topic": "The Future of Artificial Intelligence", "outline": "", "content": ""}),
+    "chatbot": ("1.simple_workflow", "simple_chatbot", {"chat_history": [["user", "Hello!"]]}),
+    "essay": ("1.simple_workflow", "llm_parallel_workflow", {"eassy": "A piece is a part of something big. When you break a chocolate, you get many pieces."}),
+    "review_reply": ("1.simple_workflow", "review_reply_workflow", {"review": "The app crashes every time I try to upload a photo. This is so frustrating!", "sentiment": "", "diagnosis": {}, "response": ""}),
+    "basic_routing": ("condition_routing", "basic_condition_routing", {"value": 15, "result": ""}),
+    "parallel_paths": ("condition_routing", "parallet_paths_condition_routing", {"value": 42, "results": []}),
+    "path_map": ("condition_routing", "path_map_condition_routing", {"value": 5, "status": "small", "iteration": 0, "max_iterations": 3, "result": ""}),
+}
+
+
+def load(name: str):
+    directory, module_name, _ = WORKFLOWS[name]
+    for path in (os.path.join(ROOT, directory), os.path.join(ROOT, "1.simple_workflow")):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    return importlib.import_module(module_name)
+
+
+# Swap the module's lazy model for the offline fake before anything builds the real one
+# (`options` go to FakeChatModel, e.g. latency=0.2)
+def use_fake_model(module, **options) -> None:
+    from fake_models import FakeChatModel
+
+    module.model.override(FakeChatModel(**options))
+
+
+# Cumulative import time of each workflow module in a fresh interpreter (python -X importtime),
+# i.e. what a service pays to import it. Runs without an API key, since nothing should need one.
+def cold_start() -> dict[str, float]:
+    results = {}
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    for name, (directory, module_name, _) in sorted(WORKFLOWS.items()):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+            cwd=os.path.join(ROOT, directory), env=env, capture_output=True, text=True,
+        )
+        last = [line for line in completed.stderr.splitlines() if line.startswith("import time:")][-1]
+        results[name] = int(last.split("|")[1]) / 1000
+        print(f"{name:<16} {results[name]:>8.1f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one workflow; only that workflow's module is imported")
+    parser.add_argument("workflow", nargs="?", choices=sorted(WORKFLOWS), help="workflow to run")
+    parser.add_argument("--input", help="input state as JSON (default: the workflow's sample input)")
+    parser.add_argument("--fake", action="store_true", help="use the offline fake chat model")
+    parser.add_argument("--stream", action="store_true", help="print LLM tokens as they arrive")
+    parser.add_argument("--metrics", choices=["prometheus", "json"], help="print per-node metrics after the run")
+    parser.add_argument("--list", action="store_true", help="list the available workflows")
+    parser.add_argument("--cold-start", action="store_true", help="measure the import time of every workflow module")
+    args = parser.parse_args()
+
+    if args.cold_start:
+        cold_start()
+        sys.exit(0)
+
+    if args.list or args.workflow is None:
+        for name, (directory, module_name, _) in sorted(WORKFLOWS.items()):
+            print(f"{name:<16} {directory}/{module_name}.py")
+        sys.exit(0)
+
+    start = time.perf_counter()
+    module = load(args.workflow)
+    loaded = time.perf_counter()
+    if args.fake and hasattr(module, "model"):
+        use_fake_model(module)
+    workflow = module.get_workflow()
+    if args.metrics:
+        from graph_metrics import GraphMetrics
+
+        metrics = GraphMetrics()
+        workflow = metrics.instrument(workflow, graph=args.workflow)
+    built = time.perf_counter()
+
+    inputs = json.loads(args.input) if args.input else WORKFLOWS[args.workflow][2]
+    config = {"configurable": {"thread_id": "run-workflow"}}
+    if args.stream:
+        from streaming import format_ttft, stream_tokens
+
+        final_state, ttft = stream_tokens(workflow, inputs, config=config)
+        print(f"Time to first token: {format_ttft(ttft)}", file=sys.stderr)
+    else:
+        final_state = workflow.invoke(inputs, config=config)
+    done = time.perf_counter()
+
+    print(json.dumps(final_state, indent=2, default=lambda value: getattr(value, "content", str(value))))
+    print(
+        f"import {1000 * (loaded - start):.0f} ms | build graph {1000 * (built - loaded):.0f} ms | run {1000 * (done - built):.0f} ms",
+        file=sys.stderr,
+    )
+    if args.metrics:
+        print(metrics.to_prometheus() if args.metrics == "prometheus" else metrics.to_json(), file=sys.stderr)
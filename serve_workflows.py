@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+import weakref
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlsplit
+
+from run_workflow import WORKFLOWS, load, use_fake_model
+
+# route -> run_workflow name. The chatbot keeps per-thread history (POST /chatbot/<thread_id>);
+# the others are stateless, so identical in-flight requests can share one run.
+ROUTES = {"review_reply": "review_reply", "essay": "essay", "chatbot": "chatbot", "quadratic": "quadratic", "bmi": "bmi"}
+STATEFUL = {"chatbot"}
+
+# Exceptions a workflow raises on bad input (e.g. POST /quadratic {"a": 0} divides by zero, a
+# string where a number belongs is a TypeError); answered with 400. Anything else is a 500.
+INPUT_ERRORS = (ArithmeticError, TypeError, ValueError, LookupError)
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+# Raised when a route's queue is full; answered with 503 and Retry-After
+class Overloaded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"queue full, retry after {retry_after:.3f}s")
+        self.retry_after = retry_after
+
+
+# Groups requests that arrive within `window` seconds into one workflow.abatch_as_completed
+# call (abatch, but each caller is answered as soon as its own run finishes). A request that
+# arrives while nothing else is running starts at once: waiting only pays off under load.
+#   - at most `max_in_flight` requests run at once; while that many are running, new requests
+#     wait in the queue, and each batch takes up to `max_batch` of them as room frees up
+#   - the queue holds at most `max_queue` requests; submit() raises Overloaded beyond that,
+#     so a burst is turned away at once instead of piling up latency
+#   - each request gets its own result or exception (return_exceptions), so one failing input
+#     does not fail its batch
+class MicroBatcher:
+    def __init__(self, workflow, window: float = 0.002, max_batch: int = 16, max_in_flight: int = 64, max_queue: int = 256):
+        self.workflow = workflow
+        self.window = window
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.stats = {"requests": 0, "batches": 0, "rejected": 0, "failed": 0}
+        self.running = 0
+        self._seconds_per_request = 0.0  # moving average, for Retry-After
+        self._capacity: asyncio.Semaphore | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._capacity = asyncio.Semaphore(self.max_in_flight)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def submit(self, inputs: dict, config: dict | None = None) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((inputs, config, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            # roughly the time to work off the queue
+            raise Overloaded(self.queue.qsize() / self.max_in_flight * max(self._seconds_per_request, 0.001)) from None
+        self.stats["requests"] += 1
+        return future
+
+    # Add queued requests to the batch while there is room, taking one slot for each
+    async def _fill(self, batch: list) -> None:
+        while len(batch) < self.max_batch and not self.queue.empty() and not self._capacity.locked():
+            await self._capacity.acquire()
+            batch.append(self.queue.get_nowait())
+            self.running += 1
+
+    async def _run(self) -> None:
+        running = set()
+        while True:
+            await self._capacity.acquire()
+            batch = [await self.queue.get()]
+            self.running += 1
+            await self._fill(batch)
+            if len(batch) < self.max_batch and self.window > 0 and self.running > len(batch):
+                await asyncio.sleep(self.window)
+                await self._fill(batch)
+            task = asyncio.create_task(self._run_batch(batch))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+    async def _run_batch(self, batch: list) -> None:
+        for _, _, future in batch:
+            if future.done():  # the caller went away
+                self.running -= 1
+                self._capacity.release()
+        batch = [item for item in batch if not item[2].done()]
+        if not batch:
+            return
+        self.stats["batches"] += 1
+        configs = [config or {} for _, config, _ in batch]
+        start = time.perf_counter()
+        pending = set(range(len(batch)))
+        try:
+            async for index, result in self.workflow.abatch_as_completed([inputs for inputs, _, _ in batch], configs, return_exceptions=True):
+                pending.discard(index)
+                self._resolve(batch[index][2], result, start)
+        except Exception as exc:
+            for index in pending:
+                self._resolve(batch[index][2], exc, start)
+
+    def _resolve(self, future: asyncio.Future, result, start: float) -> None:
+        self.running -= 1
+        self._capacity.release()
+        self._seconds_per_request = 0.9 * self._seconds_per_request + 0.1 * (time.perf_counter() - start)
+        if future.done():
+            return
+        if isinstance(result, BaseException):
+            self.stats["failed"] += 1
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+
+# Requests with the same key while one is in flight share its result instead of running again.
+# The shared run is shielded, so a caller that disconnects does not cancel it for the others.
+class Coalescer:
+    def __init__(self):
+        self.in_flight: dict[Any, asyncio.Future] = {}
+        self.stats = {"coalesced": 0}
+
+    async def run(self, key, start: Callable[[], Awaitable]):
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(start())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(future)
+
+
+# The workflows behind one MicroBatcher per route, with coalescing for the stateless routes and
+# one request at a time per chatbot thread (so two turns of one conversation never race on its
+# checkpoint; different threads still share batches).
+class WorkflowService:
+    def __init__(self, routes: dict[str, str] = ROUTES, coalesce: bool = True, **batching):
+        self.routes = routes
+        self.coalesce = coalesce
+        self.batching = batching
+        self.batchers: dict[str, MicroBatcher] = {}
+        self.coalescer = Coalescer()
+        self._thread_locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        self.started = time.time()
+
+    def start(self) -> None:
+        for route, name in self.routes.items():
+            self.batchers[route] = MicroBatcher(load(name).get_workflow(), **self.batching)
+            self.batchers[route].start()
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(batcher.stop() for batcher in self.batchers.values()))
+
+    async def run(self, route: str, body: dict, thread_id: str | None = None) -> dict:
+        batcher = self.batchers[route]
+        if route in STATEFUL:
+            lock = self._thread_locks.setdefault(thread_id, asyncio.Lock())
+            async with lock:
+                state = await batcher.submit({"chat_history": [["user", str(body.get("message", ""))]]}, {"configurable": {"thread_id": thread_id}})
+            return {"thread_id": thread_id, "reply": state["chat_history"][-1].content, "turns": len(state["chat_history"]) // 2}
+
+        inputs = {**WORKFLOWS[self.routes[route]][2], **body}  # unspecified fields take the sample defaults
+        if not self.coalesce:
+            return await batcher.submit(inputs)
+        key = (route, json.dumps(inputs, sort_keys=True, default=str))
+        return await self.coalescer.run(key, lambda: batcher.submit(inputs))
+
+    @property
+    def stats(self) -> dict:
+        routes = {route: {**batcher.stats, "running": batcher.running, "queued": batcher.queue.qsize()} for route, batcher in self.batchers.items()}
+        return {"uptime_s": round(time.time() - self.started, 1), **self.coalescer.stats, "routes": routes}
+
+    # (status, body, extra headers) for one HTTP request
+    async def dispatch(self, method: str, target: str, body: bytes) -> tuple[int, dict, dict]:
+        parts = [part for part in urlsplit(target).path.split("/") if part]
+        if parts in (["health"], ["stats"]):
+            if method != "GET":
+                return 405, {"error": "use GET"}, {}
+            return 200, {"status": "ok"} if parts == ["health"] else self.stats, {}
+        if not parts or parts[0] not in self.batchers or len(parts) != (2 if parts[0] in STATEFUL else 1):
+            return 404, {"error": f"unknown path {target}", "routes": [f"/{route}" + ("/<thread_id>" if route in STATEFUL else "") for route in self.routes]}, {}
+        if method != "POST":
+            return 405, {"error": "use POST"}, {}
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as exc:
+            return 400, {"error": f"invalid JSON body: {exc}"}, {}
+        try:
+            return 200, await self.run(parts[0], payload, parts[1] if len(parts) == 2 else None), {}
+        except Overloaded as exc:
+            return 503, {"error": str(exc)}, {"retry-after": f"{max(exc.retry_after, 0.001):.3f}"}
+        except INPUT_ERRORS as exc:
+            return 400, {"error": f"{type(exc).__name__}: {exc}"}, {}
+        except Exception as exc:
+            return 500, {"error": f"{type(exc).__name__}: {exc}"}, {}
+
+
+# Minimal HTTP/1.1 with keep-alive on asyncio streams: JSON bodies with content-length, no
+# chunked requests. Enough for an internal API or a load test without a web framework. A
+# malformed request line or content-length is answered with 400 and the connection is closed,
+# since the rest of the stream can no longer be framed.
+async def _serve_connection(service: WorkflowService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            try:
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                length = int(headers.get("content-length", 0))
+                if length < 0:
+                    raise ValueError(f"negative content-length {length}")
+            except ValueError as exc:
+                await _respond(writer, 400, {"error": f"malformed request: {exc}"}, {"connection": "close"})
+                break
+            body = await reader.readexactly(length)
+            await _respond(writer, *await service.dispatch(method, target, body))
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, payload: dict, extra: dict) -> None:
+    data = json.dumps(payload, default=lambda value: getattr(value, "content", str(value))).encode()
+    head = [f"HTTP/1.1 {status} {REASONS[status]}", "content-type: application/json", f"content-length: {len(data)}"]
+    head += [f"{name}: {value}" for name, value in extra.items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+    await writer.drain()
+
+
+async def serve(service: WorkflowService, host: str = "127.0.0.1", port: int = 8000, ready: Callable[[int], None] | None = None) -> None:
+    service.start()
+    server = await asyncio.start_server(lambda reader, writer: _serve_connection(service, reader, writer), host, port, backlog=1024)
+    port = server.sockets[0].getsockname()[1]
+    if ready is not None:
+        ready(port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the workflows over HTTP with request coalescing and micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fake", action="store_true", help="use the offline fake chat model")
+    parser.add_argument("--fake-latency-ms", type=float, default=0.0, help="fake model latency per call")
+    parser.add_argument("--window-ms", type=float, default=2.0, help="how long a batch waits for more requests")
+    parser.add_argument("--max-batch", type=int, default=16, help="requests per abatch call")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="requests running at once per route")
+    parser.add_argument("--max-queue", type=int, default=256, help="queued requests per route before answering 503")
+    parser.add_argument("--no-coalesce", action="store_true", help="run identical in-flight requests separately")
+    args = parser.parse_args()
+
+    if args.fake:
+        for name in ROUTES.values():
+            module = load(name)
+            if hasattr(module, "model"):
+                use_fake_model(module, latency=args.fake_latency_ms / 1000)
+    service = WorkflowService(
+        coalesce=not args.no_coalesce, window=args.window_ms / 1000, max_batch=args.max_batch, max_in_flight=args.max_in_flight, max_queue=args.max_queue,
+    )
+    ready = lambda port: print(f"Serving {', '.join('/' + route for route in ROUTES)} on http://{args.host}:{port}", file=sys.stderr, flush=True)
+    try:
+        asyncio.run(serve(service, args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass